@@ -21,11 +21,14 @@
 # implied. See the License for the specific language governing permissions and limitations under the
 # License.
 #
+import os
 from astropy.coordinates import FunctionTransform, ICRS, frame_transform_graph
 import astropy.coordinates.representation as r
+import numpy as np
+from scipy.spatial.transform import Rotation
 from gdt.core.coords import *
 from gdt.core.coords.spacecraft.frame import spacecraft_to_icrs, icrs_to_spacecraft
-from gdt.core.time import time_range
+from .time import Time
 
 __all__ = ['MaxiFrame', 'maxi_to_icrs', 'icrs_to_maxi']
 
@@ -43,45 +46,260 @@ class MaxiFrame(SpacecraftFrame):
         >>> coord = SkyCoord(100.0, -30.0, unit='deg')
         >>> az_el = SkyCoord.transform_to(maxi_frame)
     """
+    # the number of times interpolated at once by interpolate()
+    _interp_chunk = 65536
+    # the number of grid samples resampled at once by resample_orbit_attitude()
+    _resample_chunk = 1048576
+    
     # mark TODO: This should be fixed in core
     def at(self, obstime):
         """Retrieve the interpolated spacecraft positions and quaternions for 
         the specified time(s).
         
         Args:
-            obstime (astropy.time.Time): The times for which the frames are 
-                                         requested.
+            obstime (astropy.time.Time or np.array): The times for which the 
+                frames are requested.  Times that are not a Time object are 
+                MAXI seconds.
         
         Returns:
             (:class:`MaxiFrame`)
         """
-        if not self._interp:
-            self.init_interpolation()
-
-        t = obstime.unix_tai
+        if not isinstance(obstime, Time):
+            obstime = Time(obstime, format='maxi')
+        quat, geoloc, geovel = self.interpolate(obstime)
 
-        if self._interp_geovel is None:
-            geovel = None
-        else:
-            geovel = r.CartesianRepresentation(self._interp_geovel(t), unit=self.obsgeovel.x.unit)
+        if geovel is not None:
+            geovel = r.CartesianRepresentation(geovel, 
+                                               unit=self.obsgeovel.x.unit,
+                                               xyz_axis=-1)
 
-        if self._interp_quat is None:
-            quat = None
-        else:
-            quat = Quaternion.from_rotation(self._interp_quat(t))
+        if quat is not None:
+            quat = Quaternion(quat)
         
-        if self._interp_geoloc is not None:
-            obsgeoloc = r.CartesianRepresentation(self._interp_geoloc(t), 
-                                                  unit=self.obsgeoloc.x.unit)
-        else:
-            obsgeoloc = None
-            
+        if geoloc is not None:
+            geoloc = r.CartesianRepresentation(geoloc, 
+                                               unit=self.obsgeoloc.x.unit,
+                                               xyz_axis=-1)
         
-        obj = self.__class__(obstime=obstime, obsgeoloc=obsgeoloc, 
+        obj = self.__class__(obstime=obstime, obsgeoloc=geoloc, 
                              obsgeovel=geovel, quaternion=quat, 
                              detectors=self.detectors)
         return obj
     
+    def interpolate(self, times):
+        """Interpolate the spacecraft quaternions, positions and velocities at 
+        the specified time(s) and return them as plain arrays.
+        
+        This is a fast alternative to :meth:`at` for a large number of times, 
+        such as the time of every event.  The interpolation arrays are computed
+        once per frame and reused, the times are not converted through 
+        astropy if they are given in MAXI seconds, and no frame objects are 
+        created.  The quaternions are interpolated with spherical linear 
+        interpolation (slerp) and the positions and velocities are linearly 
+        interpolated.
+        
+        Args:
+            times (astropy.time.Time or np.array): The times.  Times that are 
+                not a Time object are MAXI seconds.
+        
+        Returns:
+            (np.array, np.array, np.array): The quaternions (scalar last) with 
+            shape (..., 4), and the positions and velocities in the units of 
+            the frame with shape (..., 3).  Each is None if the frame does not 
+            contain that information.
+        """
+        if isinstance(times, Time):
+            times = times.maxi
+        times = np.asarray(times, dtype=float)
+        interp = self._get_fast_interp()
+        
+        t = interp['times']
+        x = times.reshape(-1)
+        if x.size > 0:
+            if (x.min() < t[0]) or (x.max() > t[-1]):
+                raise ValueError('Interpolation times must be within the '
+                                 'time range of the frame')
+        
+        quat = None if interp['quat'] is None else np.empty((x.size, 4))
+        geoloc = None if interp['geoloc'] is None else np.empty((x.size, 3))
+        geovel = None if interp['geovel'] is None else np.empty((x.size, 3))
+        
+        # work in chunks so that the temporary arrays stay in cache
+        for i in range(0, x.size, self._interp_chunk):
+            sl = slice(i, i + self._interp_chunk)
+            # index of the sample at or before each time
+            idx = np.searchsorted(t, x[sl], side='right') - 1
+            np.clip(idx, 0, t.size - 2, out=idx)
+            frac = (x[sl] - t[idx]) * interp['inv_dt'][idx]
+            
+            if quat is not None:
+                quat[sl] = self._interp_slerp(interp['quat'], 
+                                              interp['slerp'], idx, frac)
+            if geoloc is not None:
+                geoloc[sl] = self._interp_linear(interp['geoloc'], idx, frac)
+            if geovel is not None:
+                geovel[sl] = self._interp_linear(interp['geovel'], idx, frac)
+        
+        if quat is not None:
+            quat = quat.reshape(times.shape + (4,))
+        if geoloc is not None:
+            geoloc = geoloc.reshape(times.shape + (3,))
+        if geovel is not None:
+            geovel = geovel.reshape(times.shape + (3,))
+        return quat, geoloc, geovel
+    
+    def _get_fast_interp(self):
+        """Build (once) the arrays used by :meth:`interpolate`.
+        
+        Returns:
+            (dict)
+        """
+        interp = getattr(self, '_fast_interp', None)
+        if interp is not None:
+            return interp
+        
+        if (self.obstime is None) or self.obstime.isscalar or \
+           (self.obstime.size < 2):
+            raise ValueError('Frame must have at least two samples to '
+                             'interpolate')
+        t = np.asarray(self.obstime.maxi, dtype=float)
+        if np.any(np.diff(t) <= 0.0):
+            raise ValueError('Frame times must be strictly increasing')
+        interp = {'times': t, 'inv_dt': 1.0 / np.diff(t), 'quat': None, 
+                  'slerp': None, 'geoloc': None, 'geovel': None}
+        
+        if self.quaternion is not None:
+            quat = np.column_stack((
+                   np.asarray(self.quaternion.xyz, dtype=float).reshape(-1, 3),
+                   np.asarray(self.quaternion.w, dtype=float).reshape(-1, 1)))
+            quat /= np.linalg.norm(quat, axis=1)[:, np.newaxis]
+            q0, q1 = quat[:-1], quat[1:].copy()
+            # interpolate along the shortest arc
+            dot = np.einsum('ij,ij->i', q0, q1)
+            q1[dot < 0.0] *= -1.0
+            theta = np.arccos(np.clip(np.abs(dot), 0.0, 1.0))
+            # an inverse sine of zero marks nearly identical quaternions, 
+            # which are linearly interpolated
+            inv_sin = np.zeros_like(theta)
+            cot = np.zeros_like(theta)
+            mask = theta >= 1e-6
+            inv_sin[mask] = 1.0 / np.sin(theta[mask])
+            cot[mask] = inv_sin[mask] * np.abs(dot[mask])
+            interp['quat'] = np.hstack((q0, q1))
+            interp['slerp'] = np.column_stack((theta, inv_sin, cot))
+        
+        if (self.obsgeoloc is not None) and (self.obsgeoloc.shape != ()):
+            interp['geoloc'] = self._linear_coeffs(self.obsgeoloc)
+        if (self.obsgeovel is not None) and (self.obsgeovel.shape != ()):
+            interp['geovel'] = self._linear_coeffs(self.obsgeovel)
+        
+        self._fast_interp = interp
+        return interp
+    
+    @staticmethod
+    def _linear_coeffs(rep):
+        """The start value and difference of each interval between samples
+        
+        Args:
+            rep (astropy.coordinates.CartesianRepresentation): The values
+        
+        Returns:
+            (np.array): The start values and differences, shape (n-1, 6)
+        """
+        xyz = np.array(rep.xyz.value, dtype=float).T
+        return np.hstack((xyz[:-1], np.diff(xyz, axis=0)))
+    
+    @staticmethod
+    def _interp_linear(coeffs, idx, frac):
+        """Linearly interpolate between samples.
+        
+        Args:
+            coeffs (np.array): The coefficients from _linear_coeffs()
+            idx (np.array): The interval index of each time
+            frac (np.array): The fractional position of each time in the
+                             interval
+        
+        Returns:
+            (np.array): The interpolated values, shape (n, 3)
+        """
+        c = coeffs[idx]
+        return c[:, :3] + frac[:, np.newaxis] * c[:, 3:]
+
+    @staticmethod
+    def _interp_slerp(quats, slerp, idx, frac):
+        """Spherical linear interpolation between quaternions.
+        
+        Args:
+            quats (np.array): The start and end quaternion of each interval, 
+                              shape (n-1, 8)
+            slerp (np.array): The angle between the quaternions of each 
+                              interval, and the inverse sine and cotangent of 
+                              the angle, shape (n-1, 3)
+            idx (np.array): The interval index of each time
+            frac (np.array): The fractional position of each time in the
+                             interval
+        
+        Returns:
+            (np.array): The interpolated quaternions, shape (n, 4)
+        """
+        q = quats[idx]
+        theta, inv_sin, cot = slerp[idx].T
+        # sin((1-f)theta) / sin(theta) = cos(f theta) - sin(f theta) cot(theta)
+        # and f theta <= pi/2, so only one sine is needed
+        sin_ft = np.sin(frac * theta)
+        w1 = sin_ft * inv_sin
+        w0 = np.sqrt(1.0 - sin_ft * sin_ft) - sin_ft * cot
+        
+        small = (inv_sin == 0.0)
+        if small.any():
+            w0[small] = 1.0 - frac[small]
+            w1[small] = frac[small]
+        quat = w0[:, np.newaxis] * q[:, :4] + w1[:, np.newaxis] * q[:, 4:]
+        if small.any():
+            quat[small] /= np.linalg.norm(quat[small], axis=1)[:, np.newaxis]
+        return quat
+    
+    def fov_angles(self, coord, fov):
+        """Calculate the angles of a sky position relative to the center of a 
+        GSC field of view for every attitude sample in the frame.  The 
+        calculation is vectorized over all attitude samples.
+        
+        The FOVs are ~160 degrees long and ~3 degrees wide.  The first angle 
+        is measured along the long axis of the FOV, and the second angle is 
+        measured across the FOV (perpendicular to the long axis).
+        
+        Args:
+            coord (astropy.coordinates.SkyCoord): A single sky position
+            fov (:class:`~gdt.missions.maxi.gsc.detectors.GscFov` or str):
+                The field of view, 'H' or 'Z'
+        
+        Returns:
+            (np.array, np.array): The angles along and across the FOV in degrees
+        """
+        if self.quaternion is None:
+            raise TypeError('frame has no attitude data')
+        if not isinstance(fov, str):
+            fov = fov.name
+        if fov not in ('H', 'Z'):
+            raise ValueError('fov must be either H or Z')
+        
+        xyz = coord.icrs.cartesian.xyz.value.reshape(-1)
+        if xyz.size != 3:
+            raise ValueError('coord must be a single sky position')
+        xyz = np.atleast_2d(Rotation.from_quat(self.quaternion).inv().apply(xyz))
+        x, y, z = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+        
+        if fov == 'H':
+            # centered on +X, long axis in the X-Y plane
+            along = np.arctan2(y, x)
+            across = np.arcsin(np.clip(z, -1.0, 1.0))
+        else:
+            # centered on -Z, long axis in the Y-Z plane
+            along = np.arctan2(y, -z)
+            across = np.arcsin(np.clip(x, -1.0, 1.0))
+        
+        return np.rad2deg(along), np.rad2deg(across)
+    
     @classmethod
     def combine_orbit_attitude(cls, orb_frame, att_frame, sample_period=1.0):
         """Combine the orbit and attitude information into a single frame.
@@ -101,6 +319,53 @@ class MaxiFrame(SpacecraftFrame):
         Returns:
             (:class:`MaxiFrame`)
         """
+        times, quat, geoloc, geovel = cls.resample_orbit_attitude(orb_frame, 
+                                                                  att_frame,
+                                                  sample_period=sample_period)
+        
+        obsgeoloc = r.CartesianRepresentation(geoloc, 
+                                              unit=orb_frame.obsgeoloc.x.unit,
+                                              xyz_axis=-1)
+        if geovel is not None:
+            geovel = r.CartesianRepresentation(geovel, 
+                                               unit=orb_frame.obsgeovel.x.unit,
+                                               xyz_axis=-1)
+        
+        sc_frame = cls(obsgeoloc=obsgeoloc, obsgeovel=geovel,
+                       quaternion=Quaternion(quat),
+                       obstime=Time(times, format='maxi'),
+                       detectors=att_frame.detectors)
+        return sc_frame
+
+    @staticmethod
+    def resample_orbit_attitude(orb_frame, att_frame, sample_period=1.0, 
+                                out_dir=None):
+        """Interpolate the orbit and attitude information onto a common grid 
+        of times and return plain arrays.  This is the array equivalent of 
+        :meth:`combine_orbit_attitude`, and no astropy objects are created.
+        
+        For long timelines, the arrays can be written to memory-mapped 
+        ``.npy`` files in ``out_dir`` (``times.npy``, ``quaternion.npy``, 
+        ``obsgeoloc.npy`` and ``obsgeovel.npy``), which can later be opened 
+        with ``np.load(..., mmap_mode='r')``.  The grid is then interpolated in 
+        blocks, so the memory used does not depend on the length of the 
+        timeline.
+        
+        Args:
+            orb_frame (:class:`MaxiFrame`): The orbital frame
+            att_frame (:class:`MaxiFrame`): The attitude (orientation) frame
+            sample_period (float, optional): The sampling period of the grid in
+                                             unit of seconds.
+            out_dir (str, optional): If set, the directory in which to write 
+                                     the memory-mapped arrays
+        
+        Returns:
+            (np.array, np.array, np.array, np.array): The times in MAXI 
+            seconds, the quaternions (scalar last) with shape (n, 4), and the 
+            positions and velocities in the units of the orbital frame with 
+            shape (n, 3).  The velocities are None if the orbital frame does not
+            contain velocities.
+        """
         if sample_period <= 0.0:
             raise ValueError('sample_period must be > 0')
         
@@ -112,19 +377,45 @@ class MaxiFrame(SpacecraftFrame):
         
         # must select the intersection of the two times because we cannot 
         # extrapolate.
-        tstart = max(orb_frame.obstime[0], att_frame.obstime[0])
-        tstop = min(orb_frame.obstime[-1], att_frame.obstime[-1])
-        times = time_range(tstart, tstop, step=sample_period)
-        
-        orb_frame_interp = orb_frame.at(times)
-        att_frame_interp = att_frame.at(times)
-        
-        sc_frame = cls(obsgeoloc=orb_frame_interp.obsgeoloc,
-                       obsgeovel=orb_frame_interp.obsgeovel,
-                       quaternion=att_frame_interp.quaternion,
-                       obstime=att_frame_interp.obstime,
-                       detectors=att_frame_interp.detectors)
-        return sc_frame
+        orb_times = orb_frame._get_fast_interp()['times']
+        att_times = att_frame._get_fast_interp()['times']
+        tstart = max(orb_times[0], att_times[0])
+        tstop = min(orb_times[-1], att_times[-1])
+        if tstop <= tstart:
+            raise ValueError('orb_frame and att_frame do not overlap in time')
+        # same grid as gdt.core.time.time_range(): tstop is excluded
+        num_samples = int(np.ceil((tstop - tstart) / sample_period))
+        has_vel = orb_frame._get_fast_interp()['geovel'] is not None
+        
+        shapes = {'times': (num_samples,), 'quaternion': (num_samples, 4),
+                  'obsgeoloc': (num_samples, 3)}
+        if has_vel:
+            shapes['obsgeovel'] = (num_samples, 3)
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+            arrays = {name: np.lib.format.open_memmap(
+                                   os.path.join(out_dir, name + '.npy'), 
+                                   mode='w+', dtype=float, shape=shape)
+                      for name, shape in shapes.items()}
+        else:
+            arrays = {name: np.empty(shape) for name, shape in shapes.items()}
+        
+        for i in range(0, num_samples, MaxiFrame._resample_chunk):
+            sl = slice(i, min(i + MaxiFrame._resample_chunk, num_samples))
+            times = tstart + np.arange(sl.start, sl.stop) * sample_period
+            arrays['times'][sl] = times
+            arrays['quaternion'][sl] = att_frame.interpolate(times)[0]
+            _, geoloc, geovel = orb_frame.interpolate(times)
+            arrays['obsgeoloc'][sl] = geoloc
+            if has_vel:
+                arrays['obsgeovel'][sl] = geovel
+        
+        if out_dir is not None:
+            for array in arrays.values():
+                array.flush()
+        
+        return (arrays['times'], arrays['quaternion'], arrays['obsgeoloc'],
+                arrays.get('obsgeovel'))
 
 
 @frame_transform_graph.transform(FunctionTransform, MaxiFrame, ICRS)
@@ -0,0 +1,904 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+from gdt.core.data_primitives import EventList, Gti, TimeChannelBins, \
+                                    TimeEnergyBins
+from gdt.core.phaii import Phaii
+from gdt.core.tte import PhotonList
+from .detectors import GscDetectors
+
+__all__ = ['IncrementalBinner', 'bin_events', 'bin_products']
+
+
+def bin_events(tte, bin_method, *args, time_range=None, channel_range=None,
+               channel_edges=None, gti_exposure=True, livetime=None, 
+               **kwargs):
+    """Bin the events of a :class:`~gdt.missions.maxi.gsc.tte.GscTte` in time
+    and channel with a single histogram pass over the events.
+    
+    The time edges are given by the binning function, as in 
+    :meth:`~gdt.missions.maxi.gsc.tte.GscTte.to_phaii`.  The deadtime of each
+    bin is that of all of the events in the bin, and if ``gti_exposure`` is 
+    True, the exposure of each bin only includes the good time within the bin.
+    
+    Args:
+        tte (:class:`~gdt.missions.maxi.gsc.tte.GscTte`): The event data
+        bin_method (<function>): A binning function for unbinned data
+        *args: Arguments to pass to the binning function
+        time_range ((float, float), optional): The time range to bin.  If 
+                                               omitted, uses the time range of
+                                               the events.
+        channel_range ((int, int), optional): The channel range to bin.  If 
+                                              omitted, uses all channels.
+        channel_edges (list of int, optional): 
+            If set, the channels are combined into bands, where band ``i`` 
+            contains channels ``channel_edges[i]`` to 
+            ``channel_edges[i+1] - 1``, as in 
+            :func:`~gdt.core.binning.binned.rebin_by_edge_index`.  Cannot be 
+            used with ``channel_range``.
+        gti_exposure (bool, optional): If True, the exposure only includes 
+                                       the good time in each bin.  Default is
+                                       True.
+        livetime (:class:`~gdt.missions.maxi.gsc.livetime.GscLivetime`, optional):
+            If set, the exposure is calculated from the livetime of each GSC
+            counter, weighted by the counts of each counter in the channel 
+            range, and ``gti_exposure`` is ignored.
+        **kwargs: Options to pass to the binning function
+    
+    Returns:
+        (:class:`~gdt.core.data_primitives.TimeEnergyBins` or 
+         :class:`~gdt.core.data_primitives.TimeChannelBins`)
+    """
+    # the event fields are strided views, which searchsorted would copy on 
+    # every call
+    times = np.ascontiguousarray(tte.data.times)
+    chans = tte.data.channels
+    num_chans = _num_channels(tte)
+    if channel_edges is not None:
+        if channel_range is not None:
+            raise ValueError('Only one of channel_range and channel_edges ' \
+                             'can be set')
+        channel_edges = np.asarray(channel_edges, dtype=int)
+        if (channel_edges.size < 2) or np.any(np.diff(channel_edges) <= 0):
+            raise ValueError('channel_edges must be increasing')
+        channel_range = (channel_edges[0], channel_edges[-1] - 1)
+    if channel_range is None:
+        channel_range = (0, num_chans - 1)
+    _check_channel_range(channel_range, num_chans)
+    
+    is_sorted = np.all(times[1:] >= times[:-1])
+    if time_range is None:
+        if is_sorted and (times.size > 0):
+            time_range = (times[0], times[-1])
+        else:
+            time_range = tte.data.time_range
+    tstart, tstop = time_range
+    if is_sorted:
+        i0 = np.searchsorted(times, tstart, side='left')
+        i1 = np.searchsorted(times, tstop, side='right')
+        times, chans = times[i0:i1], chans[i0:i1]
+    else:
+        mask = (times >= tstart) & (times <= tstop)
+        times, chans = times[mask], chans[mask]
+    edges = bin_method(times, *args, tstart=tstart, tstop=tstop, **kwargs)
+    edges = np.asarray(edges, dtype=float)
+    num_times = edges.size - 1
+    
+    if is_sorted:
+        # the events in each bin are a contiguous slice
+        bounds = np.searchsorted(times, edges, side='left')
+        bounds[-1] = np.searchsorted(times, edges[-1], side='right')
+        num_events = np.diff(bounds)
+        chans = chans[bounds[0]:bounds[-1]]
+        overflow = None
+        if _counts_overflow(tte):
+            over_idx = np.flatnonzero(chans == num_chans - 1)
+            overflow = np.diff(np.searchsorted(over_idx, bounds - bounds[0]))
+    else:
+        tidx = _time_index(times, edges)
+        in_time = (tidx >= 0) & (tidx < num_times)
+        tidx, chans = tidx[in_time], chans[in_time]
+        num_events = np.bincount(tidx, minlength=num_times)
+        overflow = None
+        if _counts_overflow(tte):
+            overflow = np.bincount(tidx[chans == num_chans - 1], 
+                                   minlength=num_times)
+    
+    # all events in a bin contribute to its deadtime
+    deadtime = _bin_deadtime(tte, num_events, overflow)
+    
+    chan_lo, chan_hi = channel_range
+    width = chan_hi - chan_lo + 1
+    if is_sorted and (width == num_chans) and (channel_edges is None):
+        # the key of each event is the offset of its time bin plus its 
+        # channel, built in place without an index array per event
+        keys = np.repeat(np.arange(num_times, dtype=np.int64) * width, 
+                         num_events)
+        keys += chans
+    else:
+        if is_sorted:
+            tidx = np.repeat(np.arange(num_times), num_events)
+        if width < num_chans:
+            in_chan = (chans >= chan_lo) & (chans <= chan_hi)
+            tidx, chans = tidx[in_chan], chans[in_chan]
+        if channel_edges is not None:
+            width = channel_edges.size - 1
+            bands = np.searchsorted(channel_edges, chans, side='right') - 1
+            keys = tidx * width + bands
+        else:
+            keys = tidx * width + (chans.astype(np.int64) - chan_lo)
+    counts = np.bincount(keys, minlength=num_times * width)
+    counts = counts.reshape(num_times, width)
+    
+    if livetime is not None:
+        weight_range = _weight_range(channel_range, num_chans)
+        exposure = livetime.exposure(edges[:-1], edges[1:], 
+                                     channel_range=weight_range)
+    else:
+        exposure = _bin_exposure(tte, edges, deadtime, gti_exposure)
+    
+    return _make_bins(tte, counts, edges, exposure, channel_range, 
+                      channel_edges=channel_edges)
+
+
+def bin_products(tte, binnings, channel_ranges=None, detectors=None, 
+                 time_range=None, gti_exposure=True, livetime=None, 
+                 num_processes=None):
+    """Bin the events of a :class:`~gdt.missions.maxi.gsc.tte.GscTte` into 
+    many PHAII products at once, one for each combination of time binning, 
+    channel range and set of detectors.  Each time binning is done in a single
+    pass over the events, which is split across a pool of processes if 
+    ``num_processes`` is greater than 1.
+    
+    The time edges of a binning are computed once from all of the events, so 
+    the products for the same binning share the same time bins.  As in 
+    :func:`bin_events`, the deadtime of each bin is that of all of the events
+    in the bin, whatever their channel or detector, and if ``gti_exposure`` 
+    is True, the exposure of each bin only includes the good time within the
+    bin, so a product over all channels and detectors is the same as 
+    :meth:`~gdt.missions.maxi.gsc.tte.GscTte.to_phaii_fast`.
+    
+    Args:
+        tte (:class:`~gdt.missions.maxi.gsc.tte.GscTte`): The event data
+        binnings (dict): The time binnings, where each value is a tuple of 
+                         the binning function and its arguments, e.g. 
+                         ``{'8s': (bin_by_time, 8.192)}``.  A dict may be 
+                         included as the last element of the tuple for the 
+                         keyword arguments of the binning function.
+        channel_ranges (dict, optional): 
+            The channel ranges, e.g. ``{'soft': (50, 200)}``.  If omitted, the
+            full channel range is used, with a key of None.
+        detectors (dict, optional): 
+            The sets of detectors, as :class:`GscDetectors`, detector names or
+            numbers, e.g. ``{'H': GscDetectors.h_detectors()}``.  This 
+            requires the detector event column to have been loaded.  If 
+            omitted, all events are used, with a key of None.
+        time_range ((float, float), optional): The time range to bin.  If 
+                                               omitted, uses the time range of
+                                               the events.
+        gti_exposure (bool, optional): If True, the exposure only includes 
+                                       the good time in each bin.  Default is
+                                       True.
+        livetime (:class:`~gdt.missions.maxi.gsc.livetime.GscLivetime`, optional):
+            If set, the exposure of each product is calculated from the 
+            livetime of the GSC counters in its set of detectors, weighted by
+            their counts in its channel range, and ``gti_exposure`` is 
+            ignored.
+        num_processes (int, optional): The number of processes.  If omitted 
+                                       or 1, the binning is done in this 
+                                       process.
+    
+    Returns:
+        (dict): The :class:`~gdt.core.phaii.Phaii` products, keyed by 
+                (binning key, channel range key, detectors key)
+    """
+    if len(binnings) == 0:
+        raise ValueError('At least one binning is required')
+    if num_processes is not None and int(num_processes) < 1:
+        raise ValueError('num_processes must be at least 1')
+    
+    times = tte.data.times
+    chans = tte.data.channels
+    
+    # channel ranges
+    num_chans = _num_channels(tte)
+    if channel_ranges is None:
+        channel_ranges = {None: (0, num_chans - 1)}
+    for chan_range in channel_ranges.values():
+        _check_channel_range(chan_range, num_chans)
+    chan_lo = min([r[0] for r in channel_ranges.values()])
+    chan_hi = max([r[1] for r in channel_ranges.values()])
+    
+    # each event is assigned to a group of detectors that belong to the same 
+    # detector sets, so that the events only need to be histogrammed once 
+    # per group.  Events not in any set are assigned -1.
+    if detectors is None:
+        detectors = {None: None}
+        groups = np.zeros(times.size, dtype=np.int8)
+        group_sets = [np.array([True])]
+    else:
+        det_col = tte.detector_column
+        if det_col is None:
+            raise RuntimeError('The detector column has not been loaded. ' \
+                               'Open the file with columns=True.')
+        det_nums = tte.event_columns[det_col]
+        members = np.array([_detector_mask(dets) for dets in \
+                            detectors.values()])
+        group_sets, det_groups = np.unique(members.T, axis=0, 
+                                           return_inverse=True)
+        det_groups = det_groups.ravel().astype(np.int8)
+        det_groups[~members.any(axis=0)] = -1
+        groups = det_groups[det_nums]
+        group_sets = list(group_sets.T)
+    num_groups = len(group_sets[0])
+    
+    if time_range is None:
+        time_range = tte.data.time_range
+    tstart, tstop = time_range
+    
+    # the events are split across the processes in contiguous blocks of time
+    if (num_processes is not None) and (int(num_processes) > 1) and \
+       not np.all(times[1:] >= times[:-1]):
+        order = np.argsort(times, kind='stable')
+        times, chans, groups = times[order], chans[order], groups[order]
+    
+    results = {}
+    in_range = (times >= tstart) & (times <= tstop)
+    bin_times, bin_chans = times[in_range], chans[in_range]
+    with _EventArrays(times, chans, groups, num_processes) as arrays:
+        for bin_key, binning in binnings.items():
+            bin_method, args, kwargs = _split_binning(binning)
+            edges = bin_method(bin_times, *args, tstart=tstart, tstop=tstop,
+                               **kwargs)
+            edges = np.asarray(edges, dtype=float)
+            num_times = edges.size - 1
+            
+            # all events in a bin contribute to its deadtime
+            if livetime is None:
+                tidx = _time_index(bin_times, edges)
+                in_time = (tidx >= 0) & (tidx < num_times)
+                tidx = tidx[in_time]
+                overflow = None
+                if _counts_overflow(tte):
+                    is_over = bin_chans[in_time] == num_chans - 1
+                    overflow = np.bincount(tidx[is_over], 
+                                           minlength=num_times)
+                deadtime = _bin_deadtime(tte, np.bincount(tidx, 
+                                         minlength=num_times), overflow)
+                exposure = _bin_exposure(tte, edges, deadtime, gti_exposure)
+            
+            # counts[group, time, channel]
+            counts = arrays.histogram(edges, chan_lo, chan_hi, num_groups)
+            
+            for det_key, group_set in zip(detectors.keys(), group_sets):
+                if group_set.sum() == 1:
+                    det_counts = counts[np.flatnonzero(group_set)[0]]
+                else:
+                    det_counts = counts[group_set].sum(axis=0)
+                for chan_key, chan_range in channel_ranges.items():
+                    if livetime is not None:
+                        weight_range = _weight_range(chan_range, num_chans)
+                        exposure = livetime.exposure(edges[:-1], edges[1:], 
+                                                detectors=detectors[det_key],
+                                                channel_range=weight_range)
+                    i0 = chan_range[0] - chan_lo
+                    i1 = chan_range[1] - chan_lo + 1
+                    phaii = _make_phaii(tte, det_counts[:, i0:i1], edges, 
+                                        exposure, chan_range)
+                    results[(bin_key, chan_key, det_key)] = phaii
+    
+    return results
+
+
+class IncrementalBinner():
+    """Bins events into fixed-width time bins as they arrive, for example for 
+    a quick-look monitor that receives the events for a day in pieces.  Each
+    call to :meth:`add_events` only bins the new events, and returns the bins
+    that have been completed by them, so the cost of an update does not grow
+    with the amount of data already binned.  :meth:`to_phaii` creates a Phaii
+    of all of the completed bins without copying them.
+    
+    The bins start at ``tstart`` and are ``resolution`` wide.  A bin is 
+    complete once the data is complete up to its end, which is either the 
+    ``tstop`` given to :meth:`add_events` or the time of the latest event.  
+    The exposure of a bin is calculated when it is completed, from the good 
+    time within the bin minus the deadtime of its events, so GTIs must be
+    added before the bins they cover are completed.
+    
+    Parameters:
+        resolution (float): The width of the time bins
+        tstart (float): The start time of the first bin
+        num_chans (int): The number of energy channels
+        ebounds (:class:`~gdt.core.data_primitives.Ebounds`, optional): 
+            The energy calibration.  If set, the bins are 
+            :class:`~gdt.core.data_primitives.TimeEnergyBins`, otherwise they
+            are :class:`~gdt.core.data_primitives.TimeChannelBins`.
+        deadtime (float, optional): The deadtime per event.  If omitted, the 
+                                    event deadtime of 
+                                    :class:`~gdt.missions.maxi.gsc.tte.GscTte`
+                                    is used.
+        trigtime (float, optional): The trigger time of the Phaii, if the 
+                                    event times are relative to it.
+    """
+    def __init__(self, resolution, tstart, num_chans, ebounds=None, 
+                 deadtime=None, trigtime=None):
+        if resolution <= 0.0:
+            raise ValueError('resolution must be positive')
+        if num_chans < 1:
+            raise ValueError('num_chans must be positive')
+        if (ebounds is not None) and (ebounds.num_intervals != num_chans):
+            raise ValueError('ebounds must have num_chans intervals')
+        self._resolution = float(resolution)
+        self._tstart = float(tstart)
+        self._num_chans = int(num_chans)
+        self._ebounds = ebounds
+        if deadtime is None:
+            # tte imports this module
+            from .tte import GscTte
+            deadtime = GscTte._event_deadtime
+        self._deadtime = float(deadtime)
+        self._trigtime = trigtime
+        
+        # counts of every bin that has received events, and the exposure of 
+        # the completed bins, in buffers that grow by doubling
+        self._counts = np.zeros((0, self._num_chans), dtype=np.int64)
+        self._exposure = np.zeros(0)
+        self._uncerts = np.zeros((0, self._num_chans))
+        self._num_bins = 0
+        self._num_complete = 0
+        self._horizon = self._tstart
+        self._gti_start = np.array([])
+        self._gti_stop = np.array([])
+    
+    @property
+    def horizon(self):
+        """(float): The time up to which the data is complete"""
+        return self._horizon
+    
+    @property
+    def num_bins(self):
+        """(int): The number of completed bins"""
+        return self._num_complete
+    
+    @property
+    def resolution(self):
+        """(float): The width of the time bins"""
+        return self._resolution
+    
+    def add_events(self, data, tstop=None):
+        """Bin a new piece of events, and return the bins completed by it.  
+        The events must not be earlier than the :attr:`horizon` of the 
+        previous pieces.
+        
+        Args:
+            data (:class:`~gdt.core.data_primitives.EventList` or 
+                  :class:`~gdt.core.tte.PhotonList`): 
+                The new events.  If a PhotonList, its GTIs are also added.
+            tstop (float, optional): The time up to which the data is 
+                                     complete.  If omitted, the time of the
+                                     latest event.
+        
+        Returns:
+            (:class:`~gdt.core.data_primitives.TimeEnergyBins` or 
+             :class:`~gdt.core.data_primitives.TimeChannelBins`): 
+                The newly completed bins, which may be empty
+        """
+        if isinstance(data, PhotonList):
+            if data.gti is not None:
+                self.add_gti(data.gti)
+            data = data.data
+        if not isinstance(data, EventList):
+            raise TypeError('data must be an EventList or PhotonList')
+        
+        times = data.times
+        chans = data.channels
+        if times.size > 0:
+            if times.min() < self._horizon:
+                raise ValueError('Events are earlier than the horizon')
+            if (chans.min() < 0) or (chans.max() >= self._num_chans):
+                raise ValueError('Channels must be less than num_chans')
+        if tstop is None:
+            tstop = times.max() if times.size > 0 else self._horizon
+        elif (times.size > 0) and (times.max() > tstop):
+            raise ValueError('Events are later than tstop')
+        if tstop < self._horizon:
+            raise ValueError('tstop is earlier than the horizon')
+        
+        # the new events only fall in bins at or after the first incomplete 
+        # bin
+        if times.size > 0:
+            bins = np.floor((times - self._tstart) / self._resolution)
+            bins = bins.astype(np.int64)
+            first, last = self._num_complete, bins.max()
+            self._grow(last + 1)
+            keys = (bins - first) * self._num_chans + chans
+            counts = np.bincount(keys, 
+                                 minlength=(last - first + 1) * self._num_chans)
+            self._counts[first:last + 1] += counts.reshape(-1, self._num_chans)
+            self._num_bins = max(self._num_bins, last + 1)
+        self._horizon = float(tstop)
+        
+        # complete the bins that end at or before the horizon
+        first = self._num_complete
+        last = int(np.floor((self._horizon - self._tstart) / self._resolution))
+        last = max(last, first)
+        self._grow(last)
+        self._num_bins = max(self._num_bins, last)
+        edges = self._edges(first, last)
+        deadtime = self._counts[first:last].sum(axis=1) * self._deadtime
+        if self._gti_start.size > 0:
+            good_time = np.diff(_gti_coverage(self._gti_start, self._gti_stop,
+                                              edges))
+        else:
+            good_time = np.diff(edges)
+        self._exposure[first:last] = np.maximum(good_time - deadtime, 0.0)
+        self._uncerts[first:last] = np.sqrt(self._counts[first:last])
+        self._num_complete = last
+        return self._make_bins(first, last)
+    
+    def add_gti(self, gti):
+        """Add good time intervals.  The GTIs are combined with the GTIs 
+        already added.  Only the exposure of bins that are not yet complete is
+        affected.
+        
+        Args:
+            gti (:class:`~gdt.core.data_primitives.Gti` or list of tuples): 
+                The good time intervals
+        """
+        if isinstance(gti, Gti):
+            gti = gti.as_list()
+        bounds = np.asarray(gti, dtype=float).reshape(-1, 2)
+        self._gti_start, self._gti_stop = _interval_union(
+                           np.concatenate((self._gti_start, bounds[:, 0])), 
+                           np.concatenate((self._gti_stop, bounds[:, 1])))
+    
+    def to_phaii(self):
+        """Create a Phaii of all of the completed bins.  The Phaii shares the 
+        memory of the binner, which is never modified once a bin is complete,
+        so this does not copy the bins that were already completed.
+        
+        Returns:
+            (:class:`~gdt.core.phaii.Phaii`)
+        """
+        bins = self._make_bins(0, self._num_complete)
+        gti = None
+        if self._gti_start.size > 0:
+            gti = Gti.from_bounds(self._gti_start, self._gti_stop)
+        elif bins.num_times > 0:
+            gti = Gti.from_list([(bins.tstart[0], bins.tstop[-1])])
+        return Phaii.from_data(bins, gti=gti, trigger_time=self._trigtime)
+    
+    def _edges(self, first, last):
+        """The edges of the bins from index first to last"""
+        return self._tstart + np.arange(first, last + 1) * self._resolution
+    
+    def _grow(self, num_bins):
+        """Grow the buffers to hold at least num_bins bins"""
+        size = self._counts.shape[0]
+        if num_bins <= size:
+            return
+        size = max(num_bins, 2 * size, 64)
+        counts = np.zeros((size, self._num_chans), dtype=np.int64)
+        counts[:self._num_bins] = self._counts[:self._num_bins]
+        exposure = np.zeros(size)
+        exposure[:self._num_complete] = self._exposure[:self._num_complete]
+        uncerts = np.zeros((size, self._num_chans))
+        uncerts[:self._num_complete] = self._uncerts[:self._num_complete]
+        self._counts, self._exposure = counts, exposure
+        self._uncerts = uncerts
+    
+    def _make_bins(self, first, last):
+        """Create the bins from index first to last, as read-only views of 
+        the buffers"""
+        edges = self._edges(first, last)
+        arrays = [self._counts[first:last], self._exposure[first:last], 
+                  self._uncerts[first:last]]
+        for arr in arrays:
+            arr.flags.writeable = False
+        counts, exposure, uncerts = arrays
+        if self._ebounds is not None:
+            return TimeEnergyBins(counts, edges[:-1], edges[1:], exposure,
+                                  self._ebounds.low_edges(), 
+                                  self._ebounds.high_edges(), 
+                                  count_uncerts=uncerts)
+        return TimeChannelBins(counts, edges[:-1], edges[1:], exposure, 
+                               np.arange(self._num_chans), 
+                               count_uncerts=uncerts)
+
+
+def _bin_deadtime(tte, num_events, overflow=None):
+    """The deadtime of each time bin, from all of the events in the bin.
+    
+    Args:
+        tte (:class:`~gdt.missions.maxi.gsc.tte.GscTte`): The event data
+        num_events (np.array): The number of events in each time bin
+        overflow (np.array, optional): The number of overflow events in each 
+                                       time bin.  Only needed if 
+                                       :func:`_counts_overflow` is True.
+    
+    Returns:
+        (np.array)
+    """
+    deadtime = num_events * tte.event_deadtime
+    if overflow is not None:
+        deadtime += overflow * (tte.overflow_deadtime - tte.event_deadtime)
+    return deadtime
+
+
+def _bin_exposure(tte, edges, deadtime, gti_exposure):
+    """The exposure of each time bin, which is the bin width, or the good 
+    time within the bin if ``gti_exposure`` is True, minus the deadtime.
+    
+    Args:
+        tte (:class:`~gdt.missions.maxi.gsc.tte.GscTte`): The event data
+        edges (np.array): The time bin edges
+        deadtime (np.array): The deadtime of each bin
+        gti_exposure (bool): If True, only include the good time
+    
+    Returns:
+        (np.array)
+    """
+    if gti_exposure and (tte.gti is not None):
+        bounds = np.array(tte.gti.as_list(), dtype=float).reshape(-1, 2)
+        coverage = _gti_coverage(bounds[:, 0], bounds[:, 1], edges)
+        # bins outside of the GTIs have no exposure
+        return np.maximum(np.diff(coverage) - deadtime, 0.0)
+    return np.diff(edges) - deadtime
+
+
+def _call_shared(func, specs, *args):
+    """Call a function with arrays held in shared memory, followed by the 
+    other arguments, for example in a pool process.  The result must not 
+    reference the shared arrays.
+    
+    Args:
+        func (<function>): The function
+        specs (list): The (name, dtype, shape) of each array, as returned by 
+                      :class:`_SharedArrays`
+        *args: The other arguments of the function
+    
+    Returns:
+        The result of the function
+    """
+    shms = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    try:
+        arrays = [np.ndarray(shape, dtype=dtype, buffer=shm.buf) \
+                  for shm, (_, dtype, shape) in zip(shms, specs)]
+        result = func(*arrays, *args)
+        del arrays
+    finally:
+        for shm in shms:
+            shm.close()
+    return result
+
+
+def _check_channel_range(channel_range, num_chans):
+    """Check that a channel range is within the channels of the data"""
+    if (channel_range[0] < 0) or (channel_range[1] >= num_chans) or \
+       (channel_range[0] > channel_range[1]):
+        raise ValueError('Invalid channel range {}'.format(channel_range))
+
+
+def _counts_overflow(tte):
+    """True if the overflow channel has a different deadtime than the other
+    channels, so the overflow events must be counted separately"""
+    return (tte.ebounds is not None) and \
+           (tte.overflow_deadtime != tte.event_deadtime)
+
+
+def _detector_mask(detectors):
+    """A boolean mask over the detector numbers for a set of detectors"""
+    mask = np.zeros(256, dtype=bool)
+    if isinstance(detectors, (str, int, GscDetectors)):
+        detectors = [detectors]
+    for det in detectors:
+        if isinstance(det, str):
+            det = GscDetectors.from_str(det)
+            if det is None:
+                raise ValueError('Unknown detector')
+        if isinstance(det, GscDetectors):
+            det = det.number
+        mask[int(det)] = True
+    return mask
+
+
+def _histogram(times, chans, groups, edges, chan_lo, chan_hi, num_groups):
+    """Histogram a time-sorted block of events in group, time and channel.  
+    Only the time bins spanned by the events are returned.
+    
+    Returns:
+        (int, np.array): The index of the first time bin and the counts
+    """
+    num_times = edges.size - 1
+    num_chans = chan_hi - chan_lo + 1
+    
+    tidx = _time_index(times, edges)
+    mask = (tidx >= 0) & (tidx < num_times) & (chans >= chan_lo) & \
+           (chans <= chan_hi) & (groups >= 0)
+    if not mask.any():
+        return 0, np.zeros((num_groups, 0, num_chans), dtype=np.int64)
+    tidx = tidx[mask]
+    t0 = tidx.min()
+    nt = tidx.max() - t0 + 1
+    
+    keys = (groups[mask].astype(np.int64) * nt + (tidx - t0)) * num_chans + \
+           (chans[mask].astype(np.int64) - chan_lo)
+    counts = np.bincount(keys, minlength=num_groups * nt * num_chans)
+    return t0, counts.reshape(num_groups, nt, num_chans)
+
+
+def _gti_coverage(starts, stops, times):
+    """The cumulative good time up to each of a set of times.  The good time 
+    within a bin is the difference of the coverage at its edges.
+    
+    Args:
+        starts (np.array): The GTI starts
+        stops (np.array): The GTI stops
+        times (np.array): The times
+    
+    Returns:
+        (np.array)
+    """
+    starts, stops = _interval_union(starts, stops)
+    if starts.size == 0:
+        return np.zeros(times.size)
+    durations = stops - starts
+    cumulative = np.concatenate(([0.0], np.cumsum(durations)[:-1]))
+    
+    # the last GTI starting at or before each time
+    idx = np.searchsorted(starts, times, side='right') - 1
+    before = idx < 0
+    idx[before] = 0
+    coverage = cumulative[idx] + np.clip(times - starts[idx], 0.0, 
+                                         durations[idx])
+    coverage[before] = 0.0
+    return coverage
+
+
+def _histogram_block(times, chans, groups, out, start, stop, edges, chan_lo, 
+                     chan_hi, num_groups):
+    """Histogram a block of the events, adding the counts to the output 
+    array.  Used with :func:`_call_shared`, where the blocks must span 
+    disjoint time bins."""
+    t0, block = _histogram(times[start:stop], chans[start:stop], 
+                           groups[start:stop], edges, chan_lo, chan_hi, 
+                           num_groups)
+    out[:, t0:t0 + block.shape[1], :] += block
+
+
+def _interval_union(starts, stops):
+    """The union of a set of intervals, as sorted, non-overlapping 
+    intervals.
+    
+    Args:
+        starts (np.array): The interval starts
+        stops (np.array): The interval stops
+    
+    Returns:
+        (np.array, np.array)
+    """
+    starts = np.asarray(starts, dtype=float)
+    stops = np.asarray(stops, dtype=float)
+    if starts.size == 0:
+        return starts, stops
+    order = np.argsort(starts, kind='stable')
+    starts, stops = starts[order], stops[order]
+    
+    # an interval begins a new group if it starts after the end of all 
+    # previous intervals
+    max_stops = np.maximum.accumulate(stops)
+    new_group = np.ones(starts.size, dtype=bool)
+    new_group[1:] = starts[1:] > max_stops[:-1]
+    group_idx = np.flatnonzero(new_group)
+    last_idx = np.append(group_idx[1:] - 1, starts.size - 1)
+    return starts[group_idx], max_stops[last_idx]
+
+
+def _make_bins(tte, counts, edges, exposure, chan_range, channel_edges=None):
+    """Create the time-channel or time-energy bins of a product"""
+    if channel_edges is not None:
+        lo_chans, hi_chans = channel_edges[:-1], channel_edges[1:] - 1
+    else:
+        lo_chans = np.arange(chan_range[0], chan_range[1] + 1)
+        hi_chans = lo_chans
+    
+    if tte.ebounds is not None:
+        emin = np.asarray(tte.ebounds.low_edges())[lo_chans]
+        emax = np.asarray(tte.ebounds.high_edges())[hi_chans]
+        return TimeEnergyBins(counts, edges[:-1], edges[1:], exposure, emin, 
+                              emax)
+    chan_nums = np.arange(counts.shape[1]) if channel_edges is not None \
+                else lo_chans
+    return TimeChannelBins(counts, edges[:-1], edges[1:], exposure, chan_nums)
+
+
+def _make_phaii(tte, counts, edges, exposure, chan_range):
+    """Create a Phaii from the counts of a product"""
+    bins = _make_bins(tte, counts, edges, exposure, chan_range)
+    return Phaii.from_data(bins, gti=tte.gti, trigger_time=tte.trigtime)
+
+
+def _num_channels(tte):
+    """The number of channels of the event data"""
+    if tte.ebounds is not None:
+        return tte.ebounds.num_intervals
+    chans = tte.data.channels
+    return int(chans.max()) + 1 if chans.size > 0 else 1
+
+
+def _time_index(times, edges):
+    """The index of the time bin of each event.  The last bin includes its 
+    high edge, as in np.histogram."""
+    tidx = np.searchsorted(edges, times, side='right') - 1
+    tidx[times == edges[-1]] = edges.size - 2
+    return tidx
+
+
+def _split_binning(binning):
+    """Split a binning tuple into the function, arguments and keywords"""
+    if callable(binning):
+        return binning, (), {}
+    bin_method, args = binning[0], tuple(binning[1:])
+    kwargs = {}
+    if (len(args) > 0) and isinstance(args[-1], dict):
+        args, kwargs = args[:-1], args[-1]
+    return bin_method, args, kwargs
+
+
+def _weight_range(channel_range, num_chans):
+    """The channel range used to weight the livetimes of the GSC counters, 
+    or None if it includes all channels"""
+    if (channel_range[0] <= 0) and (channel_range[1] >= num_chans - 1):
+        return None
+    return channel_range
+
+
+class _EventArrays():
+    """The event arrays to be histogrammed, which are copied into shared 
+    memory when more than one process is used.
+    
+    Parameters:
+        times (np.array): The event times, which must be sorted if more than
+                          one process is used
+        chans (np.array): The event channels
+        groups (np.array): The event detector groups
+        num_processes (int): The number of processes
+    """
+    def __init__(self, times, chans, groups, num_processes):
+        self._arrays = (times, chans, groups)
+        self._num_processes = 1 if num_processes is None \
+                              else int(num_processes)
+        self._shared = None
+        self._specs = None
+        self._executor = None
+    
+    def __enter__(self):
+        if self._num_processes > 1 and self._arrays[0].size > 0:
+            self._shared = _SharedArrays(self._arrays)
+            self._specs = self._shared.__enter__()
+            self._executor = ProcessPoolExecutor(self._num_processes)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self._shared is not None:
+            self._shared.__exit__(exc_type, exc_value, traceback)
+        self._shared = None
+        self._specs = None
+    
+    def histogram(self, edges, chan_lo, chan_hi, num_groups):
+        """Histogram the events in group, time and channel.
+        
+        Args:
+            edges (np.array): The time bin edges
+            chan_lo (int): The first channel
+            chan_hi (int): The last channel
+            num_groups (int): The number of detector groups
+        
+        Returns:
+            (np.array)
+        """
+        shape = (num_groups, edges.size - 1, chan_hi - chan_lo + 1)
+        if self._executor is None:
+            t0, block = _histogram(*self._arrays, edges, chan_lo, chan_hi, 
+                                   num_groups)
+            if block.shape == shape:
+                return block
+            counts = np.zeros(shape, dtype=np.int64)
+            counts[:, t0:t0 + block.shape[1], :] = block
+            return counts
+        
+        # split the time-sorted events into contiguous blocks at time bin 
+        # edges, so that each process adds to a different set of time bins
+        times = self._arrays[0]
+        bounds = np.linspace(0, times.size, self._num_processes + 1).astype(int)
+        edge_idx = np.searchsorted(edges, times[bounds[1:-1]])
+        edge_idx = np.clip(edge_idx, 0, edges.size - 2)
+        splits = np.searchsorted(times, edges[edge_idx], side='left')
+        bounds = np.unique(np.concatenate(([0], splits, [times.size])))
+        
+        with _SharedArrays([np.zeros(shape, dtype=np.int64)]) as out_specs:
+            futures = [self._executor.submit(_call_shared, _histogram_block, 
+                                             self._specs + out_specs, start,
+                                             stop, edges, chan_lo, chan_hi, 
+                                             num_groups) \
+                       for start, stop in zip(bounds[:-1], bounds[1:])]
+            for future in futures:
+                future.result()
+            counts = _call_shared(np.copy, out_specs)
+        return counts
+
+
+class _SharedArrays():
+    """Copies arrays into shared memory for a pool of processes.  On entry, 
+    returns the (name, dtype, shape) of each shared array, which 
+    :func:`_call_shared` uses to access them.
+    
+    Parameters:
+        arrays (list of np.array): The arrays
+    """
+    def __init__(self, arrays):
+        self._arrays = arrays
+        self._shms = []
+    
+    def __enter__(self):
+        specs = []
+        try:
+            for arr in self._arrays:
+                shm = shared_memory.SharedMemory(create=True, 
+                                                 size=max(arr.nbytes, 1))
+                self._shms.append(shm)
+                np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+                specs.append((shm.name, arr.dtype, arr.shape))
+        except:
+            self.__exit__(None, None, None)
+            raise
+        return specs
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        for shm in self._shms:
+            shm.close()
+            shm.unlink()
+        self._shms = []
@@ -0,0 +1,259 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+from concurrent.futures import ProcessPoolExecutor
+import healpy as hp
+import numpy as np
+from astropy.coordinates import SkyCoord
+
+from gdt.core.data_primitives import EnergyBins, Gti
+from gdt.core.pha import Pha
+from .binning import _SharedArrays, _call_shared, _interval_union
+from .tte import _pixel_candidates
+
+__all__ = ['extract_spectra']
+
+
+def extract_spectra(tte, regions, time_ranges=None, num_processes=None):
+    """Extract the count spectra of many sky regions, for example catalog 
+    sources and their background regions, from the events of a 
+    :class:`~gdt.missions.maxi.gsc.tte.GscTte` at once.  The events in each
+    region are found with the spatial index of the events (see 
+    :meth:`~gdt.missions.maxi.gsc.tte.GscTte.build_spatial_index`), and the
+    spectra of all of the regions are histogrammed together.  An event is 
+    counted in every region that contains it.
+    
+    Each region is one of:
+    
+      * ``(coord, radius)``: A cone of ``radius`` degrees around ``coord``
+      * ``(coord, inner, outer)``: An annulus between the ``inner`` and 
+        ``outer`` radii, in degrees
+      * ``coords``: A convex polygon, where ``coords`` is a SkyCoord of at 
+        least 3 vertices
+    
+    The exposure of each spectrum is the livetime of the time ranges of the 
+    spectrum (see :attr:`~gdt.missions.maxi.gsc.tte.GscTte.livetime`), which 
+    only includes the good time and the deadtime of all events.  It does not
+    depend on the size of the region, so the BACKSCAL keyword of each 
+    spectrum is set to the solid angle of its region, in steradians.  A 
+    background spectrum is then scaled to a source region by the ratio of 
+    their BACKSCAL values.
+    
+    Args:
+        tte (:class:`~gdt.missions.maxi.gsc.tte.GscTte`): 
+            The event data, with the RA and DEC columns loaded and an energy 
+            calibration
+        regions (dict): The regions, e.g. 
+                        ``{'crab': (coord, 1.5), 'crab_bkg': (coord, 2.0, 4.0)}``
+        time_ranges ([(float, float), ...] or dict, optional): 
+            The time ranges of the spectra, or a dict of the time ranges of 
+            each region.  If omitted, or a region is not in the dict, the time
+            range of the events is used.
+        num_processes (int, optional): If greater than 1, the regions are 
+                                       split across a pool of processes.
+    
+    Returns:
+        (dict): The :class:`~gdt.core.pha.Pha` of each region
+    """
+    if tte.ebounds is None:
+        raise RuntimeError('Energy calibration required to create a PHA object')
+    if num_processes is not None and int(num_processes) < 1:
+        raise ValueError('num_processes must be at least 1')
+    
+    keys = list(regions.keys())
+    shapes = [_region_shape(regions[key]) for key in keys]
+    bounds = []
+    for key in keys:
+        if isinstance(time_ranges, dict):
+            ranges = time_ranges.get(key, [tte.time_range])
+        elif time_ranges is not None:
+            ranges = time_ranges
+        else:
+            ranges = [tte.time_range]
+        ranges = np.asarray(ranges, dtype=float).reshape(-1, 2)
+        if np.any(ranges[:, 1] < ranges[:, 0]):
+            raise ValueError('time_ranges must be (tstart, tstop)')
+        bounds.append(_interval_union(ranges[:, 0], ranges[:, 1]))
+    
+    if tte.spatial_index is None:
+        tte.build_spatial_index()
+    nside, sorted_pix, order = tte.spatial_index
+    ra, dec = tte.event_radec
+    # the event fields are strided views, which would otherwise be copied for
+    # every region
+    arrays = (sorted_pix, order, ra, dec, np.ascontiguousarray(tte.data.times),
+              np.ascontiguousarray(tte.data.channels))
+    num_chans = tte.ebounds.num_intervals
+    
+    # counts[region, channel]
+    if (num_processes is None) or (int(num_processes) == 1) or \
+       (len(keys) < 2):
+        counts = _region_counts(*arrays, shapes, bounds, nside, num_chans)
+    else:
+        num_processes = min(int(num_processes), len(keys))
+        splits = np.linspace(0, len(keys), num_processes + 1).astype(int)
+        with _SharedArrays(arrays) as specs, \
+             ProcessPoolExecutor(num_processes) as executor:
+            futures = [executor.submit(_call_shared, _region_counts, specs, 
+                                       shapes[i:j], bounds[i:j], nside, 
+                                       num_chans) \
+                       for i, j in zip(splits[:-1], splits[1:])]
+            counts = np.concatenate([future.result() for future in futures])
+    
+    # the exposure only depends on the time ranges
+    emin = tte.ebounds.low_edges()
+    emax = tte.ebounds.high_edges()
+    exposures = {}
+    phas = {}
+    for key, shape, (starts, stops), region_counts in zip(keys, shapes, 
+                                                          bounds, counts):
+        range_key = (starts.tobytes(), stops.tobytes())
+        if range_key not in exposures:
+            exposures[range_key] = tte.livetime.range_exposure(
+                                            np.column_stack((starts, stops)))
+        bins = EnergyBins(region_counts, emin, emax, exposures[range_key])
+        pha = Pha.from_data(bins, gti=Gti.from_bounds(starts, stops), 
+                            trigger_time=tte.trigtime)
+        pha.headers['SPECTRUM']['BACKSCAL'] = _region_solid_angle(shape)
+        phas[key] = pha
+    return phas
+
+
+def _region_counts(sorted_pix, order, ra, dec, times, chans, shapes, bounds, 
+                   nside, num_chans):
+    """Histogram the events in each region and its time ranges.
+    
+    Returns:
+        (np.array): The counts, of shape (num_regions, num_chans)
+    """
+    idx_list = []
+    for shape, (starts, stops) in zip(shapes, bounds):
+        idx = _pixel_candidates(_region_pixels(shape, nside), sorted_pix, 
+                                order)
+        vecs = hp.ang2vec(ra[idx].astype(float), dec[idx].astype(float), 
+                          lonlat=True).reshape(-1, 3)
+        idx = idx[_region_mask(shape, vecs)]
+        
+        # an event is in a time range if it follows an odd number of bounds
+        edges = np.column_stack((starts, stops)).ravel()
+        in_time = (np.searchsorted(edges, times[idx], side='right') % 2 == 1)
+        in_time |= np.isin(times[idx], stops)
+        idx_list.append(idx[in_time])
+    
+    region_ids = np.repeat(np.arange(len(shapes)), 
+                           [idx.size for idx in idx_list])
+    idx = np.concatenate(idx_list) if idx_list else np.array([], dtype=int)
+    keys = region_ids * num_chans + chans[idx].astype(np.int64)
+    counts = np.bincount(keys, minlength=len(shapes) * num_chans)
+    return counts.reshape(len(shapes), num_chans)
+
+
+def _region_mask(shape, vecs):
+    """Which of a set of unit vectors are inside a region"""
+    kind = shape[0]
+    if kind == 'cone':
+        _, center, cos_radius = shape
+        return (vecs @ center) >= cos_radius
+    elif kind == 'annulus':
+        _, center, cos_inner, cos_outer = shape
+        cos_dist = vecs @ center
+        return (cos_dist >= cos_outer) & (cos_dist < cos_inner)
+    else:
+        # on the same side of each edge's great circle as the center
+        _, verts, normals, signs = shape
+        return np.all((vecs @ normals.T) * signs >= 0.0, axis=1)
+
+
+def _region_pixels(shape, nside):
+    """The NESTED pixels that overlap a region"""
+    if shape[0] == 'cone':
+        return hp.query_disc(nside, shape[1], np.arccos(shape[2]), 
+                             inclusive=True, nest=True)
+    elif shape[0] == 'annulus':
+        return hp.query_disc(nside, shape[1], np.arccos(shape[3]), 
+                             inclusive=True, nest=True)
+    return hp.query_polygon(nside, shape[1], inclusive=True, nest=True)
+
+
+def _region_solid_angle(shape):
+    """The solid angle of a region, in steradians"""
+    kind = shape[0]
+    if kind == 'cone':
+        return 2.0 * np.pi * (1.0 - shape[2])
+    elif kind == 'annulus':
+        return 2.0 * np.pi * (shape[2] - shape[3])
+    
+    # the sum of the triangles fanning out from the first vertex (Van 
+    # Oosterom & Strackee 1983)
+    verts = shape[1]
+    a, b, c = verts[0], verts[1:-1], verts[2:]
+    triple = np.abs(np.einsum('ij,ij->i', b, np.cross(c, a)))
+    denom = 1.0 + b @ a + np.einsum('ij,ij->i', b, c) + c @ a
+    return float(np.sum(2.0 * np.arctan2(triple, denom)))
+
+
+def _region_shape(region):
+    """Convert a region to a tuple of the region type and the unit vectors and
+    cosines that define it, which can be sent to other processes"""
+    if isinstance(region, SkyCoord):
+        icrs = region.icrs
+        verts = np.atleast_2d(hp.ang2vec(np.atleast_1d(icrs.ra.deg), 
+                                         np.atleast_1d(icrs.dec.deg), 
+                                         lonlat=True))
+        if verts.shape[0] < 3:
+            raise ValueError('A polygon requires at least 3 vertices')
+        normals = np.cross(verts, np.roll(verts, -1, axis=0))
+        signs = np.sign(normals @ verts.sum(axis=0))
+        return ('polygon', verts, normals, signs)
+    
+    if not isinstance(region, tuple) or (len(region) not in (2, 3)) or \
+       not isinstance(region[0], SkyCoord):
+        raise TypeError('A region must be (coord, radius), '\
+                        '(coord, inner, outer) or a SkyCoord polygon')
+    icrs = region[0].icrs
+    center = hp.ang2vec(float(icrs.ra.deg), float(icrs.dec.deg), lonlat=True)
+    radii = [float(radius) for radius in region[1:]]
+    if (radii[-1] <= 0.0) or (radii[0] < 0.0) or (radii[-1] <= radii[0] and \
+                                                  len(radii) == 2):
+        raise ValueError('Region radii must be positive and increasing')
+    cosines = [np.cos(np.deg2rad(radius)) for radius in radii]
+    if len(radii) == 1:
+        return ('cone', center, cosines[0])
+    return ('annulus', center, cosines[0], cosines[1])
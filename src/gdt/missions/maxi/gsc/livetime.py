@@ -0,0 +1,333 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+import numpy as np
+
+from .binning import _detector_mask, _gti_coverage
+
+__all__ = ['GscLivetime']
+
+
+class GscLivetime():
+    """The livetime of each GSC counter (detector), calculated from the 
+    events recorded by that counter.  The livetime of a counter in a time bin
+    is the good time within the bin minus the deadtime of the counter's events
+    in the bin.  Because each counter has its own deadtime, the livetimes of
+    the counters remain exact when bins are combined.
+    
+    The events of each counter are sorted once when the object is created, 
+    and the livetimes are cached for each set of bins, so the same object can
+    be reused for many :meth:`~gdt.missions.maxi.gsc.tte.GscTte.to_phaii` and
+    :meth:`~gdt.missions.maxi.gsc.tte.GscTte.to_pha` calls.
+    
+    As in :func:`~gdt.missions.maxi.gsc.binning.bin_events`, a set of bins 
+    contains the events at times ``tstart <= t < tstop``, except for the 
+    last bin, which also contains the events at its ``tstop``.
+    
+    Parameters:
+        times (np.array): The event times
+        detectors (np.array, optional): The detector number of each event.  If 
+                                        omitted, all events are treated as one
+                                        counter.
+        gti ([(float, float), ...], optional): The good time intervals.  If 
+                                               omitted, the full width of 
+                                               each bin is good time.
+        deadtime (float, optional): The deadtime per event.  If omitted, the 
+                                    event deadtime of 
+                                    :class:`~gdt.missions.maxi.gsc.tte.GscTte`
+                                    is used.
+        channels (np.array, optional): The channel of each event.  Only needed
+                                       to weight the exposure by the counts 
+                                       in a channel range.
+    """
+    _cache_size = 16
+    """(int) The number of sets of bins for which the livetimes are cached"""
+    
+    def __init__(self, times, detectors=None, gti=None, deadtime=None, 
+                 channels=None):
+        times = np.asarray(times, dtype=float)
+        if detectors is None:
+            detectors = np.zeros(times.size, dtype=int)
+        detectors = np.asarray(detectors)
+        if detectors.size != times.size:
+            raise ValueError('times and detectors must be the same size')
+        if (channels is not None) and (np.size(channels) != times.size):
+            raise ValueError('times and channels must be the same size')
+        if deadtime is None:
+            # tte imports this module
+            from .tte import GscTte
+            deadtime = GscTte._event_deadtime
+        if deadtime < 0.0:
+            raise ValueError('deadtime must be non-negative')
+        
+        # the times of each counter, sorted, in one contiguous array
+        order = np.lexsort((times, detectors))
+        self._times = times[order]
+        self._detectors, counts = np.unique(detectors[order], 
+                                            return_counts=True)
+        self._offsets = np.concatenate(([0], np.cumsum(counts)))
+        self._channels = None
+        if channels is not None:
+            self._channels = np.asarray(channels)[order]
+        
+        self._gti = None
+        if gti is not None:
+            gti = np.asarray(gti, dtype=float).reshape(-1, 2)
+            self._gti = (gti[:, 0], gti[:, 1])
+        self._deadtime = float(deadtime)
+        self._cache = {}
+    
+    @property
+    def deadtime(self):
+        """(float): The deadtime per event"""
+        return self._deadtime
+    
+    @property
+    def detectors(self):
+        """(np.array): The detector numbers of the counters"""
+        return self._detectors
+    
+    @property
+    def num_detectors(self):
+        """(int): The number of counters"""
+        return self._detectors.size
+    
+    def counts(self, tstart, tstop, channel_range=None):
+        """The number of events recorded by each counter in a set of bins.  
+        A bin contains the events at times ``tstart <= t < tstop``, and the 
+        last bin also contains the events at its ``tstop``.
+        
+        Args:
+            tstart (np.array): The start times of the bins
+            tstop (np.array): The end times of the bins
+            channel_range ((int, int), optional): 
+                If set, only count the events in this channel range.  This 
+                requires the event channels.
+        
+        Returns:
+            (np.array): The counts, of shape (``num_bins``, ``num_detectors``)
+        """
+        return self._cached(tstart, tstop, channel_range)[0]
+    
+    def livetime(self, tstart, tstop):
+        """The livetime of each counter in a set of bins.
+        
+        Args:
+            tstart (np.array): The start times of the bins
+            tstop (np.array): The end times of the bins
+        
+        Returns:
+            (np.array): The livetimes, of shape (``num_bins``, 
+                        ``num_detectors``)
+        """
+        return self._cached(tstart, tstop)[1]
+    
+    def exposure(self, tstart, tstop, detectors=None, channel_range=None):
+        """The exposure of a set of bins for the summed counts of the 
+        counters.  The exposure is chosen so that the count rate in each bin is
+        the sum of the deadtime-corrected count rates of the counters.  The 
+        counters are weighted by their counts in all channels, unless 
+        ``channel_range`` is set.  The livetimes always include the deadtime 
+        of the events in all channels.
+        
+        Args:
+            tstart (np.array): The start times of the bins
+            tstop (np.array): The end times of the bins
+            detectors (list, optional): The counters to include, as 
+                                        :class:`GscDetectors`, detector names 
+                                        or numbers.  If omitted, all counters
+                                        are included.
+            channel_range ((int, int), optional): 
+                If set, the counters are weighted by their counts in this 
+                channel range.  This requires the event channels.
+        
+        Returns:
+            (np.array)
+        """
+        counts, livetime = self._cached(tstart, tstop, channel_range)
+        if detectors is not None:
+            mask = _detector_mask(detectors)[self._detectors]
+            counts, livetime = counts[:, mask], livetime[:, mask]
+        return self._combine(counts, livetime)
+    
+    def range_exposure(self, time_ranges, detectors=None, channel_range=None):
+        """The total exposure of one or more time ranges for the summed counts
+        of the counters.  The livetimes of each counter are summed over the 
+        time ranges before they are combined.  As for 
+        :meth:`~gdt.core.data_primitives.EventList.time_slice`, each time 
+        range includes the events at both of its ends.
+        
+        Args:
+            time_ranges ([(float, float), ...]): The time ranges
+            detectors (list, optional): The counters to include, as 
+                                        :class:`GscDetectors`, detector names 
+                                        or numbers.  If omitted, all counters
+                                        are included.
+            channel_range ((int, int), optional): 
+                If set, the counters are weighted by their counts in this 
+                channel range.  This requires the event channels.
+        
+        Returns:
+            (float)
+        """
+        time_ranges = np.asarray(time_ranges, dtype=float).reshape(-1, 2)
+        closed = np.ones(time_ranges.shape[0], dtype=bool)
+        counts, livetime = self._calculate(time_ranges[:, 0], 
+                                           time_ranges[:, 1], closed,
+                                           channel_range=channel_range)
+        if detectors is not None:
+            mask = _detector_mask(detectors)[self._detectors]
+            counts, livetime = counts[:, mask], livetime[:, mask]
+        return float(self._combine(counts.sum(axis=0, keepdims=True), 
+                                   livetime.sum(axis=0, keepdims=True))[0])
+    
+    @classmethod
+    def from_tte(cls, tte, deadtime=None):
+        """Create the livetimes from a 
+        :class:`~gdt.missions.maxi.gsc.tte.GscTte`.  If the detector event 
+        column was loaded, the livetime of each counter is calculated, 
+        otherwise all events are treated as one counter.  The event channels 
+        are kept, so the exposure can be weighted by the counts in a channel 
+        range.
+        
+        Args:
+            tte (:class:`~gdt.missions.maxi.gsc.tte.GscTte`): The event data
+            deadtime (float, optional): The deadtime per event.  If omitted, 
+                                        the event deadtime of ``tte`` is used.
+        
+        Returns:
+            (:class:`GscLivetime`)
+        """
+        detectors = None
+        if tte.detector_column is not None:
+            detectors = tte.event_columns[tte.detector_column]
+        gti = tte.gti.as_list() if tte.gti is not None else None
+        if deadtime is None:
+            deadtime = tte.event_deadtime
+        return cls(tte.data.times, detectors=detectors, gti=gti, 
+                   deadtime=deadtime, channels=tte.data.channels)
+    
+    def _cached(self, tstart, tstop, channel_range=None):
+        tstart = np.asarray(tstart, dtype=float)
+        tstop = np.asarray(tstop, dtype=float)
+        if channel_range is not None:
+            channel_range = (int(channel_range[0]), int(channel_range[1]))
+        key = (tstart.tobytes(), tstop.tobytes(), channel_range)
+        if key not in self._cache:
+            if len(self._cache) >= self._cache_size:
+                # dicts are ordered, so this removes the oldest entry
+                self._cache.pop(next(iter(self._cache)))
+            # the last bin includes its high edge, as in np.histogram
+            closed = np.zeros(tstart.shape, dtype=bool)
+            if closed.size > 0:
+                closed.flat[-1] = True
+            counts, livetime = self._calculate(tstart, tstop, closed, 
+                                               channel_range=channel_range)
+            counts.setflags(write=False)
+            livetime.setflags(write=False)
+            self._cache[key] = (counts, livetime)
+        return self._cache[key]
+    
+    def _calculate(self, tstart, tstop, closed, channel_range=None):
+        """The counts and livetime of each counter in a set of bins.  The 
+        bins where ``closed`` is True include the events at their ``tstop``.
+        If ``channel_range`` is set, the counts only include the events in 
+        the channel range, but the livetimes include the deadtime of all of 
+        the events.
+        """
+        if tstart.shape != tstop.shape:
+            raise ValueError('tstart and tstop must be the same size')
+        if np.any(tstop < tstart):
+            raise ValueError('tstop must be greater than or equal to tstart')
+        if (channel_range is not None) and (self._channels is None):
+            raise ValueError('The event channels are required to use a ' \
+                             'channel range')
+        
+        counts = self._count(tstart, tstop, closed)
+        livetime = self._livetime(tstart, tstop, counts)
+        if channel_range is not None:
+            counts = self._count(tstart, tstop, closed, channel_range)
+        return counts, livetime
+    
+    def _count(self, tstart, tstop, closed, channel_range=None):
+        """The number of events of each counter in a set of bins"""
+        counts = np.empty((tstart.size, self.num_detectors), dtype=np.int64)
+        stops = tstop[closed]
+        for i in range(self.num_detectors):
+            times = self._times[self._offsets[i]:self._offsets[i + 1]]
+            if channel_range is not None:
+                chans = self._channels[self._offsets[i]:self._offsets[i + 1]]
+                times = times[(chans >= channel_range[0]) & \
+                              (chans <= channel_range[1])]
+            counts[:, i] = np.searchsorted(times, tstop, side='left') - \
+                           np.searchsorted(times, tstart, side='left')
+            # the events at the end of the closed bins
+            counts[closed, i] += np.searchsorted(times, stops, side='right') - \
+                                 np.searchsorted(times, stops, side='left')
+        return counts
+    
+    def _livetime(self, tstart, tstop, counts):
+        """The livetime of each counter in a set of bins, given the counts of
+        all of its events"""
+        if self._gti is not None:
+            good_time = _gti_coverage(*self._gti, tstop) - \
+                        _gti_coverage(*self._gti, tstart)
+        else:
+            good_time = tstop - tstart
+        livetime = good_time[:, np.newaxis] - counts * self._deadtime
+        return np.maximum(livetime, 0.0)
+    
+    @staticmethod
+    def _combine(counts, livetime):
+        """Combine the livetimes of the counters into one exposure per bin, 
+        N / sum(N_i / T_i), where N_i and T_i are the counts and livetime of
+        counter i.  Bins without counts have the mean livetime.
+        """
+        total = counts.sum(axis=1)
+        if livetime.shape[1] == 0:
+            return np.zeros(livetime.shape[0])
+        exposure = livetime.mean(axis=1)
+        has_counts = (total > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = np.where(counts > 0, counts / livetime, 0.0)
+            rate = rates[has_counts].sum(axis=1)
+            exposure[has_counts] = np.where(np.isfinite(rate), 
+                                            total[has_counts] / rate, 0.0)
+        return exposure
@@ -38,33 +38,59 @@
 # License for the specific language governing permissions and limitations under 
 # the License.
 
+import hashlib
+import json
+import mmap
 import os
+import re
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
 import astropy.io.fits as fits
 import numpy as np
+from scipy import sparse
 
 from gdt.core.response import Rsp
 from gdt.core.data_primitives import Bins, Ebounds, ResponseMatrix
 from gdt.core.file import FitsFileContextManager
+from .catalogs import gsc_cache_path
 from .detectors import GscDetectors
 from .headers import ArfHeaders, RmfHeaders
 from ..time import *
 
-__all__ = ['GscArf', 'GscRmf', 'GscRsp']
+__all__ = ['GscArf', 'GscResponseCache', 'GscResponseCube', 
+           'GscResponseDatabase', 'GscRmf', 'GscRsp', 'SparseResponseMatrix']
 
 class GscArf(FitsFileContextManager):
     """A MAXI GSC Ancillary Response File (ARF)
-    """    
+    """
+    _hv_extensions = {803: 'HVB803', 854: 'HVB854'}
+    
+    # process-wide cache of opened ARFs
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+    _cache_max_entries = 64
+        
     def __init__(self):
+        super().__init__()
         self._headers = None
         self._arf_803 = None
         self._arf_854 = None
         self._detector = None
+        self._lock = threading.Lock()
     
     @property
     def detector(self):
         """(str): The detector name"""
         return self._detector
     
+    @property
+    def is_loaded(self):
+        """(bool): True if the ARFs for both HV settings have been read"""
+        return (self._arf_803 is not None) and (self._arf_854 is not None)
+    
     def get_arf(self, hv):
         """Retrieve the ARF
         
@@ -75,40 +101,648 @@ class GscArf(FitsFileContextManager):
             (:class:`~gdt.core.data_primitives.Bins`)
         """
         if hv == 803:
+            if self._arf_803 is None:
+                self._load_arf(803)
             return self._arf_803
         elif hv == 854:
+            if self._arf_854 is None:
+                self._load_arf(854)
             return self._arf_854
         else:
             raise ValueError('hv must be either 803 or 854')
+    
+    @classmethod
+    def clear_cache(cls):
+        """Remove all ARFs from the process-wide ARF cache.
+        """
+        with cls._cache_lock:
+            cls._cache.clear()
         
     @classmethod
-    def open(cls, file_path, **kwargs):
+    def open(cls, file_path, lazy=False, cache=False, **kwargs):
         """Read an ARF from disk.
 
         Args:
             file_path (str): The file path
+            lazy (bool, optional): If True, the file is memory-mapped and each
+                                   HV extension is only read on the first call 
+                                   to :meth:`get_arf` for that HV.  The file 
+                                   remains open until both extensions are read.
+                                   Default is False.
+            cache (bool, optional): If True, return the ARF from the 
+                                    process-wide ARF cache if the file has 
+                                    already been opened, otherwise add it to 
+                                    the cache.  Default is False.
 
         Returns:
             (:class:`GscArf`)
         """
+        if cache:
+            path = os.path.realpath(file_path)
+            key = (path, os.stat(path).st_mtime_ns)
+            with cls._cache_lock:
+                if key in cls._cache:
+                    cls._cache.move_to_end(key)
+                    return cls._cache[key]
+            
+            obj = cls.open(file_path, lazy=lazy, **kwargs)
+            with cls._cache_lock:
+                cls._cache[key] = obj
+                while len(cls._cache) > cls._cache_max_entries:
+                    cls._cache.popitem(last=False)
+            return obj
+        
+        if lazy:
+            kwargs.setdefault('memmap', True)
         obj = super().open(file_path, **kwargs)
         
         hdrs = [hdu.header for hdu in obj.hdulist]
-        obj._headers = ArfHeaders.from_headers(hdrs)
+        obj._headers = ArfHeaders.from_headers(hdrs)        
+        obj._detector = GscDetectors.from_full_name(hdrs[1]['INSTRUME']).name
         
-        obj._arf_803 = Bins(obj.column(1, 'SPECRESP'), 
-                           obj.column(1, 'ENERG_LO'), obj.column(1, 'ENERG_HI'))
+        if not lazy:
+            obj._load_arf(803)
+            obj._load_arf(854)
+        return obj
+    
+    def _load_arf(self, hv):
+        """Read the ARF for a HV setting from the file.  The file is closed 
+        once both ARFs have been read.
+        """
+        with self._lock:
+            if getattr(self, '_arf_{}'.format(hv)) is not None:
+                return
+            
+            hdu_num = self.hdu_index_from_name(self._hv_extensions[hv])
+            if hdu_num is None:
+                hdu_num = 1 if hv == 803 else 2
+            try:
+                arf = Bins(self.column(hdu_num, 'SPECRESP'), 
+                           self.column(hdu_num, 'ENERG_LO'), 
+                           self.column(hdu_num, 'ENERG_HI'))
+            except ValueError:
+                raise RuntimeError('The ARF file was closed before the ARF ' \
+                                   'for HV {} was read'.format(hv))
+            setattr(self, '_arf_{}'.format(hv), arf)
+            
+            if self.is_loaded:
+                self.close()
+
 
-        obj._arf_854 = Bins(obj.column(2, 'SPECRESP'), 
-                           obj.column(2, 'ENERG_LO'), obj.column(2, 'ENERG_HI'))
+class _GscResponse(Rsp):
+    """Base class for the MAXI GSC response files.  The RMF and the full 
+    response share the same file format.
+    """
+    @property
+    def hv(self):
+        """(int): The high voltage setting of the response, 803 or 854.  This is 
+        read from the header if possible, otherwise from the filename. 
+        None if unknown."""
+        try:
+            hv = _header_value(self.headers['MATRIX'], 'CBD10001')
+        except:
+            hv = None
+        if hv is None and self.filename is not None:
+            match = re.search(r'hv(\d+)', self.filename, re.IGNORECASE)
+            if match is not None:
+                hv = match.group(1)
         
-        obj._detector = GscDetectors.from_full_name(hdrs[1]['INSTRUME']).name
+        if hv is None:
+            return None
+        return int(hv)
+    
+    @property
+    def is_sparse(self):
+        """(bool): True if the response matrix is stored in sparse form"""
+        return isinstance(self.drm, SparseResponseMatrix)
+    
+    @classmethod
+    def open(cls, file_path, sparse=False, cache=None, **kwargs):
+        """Read a response from disk.
+
+        Args:
+            file_path (str): The file path
+            sparse (bool, optional): If True, the response matrix is stored as 
+                                     a :class:`SparseResponseMatrix` instead 
+                                     of a dense matrix. Default is False.
+            cache (bool or :class:`GscResponseCache`, optional): 
+                If set, the decompressed matrix is read from (or added to) the 
+                persistent response cache.  If True, uses the cache in the 
+                default location.  Default is no caching.
+            **kwargs: Options for opening the FITS file.  These are not used
+                      if the response is read from the cache.
+
+        Returns:
+            (:class:`GscRmf` or :class:`GscRsp`)
+        """
+        if cache is True:
+            cache = GscResponseCache()
+        if cache:
+            # the file is only hashed once, for both the lookup and the store
+            digest = cache.file_hash(file_path)
+            obj = cls._open_cached(file_path, cache, digest, sparse=sparse)
+            if obj is not None:
+                return obj
+        
+        obj = super().open(file_path, **kwargs)
         
+        hdrs = [hdu.header for hdu in obj.hdulist]
+        headers = RmfHeaders.from_headers(hdrs)
+        
+        det = GscDetectors.from_full_name(hdrs[0]['INSTRUME'])
+
+        if 'N_GRP' in obj.get_column_names(1):
+            ngrp = obj.column(1, 'N_GRP')
+        else:
+            ngrp = None
+        first_chan = obj._first_channel(hdrs[1])
+        if sparse:
+            matrix = obj._decompress_sparse_drm(obj.column(1, 'MATRIX'), 
+                                                hdrs[1]['NAXIS2'],
+                                                hdrs[1]['DETCHANS'], 
+                                                obj.column(1, 'F_CHAN'),
+                                                obj.column(1, 'N_CHAN'), 
+                                                ngrp=ngrp, first_chan=first_chan)
+            drm_class = SparseResponseMatrix
+        else:
+            matrix = obj._decompress_drm(obj.column(1, 'MATRIX'), 
+                                         hdrs[1]['NAXIS2'], hdrs[1]['DETCHANS'],
+                                         obj.column(1, 'F_CHAN'),
+                                         obj.column(1, 'N_CHAN'), ngrp=ngrp,
+                                         first_chan=first_chan)
+            drm_class = ResponseMatrix
+        
+        edges = {'ENERG_LO': obj.column(1, 'ENERG_LO'), 
+                 'ENERG_HI': obj.column(1, 'ENERG_HI'),
+                 'E_MIN': obj.column(2, 'E_MIN'), 
+                 'E_MAX': obj.column(2, 'E_MAX')}
+        drm = drm_class(matrix, edges['ENERG_LO'], edges['ENERG_HI'], 
+                        edges['E_MIN'], edges['E_MAX'])
+        
+        if cache:
+            if sparse:
+                arrays = {'DATA': matrix.data, 'INDICES': matrix.indices,
+                          'INDPTR': matrix.indptr}
+            else:
+                arrays = {'MATRIX': matrix}
+            arrays.update(edges)
+            cache.store(file_path, arrays, hdrs, kind=cls._cache_kind(sparse),
+                        digest=digest)
+
         obj.close()
+        obj = cls.from_data(drm, filename=obj.filename, headers=headers,
+                            detector=det.name, start_time=0.0, stop_time=0.0)
+                
+        return obj
+    
+    def write(self, directory, filename=None, threshold=0.0, **kwargs):
+        """Write the response to disk in the OGIP compressed format.  Each row
+        of the matrix is stored as groups of contiguous channels 
+        (``N_GRP``, ``F_CHAN``, ``N_CHAN``) in a variable-length ``MATRIX`` 
+        column, and elements less than or equal to ``threshold`` are dropped.
+        
+        Args:
+            directory (str): The directory to write the file.
+            filename (str, optional): The filename.  If omitted, uses the
+                                      :attr:`filename` if set.
+            threshold (float, optional): The value at or below which matrix
+                                         elements are not written. 
+                                         Default is 0.
+        """
+        try:
+            threshold = float(threshold)
+        except:
+            raise TypeError('threshold must be a non-negative float')
+        if threshold < 0.0:
+            raise ValueError('threshold must be non-negative')
+        
+        if (self.filename is None) and (filename is None):
+            raise NameError('Filename not set')
+        if filename is None:
+            filename = self.filename
+        
+        try:
+            self.headers['PRIMARY']['FILENAME'] = filename
+        except:
+            pass
+        try:
+            self.headers['PRIMARY']['CREATOR'] = self.headers.creator()[1]
+        except:
+            pass
+        if self.headers is not None:
+            self.headers.update()
+        
+        hdulist = self._build_hdulist(threshold=threshold)
+        hdulist.writeto(Path(directory) / filename, checksum=True, **kwargs)
+    
+    @classmethod
+    def _open_cached(cls, file_path, cache, digest, sparse=False):
+        """Create the response object from the persistent cache.  The matrix and 
+        edges are memory-mapped from the cache.
+        
+        Args:
+            file_path (str): The file path
+            cache (:class:`GscResponseCache`): The cache
+            digest (str): The hash of the file from 
+                          :meth:`GscResponseCache.file_hash`
+            sparse (bool, optional): If True, create a sparse matrix
+        
+        Returns:
+            (:class:`GscRmf` or :class:`GscRsp`): None if the file is not in 
+                                                  the cache
+        """
+        entry = cache.load(file_path, kind=cls._cache_kind(sparse), 
+                           digest=digest)
+        if entry is None:
+            return None
+        arrays, hdrs = entry
+        
+        if sparse:
+            matrix = _sparse_csr((arrays['DATA'], arrays['INDICES'], 
+                                 arrays['INDPTR']), hdrs[1]['NAXIS2'], 
+                                hdrs[1]['DETCHANS'])
+            drm_class = SparseResponseMatrix
+        else:
+            matrix = arrays['MATRIX']
+            drm_class = ResponseMatrix
+        drm = drm_class(matrix, arrays['ENERG_LO'], arrays['ENERG_HI'],
+                        arrays['E_MIN'], arrays['E_MAX'])
+        
+        headers = RmfHeaders.from_headers(hdrs)
+        det = GscDetectors.from_full_name(hdrs[0]['INSTRUME'])
+        obj = cls.from_data(drm, filename=Path(file_path).name, 
+                            headers=headers, detector=det.name, 
+                            start_time=0.0, stop_time=0.0)
         return obj
+    
+    @staticmethod
+    def _cache_kind(sparse):
+        return 'csr' if sparse else 'dense'
+    
+    def _build_hdulist(self, threshold=0.0):
+        
+        # create FITS and primary header
+        hdulist = fits.HDUList()
+        headers = self.headers
+        if not isinstance(headers, RmfHeaders):
+            headers = self._build_headers(self.num_chans, self.num_ebins)
+        primary_hdu = fits.PrimaryHDU(header=headers['PRIMARY'])
+        for key, val in headers['PRIMARY'].items():
+            primary_hdu.header[key] = val
+        hdulist.append(primary_hdu)
+        
+        # the compressed matrix extension
+        if self.is_sparse:
+            matrix = self.drm.sparse_matrix
+        else:
+            matrix = self.drm.matrix
+        ngrp, fchan, nchan, values = self._compress_drm(matrix, 
+                                                        threshold=threshold)
+        
+        energ_lo_col = fits.Column(name='ENERG_LO', format='1E', unit='keV',
+                                   array=self.drm.photon_bins.low_edges())
+        energ_hi_col = fits.Column(name='ENERG_HI', format='1E', unit='keV',
+                                   array=self.drm.photon_bins.high_edges())
+        ngrp_col = fits.Column(name='N_GRP', format='1I', array=ngrp)
+        fchan_col = fits.Column(name='F_CHAN', format='PJ()', array=fchan)
+        nchan_col = fits.Column(name='N_CHAN', format='PJ()', array=nchan)
+        matrix_col = fits.Column(name='MATRIX', format='PE()', array=values)
+        matrix_hdu = fits.BinTableHDU.from_columns([energ_lo_col, energ_hi_col,
+                                                    ngrp_col, fchan_col, 
+                                                    nchan_col, matrix_col], 
+                                                   header=headers['MATRIX'])
+        for key, val in headers['MATRIX'].items():
+            matrix_hdu.header[key] = val
+        matrix_hdu.header['DETCHANS'] = self.num_chans
+        matrix_hdu.header['TLMIN4'] = 1
+        matrix_hdu.header['TLMAX4'] = self.num_chans
+        matrix_hdu.header['LO_THRES'] = (threshold, 'Lower threshold of ' \
+                                         'stored matrix elements')
+        if isinstance(self, GscRsp):
+            matrix_hdu.header['HDUCLAS3'] = 'FULL'
+        hdulist.append(matrix_hdu)
+        
+        # the ebounds extension
+        chan_col = fits.Column(name='CHANNEL', format='1J', 
+                               array=np.arange(1, self.num_chans + 1))
+        emin_col = fits.Column(name='E_MIN', format='1E', unit='keV',
+                               array=self.ebounds.low_edges())
+        emax_col = fits.Column(name='E_MAX', format='1E', unit='keV',
+                               array=self.ebounds.high_edges())
+        ebounds_hdu = fits.BinTableHDU.from_columns([chan_col, emin_col, 
+                                                     emax_col], 
+                                                    header=headers['EBOUNDS'])
+        for key, val in headers['EBOUNDS'].items():
+            ebounds_hdu.header[key] = val
+        ebounds_hdu.header['DETCHANS'] = self.num_chans
+        hdulist.append(ebounds_hdu)
+
+        return hdulist
+    
+    def _build_headers(self, num_chans, num_ebins):
+        
+        if isinstance(self.headers, RmfHeaders):
+            headers = self.headers.copy()
+        else:
+            headers = RmfHeaders()
+            if self.detector is not None:
+                instrume = GscDetectors.from_str(self.detector).full_name
+                for hdr in headers.keys():
+                    headers[hdr]['INSTRUME'] = instrume
+        
+        for hdr in ('MATRIX', 'EBOUNDS'):
+            headers[hdr]['DETCHANS'] = num_chans
+        return headers
+    
+    @staticmethod
+    def _compress_drm(matrix, threshold=0.0):
+        """Compresses a DRM into the OGIP format, where each row is stored as 
+        groups of contiguous channels with values greater than ``threshold``.
+        
+        Args:
+            matrix (np.array or scipy.sparse matrix): The DRM
+            threshold (float, optional): The value at or below which elements
+                                         are dropped. Default is 0.
+        
+        Returns:
+            (np.array, list of np.array, list of np.array, list of np.array):
+            The N_GRP, F_CHAN, N_CHAN, and MATRIX columns
+        """
+        num_rows = matrix.shape[0]
+        if sparse.issparse(matrix):
+            matrix = sparse.csr_matrix(matrix)
+            rows = np.repeat(np.arange(num_rows), np.diff(matrix.indptr))
+            cols = matrix.indices
+            values = matrix.data
+            order = np.lexsort((cols, rows))
+            rows, cols, values = rows[order], cols[order], values[order]
+            keep = values > threshold
+            rows, cols, values = rows[keep], cols[keep], values[keep]
+        else:
+            matrix = np.asarray(matrix)
+            rows, cols = np.nonzero(matrix > threshold)
+            values = matrix[rows, cols]
+        
+        # a group starts wherever the channel is not adjacent to the previous
+        # element in the same row
+        starts = np.ones(rows.size, dtype=bool)
+        starts[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1] + 1)
+        start_idx = np.flatnonzero(starts)
+        group_rows = rows[start_idx]
+        group_lens = np.diff(np.append(start_idx, rows.size))
+        
+        ngrp = np.bincount(group_rows, minlength=num_rows)
+        elem_counts = np.bincount(rows, minlength=num_rows)
+        
+        # F_CHAN is 1-based
+        fchan = np.split(cols[start_idx] + 1, np.cumsum(ngrp)[:-1])
+        nchan = np.split(group_lens, np.cumsum(ngrp)[:-1])
+        values = np.split(values.astype(np.float32), 
+                          np.cumsum(elem_counts)[:-1])
+        return ngrp, fchan, nchan, values
+    
+    @staticmethod
+    def _decompress_drm(matrix, num_photon_bins, num_channels, _fchan, _nchan,
+                        ngrp=None, first_chan=1):
+        """Decompresses a DRM using the standard F_CHAN, N_CHAN, and N_GRP
+        keywords.
+        
+        Args:
+            matrix (np.array): The compressed MATRIX column
+            num_photon_bins (int): The number of photon bins
+            num_channels (int): The number of energy channels
+            _fchan (np.array): The F_CHAN column
+            _nchan (np.array): The N_CHAN column
+            ngrp (np.array, optional): The N_GRP column.  If omitted, every
+                                       group stored in F_CHAN is used.
+            first_chan (int, optional): The channel number of the first
+                                        channel (TLMIN of F_CHAN). Default is 1.
+        
+        Returns:        
+            (np.array)
+        """
+        fchan, nchan = np.asarray(_fchan), np.asarray(_nchan)
+        if (fchan.dtype != object) and (fchan.ndim == 1) and \
+           (nchan.dtype != object) and (nchan.ndim == 1):
+            return GscRmf._decompress_single_group(matrix, num_photon_bins,
+                                                   num_channels, fchan, nchan,
+                                                   ngrp=ngrp, 
+                                                   first_chan=first_chan)
+        
+        row_counts, chans, values = GscRmf._decompress_indices(
+                                                        matrix, _fchan, _nchan,
+                                                        ngrp=ngrp,
+                                                        first_chan=first_chan)
+        GscRmf._check_indices(row_counts, chans, num_photon_bins, num_channels)
+        # index into the flattened matrix
+        row_offset = np.arange(num_photon_bins) * num_channels
+        chans += np.repeat(row_offset[:row_counts.size], row_counts)
+        
+        drm = np.zeros((num_photon_bins, num_channels))
+        drm.reshape(-1)[chans] = values
+        return drm
+    
+    @staticmethod
+    def _decompress_single_group(matrix, num_photon_bins, num_channels, fchan,
+                                 nchan, ngrp=None, first_chan=1):
+        """Decompresses a DRM that has (at most) one channel group per photon
+        bin.  Copying each row is faster than computing the index of every
+        element for this case.
+        
+        Args:
+            matrix (np.array): The compressed MATRIX column
+            num_photon_bins (int): The number of photon bins
+            num_channels (int): The number of energy channels
+            fchan (np.array): The F_CHAN column
+            nchan (np.array): The N_CHAN column
+            ngrp (np.array, optional): The N_GRP column
+            first_chan (int, optional): The channel number of the first
+                                        channel. Default is 1.
+        
+        Returns:        
+            (np.array)
+        """
+        starts = fchan.astype(int) - first_chan
+        nchan = nchan.astype(int)
+        if ngrp is not None:
+            nchan = np.where(np.asarray(ngrp).reshape(-1) > 0, nchan, 0)
+        stops = starts + nchan
+        mask = (nchan > 0)
+        GscRmf._check_indices(nchan, np.append(starts[mask], stops[mask] - 1),
+                              num_photon_bins, num_channels)
+        
+        drm = np.zeros((num_photon_bins, num_channels))
+        for row, start, stop, values in zip(drm, starts, stops, matrix):
+            if stop > start:
+                if len(values) < stop - start:
+                    raise ValueError('MATRIX has fewer elements than N_CHAN '\
+                                     'requires')
+                row[start:stop] = values[:stop - start]
+        return drm
+    
+    @staticmethod
+    def _decompress_sparse_drm(matrix, num_photon_bins, num_channels, _fchan,
+                               _nchan, ngrp=None, first_chan=1):
+        """Decompresses a DRM directly into a sparse CSR matrix without 
+        creating the dense matrix.
+        
+        Args:
+            matrix (np.array): The compressed MATRIX column
+            num_photon_bins (int): The number of photon bins
+            num_channels (int): The number of energy channels
+            _fchan (np.array): The F_CHAN column
+            _nchan (np.array): The N_CHAN column
+            ngrp (np.array, optional): The N_GRP column
+            first_chan (int, optional): The channel number of the first
+                                        channel (TLMIN of F_CHAN). Default is 1.
+        
+        Returns:        
+            (scipy.sparse.csr_matrix)
+        """
+        row_counts, chans, values = GscRmf._decompress_indices(
+                                                        matrix, _fchan, _nchan,
+                                                        ngrp=ngrp,
+                                                        first_chan=first_chan)
+        GscRmf._check_indices(row_counts, chans, num_photon_bins, num_channels)
+        indptr = np.zeros(num_photon_bins + 1, dtype=int)
+        indptr[1:row_counts.size + 1] = np.cumsum(row_counts)
+        indptr[row_counts.size + 1:] = indptr[row_counts.size]
+        
+        drm = _sparse_csr((values.astype(float), chans, indptr), 
+                         num_photon_bins, num_channels)
+        return drm
+    
+    @staticmethod
+    def _check_indices(row_counts, chans, num_photon_bins, num_channels):
+        """Checks that the decompressed elements are within the matrix.
+        
+        Args:
+            row_counts (np.array): The number of elements in each photon bin
+            chans (np.array): The channel index of each element
+            num_photon_bins (int): The number of photon bins
+            num_channels (int): The number of energy channels
+        """
+        if row_counts.size > num_photon_bins:
+            raise ValueError('The matrix has {0} rows, but there are only {1} '\
+                             'photon bins'.format(row_counts.size, 
+                                                  num_photon_bins))
+        if chans.size > 0:
+            if (chans.min() < 0) or (chans.max() >= num_channels):
+                raise ValueError('F_CHAN and N_CHAN must be within the {} '\
+                                 'channels'.format(num_channels))
+    
+    @staticmethod
+    def _decompress_indices(matrix, _fchan, _nchan, ngrp=None, first_chan=1):
+        """Computes the channel index and value of every element stored in a 
+        compressed DRM.  The elements are returned in row (photon bin) order.
+        
+        Args:
+            matrix (np.array): The compressed MATRIX column
+            _fchan (np.array): The F_CHAN column
+            _nchan (np.array): The N_CHAN column
+            ngrp (np.array, optional): The N_GRP column
+            first_chan (int, optional): The channel number of the first
+                                        channel. Default is 1.
+        
+        Returns:
+            (np.array, np.array, np.array): The number of elements in each 
+                                            photon bin, the channel indices, 
+                                            and the values
+        """
+        # The format of the compressed matrix is a series of groups, for each
+        # energy bin, of channels with non-zero values.
+        # fchan stands for the first channel of each of these groups
+        # and nchan for the number of channels in the group.
+        # Each row in the matrix is a 1D list consisting of the concatenated
+        # values of all groups for a given energy bin.  F_CHAN and N_CHAN may
+        # be scalar, fixed-length or variable-length columns.
+        fchan, grps_per_row = GscRmf._flatten_column(_fchan)
+        nchan, _ = GscRmf._flatten_column(_nchan)
+        if fchan.size != nchan.size:
+            raise ValueError('F_CHAN and N_CHAN must have the same number of '\
+                             'groups')
+        num_rows = grps_per_row.size
+        grp_row = np.repeat(np.arange(num_rows), grps_per_row)
+        
+        # only keep the first N_GRP groups of each row
+        if ngrp is not None:
+            ngrp = np.asarray(ngrp, dtype=int).reshape(-1)
+            if np.any(ngrp < grps_per_row):
+                row_start = np.cumsum(grps_per_row) - grps_per_row
+                grp_num = np.arange(fchan.size) - row_start[grp_row]
+                mask = (grp_num < ngrp[grp_row])
+                fchan = fchan[mask]
+                nchan = nchan[mask]
+                grp_row = grp_row[mask]
+        
+        # expand to one entry per stored element.  Every element is offset 
+        # from the first channel of its group, so only the per-group values
+        # need to be repeated over the group lengths.
+        nchan = nchan.astype(int)
+        grp_start = np.cumsum(nchan) - nchan
+        chans = np.repeat(fchan.astype(int) - first_chan - grp_start, nchan)
+        chans += np.arange(chans.size)
+        row_counts = np.bincount(grp_row, weights=nchan, 
+                                 minlength=num_rows).astype(int)
+        
+        # the matrix values, dropping any padding beyond the stored groups
+        values, value_rows = GscRmf._flatten_column(matrix)
+        if np.any(value_rows < row_counts):
+            raise ValueError('MATRIX has fewer elements than N_CHAN requires')
+        if np.any(value_rows > row_counts):
+            value_start = np.cumsum(value_rows) - value_rows
+            row_start = np.cumsum(row_counts) - row_counts
+            offset = np.repeat(value_start - row_start, row_counts)
+            values = values[np.arange(chans.size) + offset]
+        
+        return row_counts, chans, values
+    
+    @staticmethod
+    def _first_channel(header):
+        """The channel number of the first channel, from the TLMIN keyword of 
+        the F_CHAN column. OGIP defaults to 1 if the keyword is absent.
+        
+        Args:
+            header (astropy.io.fits.Header): The MATRIX extension header
+        
+        Returns:
+            (int)
+        """
+        for i in range(1, header.get('TFIELDS', 0) + 1):
+            if header.get('TTYPE{}'.format(i), '').strip() == 'F_CHAN':
+                return int(header.get('TLMIN{}'.format(i), 1))
+        return 1
+        
+    @staticmethod
+    def _flatten_column(column):
+        """Flattens a scalar, fixed-length, or variable-length column into a
+        1D array and the number of elements in each row.
+        
+        Args:
+            column (np.array): The column
+        
+        Returns:
+            (np.array, np.array): The flattened column and the row lengths
+        """
+        column = np.asarray(column)
+        if column.dtype == object:
+            lengths = np.fromiter(map(len, column), dtype=int,
+                                  count=column.size)
+            if column.size > 0:
+                flat = np.concatenate(column)
+            else:
+                flat = np.array([])
+        elif column.ndim == 1:
+            flat = column
+            lengths = np.ones(column.size, dtype=int)
+        else:
+            flat = column.reshape(column.shape[0], -1)
+            lengths = np.full(flat.shape[0], flat.shape[1], dtype=int)
+            flat = flat.reshape(-1)
+        return flat, lengths
 
 
-class GscRmf(Rsp):
+class GscRmf(_GscResponse):
     """A MAXI GSC Response Matrix File (RMF)
     """
     def apply_arf(self, arf_obj):
@@ -120,90 +754,1274 @@ class GscRmf(Rsp):
         Returns:
             (:class:`GscRsp`)
         """
-        if 'hv803' in self.filename:
-            arf = arf_obj.get_arf(803)
-        elif 'hv854' in self.filename:
-            arf = arf_obj.get_arf(854)
-        else:
+        if self.hv is None:
             raise RuntimeError('Unkown RMF type')
+        arf = arf_obj.get_arf(self.hv)
         
-        drm = ResponseMatrix(self.drm.matrix * arf.counts[np.newaxis, :],
-                             self.drm.photon_bins.low_edges(),
+        if isinstance(self.drm, SparseResponseMatrix):
+            matrix = self.drm.sparse_matrix @ sparse.diags(arf.counts)
+        else:
+            matrix = self.drm.matrix * arf.counts[np.newaxis, :]
+        drm = type(self.drm)(matrix, self.drm.photon_bins.low_edges(),
                              self.drm.photon_bins.high_edges(),
                              self.drm.ebounds.low_edges(),
                              self.drm.ebounds.high_edges())
         
-        fname = '.'.join(self.filename.split('.')[:-1]) + '.rsp'
-        obj = GscRsp.from_data(drm, filename=fname, headers=self.headers, 
-                               detector=self.detector, start_time=self.tstart,
-                               stop_time=self.tstop)
+        obj = GscRsp.from_data(drm, filename=self._rsp_filename(), 
+                               headers=self.headers, detector=self.detector, 
+                               start_time=self.tstart, stop_time=self.tstop)
         return obj
     
     @classmethod
-    def open(cls, file_path, **kwargs):
-        """Read a RMF from disk.
+    def apply_arfs(cls, rmfs, arfs):
+        """Apply ARFs to a set of RMFs in a single vectorized operation.  Each 
+        RMF is matched to the ARF for its detector, and the ARF for the HV of
+        the RMF is applied.  All RMFs must have the same energy and channel 
+        binning.
+        
+        Args:
+            rmfs (list of :class:`GscRmf`): The RMFs
+            arfs (:class:`GscArf` or list of :class:`GscArf`): 
+                The ARFs. Must contain an ARF for the detector of every RMF.
+        
+        Returns:
+            (:class:`GscResponseCube`)
+        """
+        return GscResponseCube.from_rmfs(rmfs, arfs)
+    
+    def _rsp_filename(self):
+        if self.filename is None:
+            return None
+        return '.'.join(self.filename.split('.')[:-1]) + '.rsp'
+    
+
 
+class GscRsp(_GscResponse):
+    """Class for MAXI GSC response files
+    """
+    _max_folding_matrices = 4
+    
+    def __init__(self):
+        super().__init__()
+        self._folding_matrices = OrderedDict()
+    
+    def fold_spectra(self, spectra, exposure=1.0, channel_mask=None, 
+                     dtype=np.float64):
+        """Fold a batch of photon spectra through the DRM in a single matrix
+        multiplication.  This is equivalent to calling 
+        :meth:`~gdt.core.response.Rsp.fold_spectrum` for each spectrum, but is 
+        much faster when folding many spectra, e.g. for a grid of spectral 
+        parameters.
+        
+        The DRM, weighted by the photon bin widths, is cached for each dtype 
+        and channel mask, so repeated calls only perform the multiplication.
+        
         Args:
-            file_path (str): The file path
+            spectra (np.array): 
+                The photon spectra, of shape (num_spectra, num_ebins), 
+                evaluated at the photon bin centroids in units of 
+                ph/s-cm^2-keV.  A 1-D array is treated as a single spectrum.
+            exposure (float or np.array, optional): 
+                The exposure in seconds, either a single value or one value 
+                for each spectrum. Default is 1.
+            channel_mask (np.array, optional): 
+                A Boolean mask where True indicates the channel is to be used 
+                for folding and False indicates the channel is to not be used 
+                for folding.  If omitted, all channels are used.
+            dtype (np.dtype, optional): The dtype used for the calculation, 
+                                        np.float64 or np.float32. 
+                                        Default is np.float64.
+        
+        Returns:
+            (np.array): The count spectra, of shape (num_spectra, num_chans)
+        """
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError('dtype must be float32 or float64')
+        
+        spectra = np.asarray(spectra, dtype=dtype)
+        if spectra.ndim == 1:
+            spectra = spectra[np.newaxis, :]
+        if (spectra.ndim != 2) or (spectra.shape[1] != self.num_ebins):
+            raise ValueError('spectra must have shape (num_spectra, ' \
+                             '{})'.format(self.num_ebins))
+        
+        exposure = np.asarray(exposure, dtype=dtype)
+        if exposure.ndim > 1 or \
+           (exposure.ndim == 1 and exposure.size != spectra.shape[0]):
+            raise ValueError('exposure must be a single value or have one ' \
+                             'value for each spectrum')
+        if np.any(exposure <= 0.0):
+            raise ValueError('exposure must be positive')
+        
+        matrix = self._folding_matrix(dtype, channel_mask)
+        if sparse.issparse(matrix):
+            counts = (matrix.T @ spectra.T).T
+        else:
+            counts = spectra @ matrix
+        
+        if exposure.ndim == 1:
+            counts *= exposure[:, np.newaxis]
+        else:
+            counts *= exposure
+        return counts
+    
+    def _folding_matrix(self, dtype, channel_mask=None):
+        """The DRM multiplied by the photon bin widths, as a C-contiguous 
+        (num_ebins, num_chans) matrix.  The matrices are cached by dtype and 
+        channel mask.
+        """
+        if channel_mask is not None:
+            channel_mask = np.asarray(channel_mask, dtype=bool)
+            if channel_mask.size != self.num_chans:
+                raise ValueError('channel_mask must have one value for each ' \
+                                 'channel')
+            key = (dtype.str, channel_mask.tobytes())
+        else:
+            key = (dtype.str, None)
+        
+        if key in self._folding_matrices:
+            self._folding_matrices.move_to_end(key)
+            return self._folding_matrices[key]
+        
+        widths = np.asarray(self.drm.photon_bin_widths)
+        if isinstance(self.drm, SparseResponseMatrix):
+            matrix = sparse.diags(widths) @ self.drm.sparse_matrix
+            if channel_mask is not None:
+                matrix = matrix[:, np.flatnonzero(channel_mask)]
+            matrix = sparse.csr_matrix(matrix, dtype=dtype)
+        else:
+            matrix = self.drm.matrix * widths[:, np.newaxis]
+            if channel_mask is not None:
+                matrix = matrix[:, channel_mask]
+            matrix = np.ascontiguousarray(matrix, dtype=dtype)
+        
+        self._folding_matrices[key] = matrix
+        while len(self._folding_matrices) > self._max_folding_matrices:
+            self._folding_matrices.popitem(last=False)
+        return matrix
+
 
+class SparseResponseMatrix(ResponseMatrix):
+    """A response matrix stored in compressed sparse row (CSR) form.  GSC 
+    matrices only redistribute each photon bin over a narrow band of energy
+    channels, so this is much smaller in memory than the dense matrix.
+    Folding, rebinning and the effective area calculations operate directly 
+    on the sparse matrix.
+
+    Parameters:
+        matrix (np.array or scipy.sparse matrix): The 2D matrix, of shape 
+                                                  (num_photon_bins, num_channels)
+        emin (np.array): The low edges of the (input) photon bins
+        emax (np.array): The high edges of the (input) photon bins
+        chanlo (np.array): The low edges of the (output) energy channels
+        chanhi (np.array): The high edges of the (output) energy channels    
+    """
+    def __init__(self, matrix, emin, emax, chanlo, chanhi):
+        if sparse.issparse(matrix):
+            matrix = sparse.csr_matrix(matrix)
+        else:
+            try:
+                iter(matrix)
+                matrix = np.asarray(matrix)
+            except:
+                raise TypeError('matrix must be an iterable')
+            if matrix.ndim != 2:
+                raise TypeError('matrix must be a 2-dimensional array')
+            matrix = sparse.csr_matrix(matrix)
+        
+        # let the base class validate the edges against the matrix shape 
+        # using a placeholder that doesn't allocate a dense matrix
+        super().__init__(np.broadcast_to(False, matrix.shape), emin, emax,
+                         chanlo, chanhi)
+        self._matrix = matrix
+
+    @property
+    def matrix(self):
+        """(np.array): The raw matrix as a dense array"""
+        return self._matrix.toarray()
+    
+    @property
+    def nbytes(self):
+        """(int): The number of bytes used to store the sparse matrix"""
+        return self._matrix.data.nbytes + self._matrix.indices.nbytes + \
+               self._matrix.indptr.nbytes
+    
+    @property
+    def sparse_matrix(self):
+        """(scipy.sparse.csr_matrix): The raw matrix in sparse form"""
+        return self._matrix
+
+    def channel_effective_area(self):
+        """Returns the effective area as a function of recorded channel energy
+        (integrated over incident photon bins).
+        
         Returns:
-            (:class:`GscRmf`)
+            (:class:`~gdt.core.data_primitives.Bins`)
         """
-        obj = super().open(file_path, **kwargs)
+        effarea = np.asarray(self._matrix.sum(axis=0)).reshape(-1)
+        return Bins(effarea, self._chanlo, self._chanhi)
+
+    def fold_spectrum(self, function, params, channel_mask=None):
+        """Fold a photon spectrum through a DRM to get a count spectrum
         
-        hdrs = [hdu.header for hdu in obj.hdulist]
-        headers = RmfHeaders.from_headers(hdrs)
+        Args: 
+            function (<function>): 
+                A photon spectrum function.  The function must accept a list of 
+                function parameters as its first argument and an array of photon 
+                energies as its second argument.  The function must return the 
+                evaluation of the photon model in units of ph/s-cm^2-keV.
+            params (list of float): A list of parameter values to be passed to
+                                   the photon spectrum function
+            channel_mask (np.array, optional): 
+                A boolean mask where True indicates the channel is to be used 
+                for folding and False indicates the channel is to not be used 
+                for folding.  If omitted, all channels are used.
         
-        det = GscDetectors.from_full_name(hdrs[0]['INSTRUME'])
+        Returns:        
+            (np.array)
+        """
+        drm = self._matrix
+        if channel_mask is not None:
+            drm = drm[:, np.flatnonzero(channel_mask)]
 
-        matrix = obj._decompress_drm(obj.column(1, 'MATRIX'), hdrs[1]['NAXIS2'],
-                                  hdrs[1]['DETCHANS'], obj.column(1, 'F_CHAN'),
-                                  obj.column(1, 'N_CHAN'))
+        # evaluate photon model
+        photon_model = function(params, self.photon_bin_centroids)
+
+        # fold photon model through DRM
+        counts = drm.T @ (photon_model * self.photon_bin_widths)
+
+        return counts
+
+    def photon_effective_area(self):
+        """Returns the effective area as a function of incident photon energy
+        (integrated over recorded energy channels).
         
-        drm = ResponseMatrix(matrix, obj.column(1, 'ENERG_LO'),
-                             obj.column(1, 'ENERG_HI'), obj.column(2, 'E_MIN'),
-                             obj.column(2, 'E_MAX'))
+        Returns:        
+            (:class:`~gdt.core.data_primitives.Bins`)
+        """
+        effarea = np.asarray(self._matrix.sum(axis=1)).reshape(-1)
+        return Bins(effarea, self._emin, self._emax)
 
-        obj.close()
-        obj = cls.from_data(drm, filename=obj.filename, headers=headers,
-                            detector=det.name, start_time=0.0, stop_time=0.0)
-                
+    def rebin(self, factor=None, edge_indices=None):
+        """Rebins the channel energy axis of a DRM and returns a new response
+        object.  Rebinning can only be used to downgrade the channel resolution
+        and is constrained to the channel edges of the current DRM. 
+        
+        Args:
+            factor (int, optional): The rebinning factor. Must set either this
+                                    or ``edge_indices``
+            edge_indices (np.array, optional): The index array that represents
+                                               which energy edges should remain
+                                               in the rebinned DRM.
+        
+        Returns:
+            (:class:`SparseResponseMatrix`)
+        """
+        # determine the new channel edges from a single-row dense matrix so
+        # that the arguments are validated exactly as for a dense DRM
+        edges = ResponseMatrix(np.zeros((1, self.num_chans)), self._emin[:1],
+                               self._emax[:1], self._chanlo, self._chanhi)
+        edges = edges.rebin(factor=factor, edge_indices=edge_indices)
+        chanlo = np.asarray(edges.ebounds.low_edges())
+        chanhi = np.asarray(edges.ebounds.high_edges())
+        
+        # summing the combined channels is a product with a sparse matrix that
+        # maps each old channel onto its new channel
+        sidx = np.searchsorted(self._chanlo, chanlo)
+        eidx = np.searchsorted(self._chanhi, chanhi)
+        nchans = eidx - sidx + 1
+        old_chans = np.repeat(sidx - np.cumsum(nchans) + nchans, nchans)
+        old_chans += np.arange(old_chans.size)
+        new_chans = np.repeat(np.arange(chanlo.size), nchans)
+        combine = sparse.csr_matrix((np.ones(old_chans.size), 
+                                     (old_chans, new_chans)),
+                                    shape=(self.num_chans, chanlo.size))
+        
+        obj = type(self)(self._matrix @ combine, self._emin, self._emax, 
+                         chanlo, chanhi)
+        return obj
+
+    def resample(self, num_photon_bins=None, photon_bin_edges=None,
+                 num_interp_points=20, interp_kind='linear'):
+        """Resamples the incident photon axis of a DRM and returns a new 
+        SparseResponseMatrix object.  
+        
+        Note:
+            The interpolation is performed on the dense matrix, so this 
+            temporarily requires the memory of the dense matrix.
+        
+        Args:
+            num_photon_bins (int, optional): The number of photon bins in the
+                                             new DRM. The bin edges will be 
+                                             generated logarithmically. Only set
+                                             this or ``photon_bin_edges``.
+            photon_bin_edges (np.array, optional): The array of photon bin edges.
+                                                   Only set this or 
+                                                   ``num_photon_bins``
+            num_interp_points (int, optional): The number of interpolation points
+                                               used to integrate over for each
+                                               new photon bin. Default is 20.
+            interp_kind (str, optional): The kind of interpolation to be 
+                                         passed to scipy.interp1d.  Default is
+                                         'linear'.
+        
+        Returns:
+            (:class:`SparseResponseMatrix`)
+        """
+        dense = ResponseMatrix(self.matrix, self._emin, self._emax, 
+                               self._chanlo, self._chanhi)
+        dense = dense.resample(num_photon_bins=num_photon_bins, 
+                               photon_bin_edges=photon_bin_edges,
+                               num_interp_points=num_interp_points,
+                               interp_kind=interp_kind)
+        obj = type(self)(dense.matrix, dense.photon_bins.low_edges(),
+                         dense.photon_bins.high_edges(), self._chanlo,
+                         self._chanhi)
         return obj
+
+    def __repr__(self):
+        return '<SparseResponseMatrix: {0} energy bins; {1} ' \
+               'channels; {2} non-zero elements>'.format(self.num_ebins, 
+                                                        self.num_chans,
+                                                        self._matrix.nnz)
+
+
+class GscResponseCache():
+    """A persistent, on-disk cache of decompressed response matrices.  
+    
+    Entries are keyed by the SHA-256 hash of the file contents, so a cached 
+    matrix is used for any copy of the same file, and an updated file is 
+    never matched to a stale entry.  Each entry is a directory of ``.npy`` 
+    files that are memory-mapped when read, so repeated opens don't copy the
+    matrix and processes on the same node share the same pages.  When the 
+    total size of the cache exceeds ``max_size``, the least recently used
+    entries are removed.
+    
+    Parameters:
+        cache_path (str, optional): The cache directory. Default is the 
+                                    ``responses`` directory in the GSC cache.
+        max_size (int, optional): The maximum size of the cache in bytes.
+                                  Default is 2 GB.
+    """
+    _version = 1
+    
+    def __init__(self, cache_path=None, max_size=2 * 1024**3):
+        if cache_path is None:
+            cache_path = os.path.join(gsc_cache_path, 'responses')
+        self._cache_path = Path(cache_path)
+        
+        try:
+            self._max_size = int(max_size)
+        except:
+            raise TypeError('max_size must be a positive integer')
+        if self._max_size <= 0:
+            raise ValueError('max_size must be a positive integer')
+    
+    @property
+    def cache_path(self):
+        """(pathlib.Path): The cache directory"""
+        return self._cache_path
+    
+    @property
+    def max_size(self):
+        """(int): The maximum size of the cache in bytes"""
+        return self._max_size
+    
+    @property
+    def size(self):
+        """(int): The current size of the cache in bytes"""
+        return sum([self._entry_size(entry) for entry in self._entries()])
+    
+    def clear(self):
+        """Remove all entries from the cache.
+        """
+        for entry in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+    
+    def contains(self, file_path, kind=None):
+        """Check if a file is in the cache.
+        
+        Args:
+            file_path (str): The file path
+            kind (str, optional): The kind of entry. If omitted, any entry for
+                                  the file matches.
+        
+        Returns:
+            (bool)
+        """
+        return len(self._file_entries(file_path, kind=kind)) > 0
+    
+    def invalidate(self, file_path):
+        """Remove all entries for a file from the cache.
+        
+        Args:
+            file_path (str): The file path
+        """
+        for entry in self._file_entries(file_path):
+            shutil.rmtree(entry, ignore_errors=True)
+    
+    def load(self, file_path, kind='dense', digest=None):
+        """Load the arrays and headers cached for a file.  The arrays are 
+        read-only memory maps.
+        
+        Args:
+            file_path (str): The file path
+            kind (str, optional): The kind of entry. Default is 'dense'.
+            digest (str, optional): The hash of the file, if it has already 
+                                    been computed with :meth:`file_hash`
+        
+        Returns:
+            (dict, list): The arrays and the list of headers, or None if the 
+                          file is not in the cache
+        """
+        if digest is None:
+            digest = self.file_hash(file_path)
+        entry = self._entry_path(digest, kind)
+        try:
+            with open(entry / 'headers.json', 'r') as f:
+                meta = json.load(f)
+            if meta['version'] != self._version:
+                return None
+            arrays = {name: np.load(entry / (name + '.npy'), mmap_mode='r') \
+                      for name in meta['arrays']}
+        except (OSError, ValueError, KeyError):
+            return None
+        
+        headers = [fits.Header.fromstring(hdr) for hdr in meta['headers']]
+        
+        # mark as recently used
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return arrays, headers
+    
+    def store(self, file_path, arrays, headers, kind='dense', digest=None):
+        """Add the arrays and headers for a file to the cache.  The entry is
+        written to a temporary directory and then moved in place, so partial 
+        entries are never visible to other processes.
+        
+        Args:
+            file_path (str): The file path
+            arrays (dict): The arrays to cache, keyed by name
+            headers (list of astropy.io.fits.Header): The file headers
+            kind (str, optional): The kind of entry. Default is 'dense'.
+            digest (str, optional): The hash of the file, if it has already 
+                                    been computed with :meth:`file_hash`
+        """
+        if digest is None:
+            digest = self.file_hash(file_path)
+        entry = self._entry_path(digest, kind)
+        if entry.exists():
+            return
+        
+        self._cache_path.mkdir(parents=True, exist_ok=True)
+        temp = self._cache_path / '.{0}.{1}'.format(entry.name, 
+                                                     uuid.uuid4().hex)
+        temp.mkdir()
+        try:
+            for name, array in arrays.items():
+                np.save(temp / (name + '.npy'), np.ascontiguousarray(array))
+            meta = {'version': self._version, 'arrays': list(arrays.keys()),
+                    'headers': [hdr.tostring() for hdr in headers]}
+            with open(temp / 'headers.json', 'w') as f:
+                json.dump(meta, f)
+            os.rename(temp, entry)
+        except OSError:
+            # another process may have stored the same entry
+            shutil.rmtree(temp, ignore_errors=True)
+            if not entry.exists():
+                raise
+        
+        self.evict()
+    
+    def evict(self):
+        """Remove the least recently used entries until the cache is no larger
+        than :attr:`max_size`.
+        """
+        entries = []
+        for entry in self._entries():
+            try:
+                entries.append((entry.stat().st_mtime, entry, 
+                                self._entry_size(entry)))
+            except OSError:
+                continue
+        
+        total = sum([entry[2] for entry in entries])
+        for _, entry, size in sorted(entries, key=lambda x: x[0]):
+            if total <= self._max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
     
     @staticmethod
-    def _decompress_drm(matrix, num_photon_bins, num_channels, _fchan, _nchan):
-        """Decompresses a DRM using the standard F_CHAN, N_CHAN, and N_GRP
-        keywords.
+    def file_hash(file_path):
+        """The SHA-256 hash of the file contents, which is the cache key.
         
         Args:
-            drm_data (np.recarray): The DRM data
+            file_path (str): The file path
         
-        Returns:        
-            (np.array)
+        Returns:
+            (str)
         """
-        # The format of the compress matrix is a series of groups, for each
-        # energy bin, of channels with non-zero values.
-        # fchan stands for the first channel of each of these groups
-        # and nchan for the number of channels in the group group.
-        # Each row in the matrix is a 1D list consisting on the contatenated
-        # values of all groups for a given energy bin 
-        # Note that in FITS the first index is 1
-        drm = np.zeros((num_photon_bins, num_channels))
-        for fchan, nchan, effective_area, drm_row \
-            in zip(_fchan, _nchan, matrix, drm):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def _entries(self):
+        if not self._cache_path.exists():
+            return []
+        return [path for path in self._cache_path.iterdir() \
+                if path.is_dir() and not path.name.startswith('.')]
+    
+    def _entry_path(self, digest, kind):
+        return self._cache_path / '{0}.{1}'.format(digest, kind)
+    
+    @staticmethod
+    def _entry_size(entry):
+        return sum([f.stat().st_size for f in entry.iterdir()])
+    
+    def _file_entries(self, file_path, kind=None):
+        digest = self.file_hash(file_path)
+        if kind is not None:
+            entries = [self._entry_path(digest, kind)]
+        else:
+            entries = self._cache_path.glob(digest + '.*')
+        return [entry for entry in entries if entry.is_dir()]
+    
+    def __repr__(self):
+        return '<GscResponseCache: {0}; {1} entries>'.format(self.cache_path,
+                                                        len(self._entries()))
 
-            channel_offset = 0
-                
-            start_idx = fchan - 1
-            end_idx = start_idx + nchan
-            drm_row[start_idx:end_idx] = \
-                           effective_area[channel_offset:channel_offset + nchan]    
-            channel_offset += nchan
 
-        return drm
+class GscResponseCube():
+    """A set of MAXI GSC detector responses with the same energy and channel
+    binning, stored as a single (``num_responses``, ``num_ebins``, 
+    ``num_chans``) array.  This is usually created by 
+    :meth:`GscRmf.apply_arfs`.  Indexing the cube returns a :class:`GscRsp`
+    for one of the responses.
+    
+    Parameters:
+        matrix (np.array): The (num_responses, num_ebins, num_chans) array
+        emin (np.array): The low edges of the photon bins
+        emax (np.array): The high edges of the photon bins
+        chanlo (np.array): The low edges of the energy channels
+        chanhi (np.array): The high edges of the energy channels
+        detectors (list of str): The detector of each response
+        hvs (list of int): The high voltage of each response
+        filenames (list of str, optional): The filename of each response
+        headers (list of :class:`~gdt.missions.maxi.gsc.headers.RmfHeaders`,
+                 optional): The headers of each response
+    """
+    def __init__(self, matrix, emin, emax, chanlo, chanhi, detectors, hvs,
+                 filenames=None, headers=None):
+        self._matrix = np.asarray(matrix)
+        if self._matrix.ndim != 3:
+            raise TypeError('matrix must be a 3-dimensional array')
+        num = self._matrix.shape[0]
+        
+        self._emin = np.asarray(emin).flatten()
+        self._emax = np.asarray(emax).flatten()
+        self._chanlo = np.asarray(chanlo).flatten()
+        self._chanhi = np.asarray(chanhi).flatten()
+        if (self._emin.size != self._matrix.shape[1]) or \
+           (self._emax.size != self._matrix.shape[1]):
+            raise ValueError('matrix axis 1 must have same length as emin ' \
+                             'and emax')
+        if (self._chanlo.size != self._matrix.shape[2]) or \
+           (self._chanhi.size != self._matrix.shape[2]):
+            raise ValueError('matrix axis 2 must have same length as chanlo ' \
+                             'and chanhi')
+        
+        self._detectors = list(detectors)
+        self._hvs = [int(hv) for hv in hvs]
+        if filenames is None:
+            filenames = [None] * num
+        self._filenames = list(filenames)
+        if headers is None:
+            headers = [None] * num
+        self._headers = list(headers)
+        for attr in (self._detectors, self._hvs, self._filenames, 
+                     self._headers):
+            if len(attr) != num:
+                raise ValueError('detectors, hvs, filenames, and headers ' \
+                                 'must have one entry for each response')
+    
+    @property
+    def detectors(self):
+        """(list of str): The detector of each response"""
+        return self._detectors
+    
+    @property
+    def filenames(self):
+        """(list of str): The filename of each response"""
+        return self._filenames
+    
+    @property
+    def hvs(self):
+        """(list of int): The high voltage of each response"""
+        return self._hvs
+    
+    @property
+    def matrix(self):
+        """(np.array): The (num_responses, num_ebins, num_chans) response 
+        array"""
+        return self._matrix
+    
+    @property
+    def num_chans(self):
+        """(int): The number of energy channels"""
+        return self._matrix.shape[2]
+    
+    @property
+    def num_ebins(self):
+        """(int): The number of photon bins"""
+        return self._matrix.shape[1]
+
+    @property
+    def num_responses(self):
+        """(int): The number of responses"""
+        return self._matrix.shape[0]
+    
+    @classmethod
+    def from_rmfs(cls, rmfs, arfs):
+        """Create the response cube by applying ARFs to a set of RMFs.  See
+        :meth:`GscRmf.apply_arfs`.
+        
+        Args:
+            rmfs (list of :class:`GscRmf`): The RMFs
+            arfs (:class:`GscArf` or list of :class:`GscArf`): The ARFs
+        
+        Returns:
+            (:class:`GscResponseCube`)
+        """
+        rmfs = list(rmfs)
+        if len(rmfs) == 0:
+            raise ValueError('At least one RMF is required')
+        if isinstance(arfs, GscArf):
+            arfs = [arfs]
+        arfs = {arf.detector: arf for arf in arfs}
+        
+        # the edges of the first response are shared by all responses
+        drm = rmfs[0].drm
+        emin = np.asarray(drm.photon_bins.low_edges())
+        emax = np.asarray(drm.photon_bins.high_edges())
+        chanlo = np.asarray(drm.ebounds.low_edges())
+        chanhi = np.asarray(drm.ebounds.high_edges())
+        
+        hvs = []
+        arf_stack = np.empty((len(rmfs), chanlo.size))
+        for i, rmf in enumerate(rmfs):
+            if i > 0:
+                if (rmf.num_ebins != emin.size) or \
+                   (rmf.num_chans != chanlo.size) or \
+                   (not np.array_equal(rmf.drm.photon_bins.low_edges(), emin)) or \
+                   (not np.array_equal(rmf.drm.ebounds.low_edges(), chanlo)):
+                    raise ValueError('All RMFs must have the same energy and ' \
+                                     'channel binning')
+            if rmf.hv is None:
+                raise RuntimeError('Unkown RMF type')
+            if rmf.detector not in arfs:
+                raise ValueError('No ARF for detector {}'.format(rmf.detector))
+            hvs.append(rmf.hv)
+            arf_stack[i] = arfs[rmf.detector].get_arf(rmf.hv).counts
+        
+        matrix = np.empty((len(rmfs), emin.size, chanlo.size))
+        for i, rmf in enumerate(rmfs):
+            matrix[i] = rmf.drm.matrix
+        matrix *= arf_stack[:, np.newaxis, :]
+        
+        obj = cls(matrix, emin, emax, chanlo, chanhi, 
+                  [rmf.detector for rmf in rmfs], hvs,
+                  filenames=[rmf._rsp_filename() for rmf in rmfs],
+                  headers=[rmf.headers for rmf in rmfs])
+        return obj
+    
+    def index(self, detector, hv):
+        """The index of the response for a detector and high voltage.
+        
+        Args:
+            detector (str): The detector name
+            hv (int): The high voltage, 803 or 854
+        
+        Returns:
+            (int)
+        """
+        for i in range(self.num_responses):
+            if (self._detectors[i] == detector) and (self._hvs[i] == int(hv)):
+                return i
+        raise ValueError('No response for detector {0} and HV {1}'.format(
+                                                                 detector, hv))
+    
+    def __getitem__(self, index):
+        drm = ResponseMatrix(self._matrix[index], self._emin, self._emax,
+                             self._chanlo, self._chanhi)
+        return GscRsp.from_data(drm, filename=self._filenames[index],
+                                headers=self._headers[index], 
+                                detector=self._detectors[index], 
+                                start_time=0.0, stop_time=0.0)
+    
+    def __iter__(self):
+        for i in range(self.num_responses):
+            yield self[i]
+    
+    def __len__(self):
+        return self.num_responses
+    
+    def __repr__(self):
+        return '<GscResponseCube: {0} responses; {1} energy bins; ' \
+               '{2} channels>'.format(self.num_responses, self.num_ebins,
+                                      self.num_chans)
 
 
-class GscRsp(Rsp):
-    """Class for MAXI GSC response files
+class GscResponseDatabase():
+    """An index of the MAXI GSC response files in a CALDB directory.  
+    
+    The directory is scanned once, and each RMF is indexed by detector, high 
+    voltage, DETX range, and anode.  The responses are only read when they are
+    first requested, and the most recently used responses are kept in memory
+    up to ``max_memory`` bytes.
+    
+    Parameters:
+        caldb_path (str): The directory containing the RMFs.  The directory is
+                          searched recursively.
+        max_memory (int, optional): The maximum memory in bytes used by the 
+                                    loaded response matrices. Default is 1 GB.
+        sparse (bool, optional): If True, the response matrices are stored as 
+                                 :class:`SparseResponseMatrix`. Default is 
+                                 False.
+        cache (bool or :class:`GscResponseCache`, optional): The persistent 
+                                 cache used when reading the RMFs. Default is
+                                 no caching.
+    """
+    _filename_regex = re.compile(r'mx_gsc(\d+)_hv(\d+)_detx(m?\d+)_(m?\d+)',
+                                 re.IGNORECASE)
+    
+    def __init__(self, caldb_path, max_memory=1024**3, sparse=False, 
+                 cache=None):
+        self._caldb_path = Path(caldb_path)
+        if not self._caldb_path.is_dir():
+            raise ValueError('{} is not a directory'.format(caldb_path))
+        
+        try:
+            self._max_memory = int(max_memory)
+        except:
+            raise TypeError('max_memory must be a positive integer')
+        if self._max_memory <= 0:
+            raise ValueError('max_memory must be a positive integer')
+        
+        self._sparse = bool(sparse)
+        self._cache = cache
+        self._loaded = OrderedDict()
+        self._loaded_nbytes = {}
+        self._memory_usage = 0
+        self._index = self._scan()
+
+    @property
+    def anodes(self):
+        """(list): The anodes in the database"""
+        return sorted(set([entry['anode'] for entry in self._index \
+                           if entry['anode'] is not None]))
+    
+    @property
+    def caldb_path(self):
+        """(pathlib.Path): The CALDB directory"""
+        return self._caldb_path
+    
+    @property
+    def detectors(self):
+        """(list of str): The detectors in the database"""
+        return sorted(set([entry['detector'] for entry in self._index]))
+    
+    @property
+    def hvs(self):
+        """(list of int): The high voltage settings in the database"""
+        return sorted(set([entry['hv'] for entry in self._index]))
+    
+    @property
+    def max_memory(self):
+        """(int): The maximum memory in bytes used by the loaded responses"""
+        return self._max_memory
+    
+    @property
+    def memory_usage(self):
+        """(int): The memory in bytes currently used by the loaded responses.
+        Matrices that are memory-mapped from the response cache are not 
+        counted."""
+        return self._memory_usage
+    
+    @property
+    def num_files(self):
+        """(int): The number of RMFs in the database"""
+        return len(self._index)
+    
+    @property
+    def num_loaded(self):
+        """(int): The number of RMFs currently loaded in memory"""
+        return len(self._loaded)
+    
+    def clear(self):
+        """Remove all loaded responses from memory.
+        """
+        self._loaded.clear()
+        self._loaded_nbytes.clear()
+        self._memory_usage = 0
+    
+    def detx_bins(self, detector, hv, anode=None):
+        """The DETX ranges of the responses for a detector and high voltage.
+        
+        Args:
+            detector (str): The detector name
+            hv (int): The high voltage, 803 or 854
+            anode (int, optional): The anode.  If omitted, all anodes are 
+                                   included.
+        
+        Returns:
+            (np.array): A (num_bins, 2) array of the DETX ranges
+        """
+        entries = self._select(detector, hv, anode=anode)
+        return np.array([(entry['detx_min'], entry['detx_max']) \
+                         for entry in entries]).reshape(-1, 2)
+    
+    def files(self, detector=None, hv=None, anode=None):
+        """The RMF files in the database, sorted by DETX.
+        
+        Args:
+            detector (str, optional): Only return files for this detector
+            hv (int, optional): Only return files for this high voltage
+            anode (int, optional): Only return files for this anode
+        
+        Returns:
+            (list of pathlib.Path)
+        """
+        entries = self._select(detector, hv, anode=anode)
+        return [entry['path'] for entry in entries]
+    
+    def get(self, detector, hv, detx, anode=None, interpolate=True):
+        """Get the response for a detector and high voltage at a DETX position.
+        
+        If ``interpolate`` is True, the response is linearly weighted between 
+        the two DETX bins with centers bracketing ``detx``, otherwise the 
+        response of the DETX bin containing (or nearest to) ``detx`` is 
+        returned.  Positions outside of the DETX range of the database use the 
+        response of the nearest DETX bin.
+        
+        Args:
+            detector (str): The detector name
+            hv (int): The high voltage, 803 or 854
+            detx (float): The DETX position
+            anode (int, optional): The anode.  Must be set if the database 
+                                   contains responses for more than one anode.
+            interpolate (bool, optional): If True, interpolate between DETX 
+                                          bins. Default is True.
+        
+        Returns:
+            (:class:`GscRmf`)
+        """
+        weights = self.weights(detector, hv, detx, anode=anode, 
+                               interpolate=interpolate)
+        return self._combine(weights)
+    
+    def open(self, file_path):
+        """Open a RMF in the database.  If the RMF is already loaded, the 
+        loaded object is returned.
+        
+        Args:
+            file_path (str): The file path
+        
+        Returns:
+            (:class:`GscRmf`)
+        """
+        key = Path(file_path)
+        if key in self._loaded:
+            self._loaded.move_to_end(key)
+            return self._loaded[key]
+        
+        rmf = GscRmf.open(key, sparse=self._sparse, cache=self._cache)
+        self._loaded[key] = rmf
+        self._loaded_nbytes[key] = self._rmf_nbytes(rmf)
+        self._memory_usage += self._loaded_nbytes[key]
+        
+        # remove the least recently used responses, but always keep the
+        # one just loaded
+        while (len(self._loaded) > 1) and \
+              (self._memory_usage > self._max_memory):
+            old_key, _ = self._loaded.popitem(last=False)
+            self._memory_usage -= self._loaded_nbytes.pop(old_key)
+        
+        return rmf
+    
+    def track_response(self, coord, frame, detector, hv, tstart=None, 
+                       tstop=None, arf=None, anode=None, detx_func=None,
+                       collimator_width=1.5):
+        """The exposure-weighted response for a source moving through the 
+        field of view of a detector.  See :meth:`track_weights` for how the 
+        weights of the responses are calculated.
+        
+        Args:
+            coord (astropy.coordinates.SkyCoord): The source position
+            frame (:class:`~gdt.missions.maxi.frame.MaxiFrame`): 
+                The spacecraft frame containing the attitude samples
+            detector (str): The detector name
+            hv (int): The high voltage, 803 or 854
+            tstart (astropy.time.Time, optional): The start of the time range.
+                                                  Default is the first sample.
+            tstop (astropy.time.Time, optional): The end of the time range.
+                                                 Default is the last sample.
+            arf (:class:`GscArf`, optional): If set, the ARF is applied and a
+                                             :class:`GscRsp` is returned.
+            anode (int, optional): The anode
+            detx_func (<function>, optional): 
+                A function that converts the angle along the FOV (in degrees) 
+                to DETX. If omitted, the responses are weighted by their 
+                DET_THA angles instead of DETX.
+            collimator_width (float, optional): 
+                The angle across the FOV, in degrees, at which the collimator
+                transmission is zero. Default is 1.5.
+        
+        Returns:
+            (:class:`GscRmf` or :class:`GscRsp`)
+        """
+        weights = self.track_weights(coord, frame, detector, hv, tstart=tstart,
+                                     tstop=tstop, anode=anode, 
+                                     detx_func=detx_func, 
+                                     collimator_width=collimator_width)
+        rmf = self._combine(weights)
+        if arf is not None:
+            return rmf.apply_arf(arf)
+        return rmf
+    
+    def track_weights(self, coord, frame, detector, hv, tstart=None, 
+                      tstop=None, anode=None, detx_func=None, 
+                      collimator_width=1.5):
+        """The RMF files and weights that make up the exposure-weighted 
+        response for a source moving through the field of view of a detector.
+        
+        At each attitude sample, the angles of the source along and across the
+        FOV of the detector are calculated.  The exposure of each sample is 
+        the sample duration multiplied by the collimator transmission, which 
+        decreases linearly from 1 at the center of the FOV to 0 at 
+        ``collimator_width`` from the center.  The exposure is then 
+        distributed onto the DET_THA angles of the responses (or the DETX 
+        centers if ``detx_func`` is set) by linear interpolation between the
+        two nearest responses.  The weights are normalized to sum to 1.
+        
+        Args:
+            coord (astropy.coordinates.SkyCoord): The source position
+            frame (:class:`~gdt.missions.maxi.frame.MaxiFrame`): 
+                The spacecraft frame containing the attitude samples
+            detector (str): The detector name
+            hv (int): The high voltage, 803 or 854
+            tstart (astropy.time.Time, optional): The start of the time range.
+                                                  Default is the first sample.
+            tstop (astropy.time.Time, optional): The end of the time range.
+                                                 Default is the last sample.
+            anode (int, optional): The anode
+            detx_func (<function>, optional): 
+                A function that converts the angle along the FOV (in degrees) 
+                to DETX. If omitted, the responses are weighted by their 
+                DET_THA angles instead of DETX.
+            collimator_width (float, optional): 
+                The angle across the FOV, in degrees, at which the collimator
+                transmission is zero. Default is 1.5.
+        
+        Returns:
+            (list of (pathlib.Path, float))
+        """
+        if collimator_width <= 0.0:
+            raise ValueError('collimator_width must be positive')
+        
+        entries = self._select_unique(detector, hv, anode)
+        if detx_func is None:
+            if any([entry['det_tha'] is None for entry in entries]):
+                raise ValueError('DET_THA is not available for all responses.'\
+                                 ' detx_func must be set.')
+            grid = np.array([entry['det_tha'] for entry in entries])
+        else:
+            grid = np.array([entry['detx_center'] for entry in entries])
+        order = np.argsort(grid, kind='stable')
+        entries = [entries[i] for i in order]
+        grid = grid[order]
+        
+        # the attitude samples within the time range
+        times = np.atleast_1d(frame.obstime.unix_tai)
+        mask = np.ones(times.size, dtype=bool)
+        if tstart is not None:
+            mask &= (times >= tstart.unix_tai)
+        if tstop is not None:
+            mask &= (times <= tstop.unix_tai)
+        if times.size > 1:
+            durations = np.gradient(times)
+        else:
+            durations = np.ones(1)
+        
+        if isinstance(detector, str):
+            detector = GscDetectors.from_str(detector)
+        fov = 'H' if detector.is_h_detector() else 'Z'
+        along, across = frame.fov_angles(coord, fov)
+        transmission = np.clip(1.0 - np.abs(across) / collimator_width, 0.0, 
+                               None)
+        exposure = (durations * transmission)[mask]
+        along = along[mask]
+        
+        if detx_func is not None:
+            along = np.asarray(detx_func(along), dtype=float)
+        
+        if exposure.sum() <= 0.0:
+            raise ValueError('The source is not in the field of view of ' \
+                             '{} during the time range'.format(detector.name))
+        
+        bin_weights = self._interp_weights(grid, along, exposure)
+        bin_weights /= bin_weights.sum()
+        return [(entries[i]['path'], float(bin_weights[i])) \
+                for i in np.flatnonzero(bin_weights > 0.0)]
+    
+    def weights(self, detector, hv, detx, anode=None, interpolate=True):
+        """The RMF files and weights that make up the response at a DETX 
+        position.  See :meth:`get`.
+        
+        Args:
+            detector (str): The detector name
+            hv (int): The high voltage, 803 or 854
+            detx (float): The DETX position
+            anode (int, optional): The anode
+            interpolate (bool, optional): If True, interpolate between DETX 
+                                          bins. Default is True.
+        
+        Returns:
+            (list of (pathlib.Path, float))
+        """
+        entries = self._select_unique(detector, hv, anode)
+        detx = float(detx)
+        centers = np.array([entry['detx_center'] for entry in entries])
+        
+        if not interpolate:
+            lo = np.array([entry['detx_min'] for entry in entries])
+            hi = np.array([entry['detx_max'] for entry in entries])
+            inside = np.flatnonzero((detx >= lo) & (detx <= hi))
+            if inside.size > 0:
+                idx = inside[0]
+            else:
+                idx = np.argmin(np.abs(centers - detx))
+            return [(entries[idx]['path'], 1.0)]
+        
+        if (detx <= centers[0]) or (centers.size == 1):
+            return [(entries[0]['path'], 1.0)]
+        if detx >= centers[-1]:
+            return [(entries[-1]['path'], 1.0)]
+        
+        idx = np.searchsorted(centers, detx)
+        frac = (detx - centers[idx-1]) / (centers[idx] - centers[idx-1])
+        if frac == 1.0:
+            return [(entries[idx]['path'], 1.0)]
+        if frac == 0.0:
+            return [(entries[idx-1]['path'], 1.0)]
+        return [(entries[idx-1]['path'], float(1.0 - frac)), 
+                (entries[idx]['path'], float(frac))]
+    
+    def _scan(self):
+        """Index the RMFs in the CALDB directory"""
+        index = []
+        for path in sorted(self._caldb_path.rglob('*')):
+            if path.suffix.lower() not in ('.rmf', '.rsp'):
+                continue
+            entry = self._index_entry(path)
+            if entry is not None:
+                index.append(entry)
+        
+        index.sort(key=lambda x: (x['detector'], x['hv'], x['detx_center']))
+        return index
+    
+    @classmethod
+    def _index_entry(cls, path):
+        """The index entry for a file, from the MATRIX header if possible or 
+        the filename otherwise.
+        """
+        entry = {'path': path, 'detector': None, 'hv': None, 'detx_min': None,
+                 'detx_max': None, 'detx_center': None, 'anode': None, 
+                 'det_tha': None}
+        
+        match = cls._filename_regex.search(path.name)
+        if match is not None:
+            entry['detector'] = GscDetectors.from_num(int(match.group(1))).name
+            entry['hv'] = int(match.group(2))
+            entry['detx_min'] = cls._parse_detx(match.group(3))
+            entry['detx_max'] = cls._parse_detx(match.group(4))
+        
+        try:
+            header = fits.getheader(path, 'MATRIX')
+        except (OSError, KeyError):
+            header = None
+        
+        if header is not None:
+            try:
+                entry['detector'] = GscDetectors.from_full_name(
+                                                         header['INSTRUME']).name
+            except:
+                pass
+            hv = _header_value(header, 'CBD10001')
+            if hv is not None:
+                entry['hv'] = int(hv)
+            if 'DETXMIN' in header and 'DETXMAX' in header:
+                entry['detx_min'] = float(header['DETXMIN'])
+                entry['detx_max'] = float(header['DETXMAX'])
+            if 'DETXCNTR' in header:
+                entry['detx_center'] = float(header['DETXCNTR'])
+            anode = _header_value(header, 'CBD30001')
+            if anode is not None:
+                entry['anode'] = int(anode)
+            if 'DET_THA' in header:
+                entry['det_tha'] = float(header['DET_THA'])
+
+        if (entry['detector'] is None) or (entry['hv'] is None) or \
+           (entry['detx_min'] is None):
+            return None
+        
+        if entry['detx_center'] is None:
+            entry['detx_center'] = (entry['detx_min'] + entry['detx_max']) / 2.0
+        return entry
+    
+    def _combine(self, weights):
+        """Combine the responses with the given weights"""
+        if len(weights) == 1:
+            return self.open(weights[0][0])
+        
+        rmfs = [self.open(path) for path, _ in weights]
+        shapes = set([(rmf.num_ebins, rmf.num_chans) for rmf in rmfs])
+        if len(shapes) > 1:
+            raise ValueError('Responses of the neighboring DETX bins have ' \
+                             'different dimensions and cannot be combined')
+
+        if self._sparse:
+            matrix = sum([weight * rmf.drm.sparse_matrix \
+                          for rmf, (_, weight) in zip(rmfs, weights)])
+        else:
+            matrix = sum([weight * rmf.drm.matrix \
+                          for rmf, (_, weight) in zip(rmfs, weights)])
+        
+        # the headers and filename are from the response with the largest 
+        # weight
+        nearest = rmfs[int(np.argmax([weight for _, weight in weights]))]
+        drm = type(nearest.drm)(matrix, nearest.drm.photon_bins.low_edges(),
+                                nearest.drm.photon_bins.high_edges(),
+                                nearest.drm.ebounds.low_edges(),
+                                nearest.drm.ebounds.high_edges())
+        return GscRmf.from_data(drm, filename=nearest.filename,
+                                headers=nearest.headers, 
+                                detector=nearest.detector, start_time=0.0,
+                                stop_time=0.0)
+    
+    @staticmethod
+    def _interp_weights(grid, values, weights):
+        """Distribute weighted values onto a sorted grid by linear 
+        interpolation between the neighboring grid points.  Values outside the
+        grid are assigned to the nearest grid point.
+        """
+        if grid.size == 1:
+            return np.array([np.sum(weights)], dtype=float)
+        
+        values = np.clip(values, grid[0], grid[-1])
+        idx = np.clip(np.searchsorted(grid, values, side='right'), 1, 
+                      grid.size - 1)
+        lo = grid[idx - 1]
+        hi = grid[idx]
+        span = hi - lo
+        frac = np.divide(values - lo, span, out=np.zeros_like(values), 
+                         where=(span > 0.0))
+        
+        bin_weights = np.bincount(idx - 1, weights=weights * (1.0 - frac), 
+                                  minlength=grid.size)
+        bin_weights += np.bincount(idx, weights=weights * frac, 
+                                   minlength=grid.size)
+        return bin_weights
+    
+    @staticmethod
+    def _parse_detx(value):
+        """Parse a DETX value from a filename, where 'm' is a minus sign"""
+        value = value.lower()
+        if value.startswith('m'):
+            return -float(value[1:])
+        return float(value)
+
+    @staticmethod
+    def _rmf_nbytes(rmf):
+        """The bytes of memory used by the matrix of a RMF, excluding arrays
+        that are memory-mapped from the cache"""
+        if rmf.is_sparse:
+            matrix = rmf.drm.sparse_matrix
+            arrays = [matrix.data, matrix.indices, matrix.indptr]
+        else:
+            arrays = [rmf.drm.matrix]
+        
+        nbytes = 0
+        for array in arrays:
+            base = array
+            while isinstance(base, np.ndarray) and \
+                  not isinstance(base, np.memmap):
+                base = base.base
+            if not isinstance(base, (np.memmap, mmap.mmap)):
+                nbytes += array.nbytes
+        return nbytes
+    
+    def _select(self, detector, hv, anode=None):
+        if isinstance(detector, GscDetectors):
+            detector = detector.name
+        entries = self._index
+        if detector is not None:
+            entries = [entry for entry in entries \
+                       if entry['detector'] == detector]
+        if hv is not None:
+            entries = [entry for entry in entries if entry['hv'] == int(hv)]
+        if anode is not None:
+            entries = [entry for entry in entries \
+                       if entry['anode'] == int(anode)]
+        return entries
+    
+    def _select_unique(self, detector, hv, anode):
+        """Select the responses for a detector, HV, and anode, requiring that 
+        only a single anode is selected."""
+        entries = self._select(detector, hv, anode=anode)
+        if len(entries) == 0:
+            raise ValueError('No responses for detector {0}, HV {1}, and ' \
+                             'anode {2}'.format(detector, hv, anode))
+        
+        if anode is None:
+            anodes = set([entry['anode'] for entry in entries])
+            if len(anodes) > 1:
+                raise ValueError('Responses exist for multiple anodes. ' \
+                                 'anode must be set.')
+        return entries
+    
+    def __repr__(self):
+        return '<GscResponseDatabase: {0}; {1} files; {2} loaded>'.format(
+                                  self.caldb_path, self.num_files, 
+                                  self.num_loaded)
+
+
+def _header_value(header, keyword):
+    """Extract the numeric value of a CBD keyword, e.g. 803 from 'HV(803)V'.
+    Returns None if the keyword is missing or has no value.
+    """
+    match = re.search(r'\((-?\d+)\)', str(header.get(keyword, '')))
+    if match is None:
+        return None
+    return match.group(1)
+
+
+def _sparse_csr(arrays, num_photon_bins, num_channels):
+    """Create a CSR matrix from the (data, indices, indptr) arrays without 
+    copying them.
+    
+    Args:
+        arrays (tuple): The data, indices, and indptr arrays
+        num_photon_bins (int): The number of photon bins
+        num_channels (int): The number of energy channels
+    
+    Returns:
+        (scipy.sparse.csr_matrix)
     """
-    pass
\ No newline at end of file
+    return sparse.csr_matrix(arrays, shape=(num_photon_bins, num_channels),
+                             copy=False)
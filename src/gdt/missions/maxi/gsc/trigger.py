@@ -0,0 +1,358 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+
+from concurrent.futures import ProcessPoolExecutor
+import re
+import numpy as np
+import astropy.io.fits as fits
+from rich.progress import track
+
+from gdt.core.binning.unbinned import bin_by_time
+from gdt.core.phaii import Phaii
+from gdt.core.trigger import SlidingWindowMethod, Trigger, TriggerAlgorithm
+from .binning import bin_events
+from .tte import GscTte
+
+__all__ = ['GscSlidingWindowMethod', 'GscTransientSearch', 'Trigger', 
+           'TriggerAlgorithm']
+
+
+class GscSlidingWindowMethod(SlidingWindowMethod):
+    """A sliding window trigger for GSC data, which identifies transients by 
+    looking for windows where n detectors exceed a given significance 
+    threshold above background.  The trigger windows and background windows 
+    are the same as those of 
+    :class:`~gdt.core.trigger.SlidingWindowMethod`, but the windows are 
+    evaluated for all time bins at once from cumulative sums of the binned 
+    data.
+    
+    The data are binned with :func:`~gdt.missions.maxi.gsc.binning.bin_events`
+    directly into the energy channels defined by ``channel_edges``, and the 
+    exposure of each bin only includes the good time within the bin.  Windows 
+    with no background counts are not evaluated.
+
+    Parameters:
+        algorithms (dict):       Dictionary defining the set of trigger
+                                 algorithms applied in the trigger method
+        background_window (int): Length of time in integer milliseconds
+                                 used to compute background counts
+        background_offset (int): Time offset in integer milliseconds between
+                                 the end of the trigger and background windows
+        resolution (int):        The time resolution in integer milliseconds
+                                 of binned PHAII data used for the trigger
+                                 method. All other timescales (windows,
+                                 offsets) should be multiples of this value
+        channel_edges (list):    List of channel edges used to define energy
+                                 bins for PHAII data
+        det_names (list):        Names of the detectors (or sets of 
+                                 detectors) for the trigger method
+        n (int):                 Minimum number of detectors needed for trigger
+        verbose (float):         Show progress bars when True
+    """
+    def apply_trigger(self, holdoff=None, debug=False):
+        """Applies the set of trigger algorithms to prepared data
+
+        Args:
+            holdoff (float, optional): Trigger holdoff time in seconds.
+            debug (bool, optional):    Show debugging information when True
+
+        Returns:
+            (list of Trigger)
+        """
+        if self.phaiis is None:
+            raise ValueError("Need to run prepare_data() method on TTE data " \
+                             "before applying the trigger")
+        
+        nbins = self.phaiis[0].data.num_times
+        tstop = self.phaiis[0].data.tstop
+        stops = np.arange(1, nbins + 1)
+        bkg_stops = stops - self.background_offset_bins
+        bkg_starts = bkg_stops - self.background_window_bins
+        
+        # cumulative sums with a leading zero, so that the sum over bins 
+        # [i, j) is cum[j] - cum[i]
+        exposure = np.array([phaii.data.exposure for phaii in self.phaiis])
+        cum_exposure = _cumsum(exposure)
+        cum_counts = {}
+        
+        candidates = []
+        for order, (alg_num, alg) in enumerate(self.algorithms.items()):
+            channels = tuple(alg.channels)
+            if channels not in cum_counts:
+                counts = np.array([phaii.data.counts[:, channels[0]:
+                                                        channels[1] + 1].sum(axis=1) \
+                                   for phaii in self.phaiis])
+                cum_counts[channels] = _cumsum(counts)
+            cum = cum_counts[channels]
+            
+            window_bins = alg.timescale // self.resolution
+            offset_bins = alg.offset // self.resolution
+            starts = stops - window_bins
+            
+            # complete, in-phase windows with a complete background window
+            valid = (bkg_starts >= 0) & (starts >= 1) & \
+                    ((starts - offset_bins) % window_bins == 0)
+            idx = np.flatnonzero(valid)
+            if idx.size == 0:
+                continue
+            
+            counts = cum[:, stops[idx]] - cum[:, starts[idx]]
+            expo = cum_exposure[:, stops[idx]] - cum_exposure[:, starts[idx]]
+            bkg_counts = cum[:, bkg_stops[idx]] - cum[:, bkg_starts[idx]]
+            bkg_expo = cum_exposure[:, bkg_stops[idx]] - \
+                       cum_exposure[:, bkg_starts[idx]]
+            
+            # significance under a simple Gaussian approximation, as in the
+            # core sliding window method
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scaled_bkg = expo / bkg_expo * bkg_counts
+                sig = (counts - scaled_bkg) / np.sqrt(scaled_bkg)
+            sig[~(scaled_bkg > 0.0)] = 0.0
+            
+            triggered_det = sig > alg.threshold
+            hits = np.flatnonzero(triggered_det.sum(axis=0) >= self.n)
+            for hit in hits:
+                i = idx[hit]
+                trigger = Trigger(alg_num, alg, tstop[i], sig[:, hit], 
+                                  triggered_det[:, hit], self.det_names)
+                candidates.append((i, order, trigger))
+                if debug:
+                    print("Found ", str(trigger))
+        
+        # same order as evaluating the algorithms bin by bin
+        candidates.sort(key=lambda x: (x[0], x[1]))
+        triggers = [candidate[2] for candidate in candidates]
+        
+        if holdoff:
+            triggers = self.apply_holdoff(triggers, holdoff)
+        return triggers
+
+    def prepare_data(self, ttes, time_range=None):
+        """Method to prepare TTE data into a PHAII format for use with
+        trigger algorithms.  The time bins are aligned to multiples of the 
+        resolution.
+
+        Args:
+            ttes (list): List of :class:`~gdt.missions.maxi.gsc.tte.GscTte` 
+                         objects, one for each detector
+            time_range (list): List with [tstart, tstop]
+        """
+        if len(ttes) != len(self.det_names):
+            raise ValueError("Mismatch between detector names and number of " \
+                             "TTE files")
+
+        # ensure time range is within the range of provided data
+        if time_range is None:
+            time_range = list(ttes[0].time_range)
+        time_range = list(time_range)
+        for tte in ttes:
+            if tte.time_range[0] > time_range[0]:
+                time_range[0] = tte.time_range[0]
+            if tte.time_range[1] < time_range[1]:
+                time_range[1] = tte.time_range[1]
+        
+        resolution = self.resolution * 0.001
+        tstart = np.floor(time_range[0] / resolution) * resolution
+        
+        self.phaiis = []
+        description = "Binning TTE into {} energy channels".format(
+                                                    len(self.channel_edges) - 1)
+        for tte in track(ttes, description=description, 
+                         disable=not self.verbose):
+            bins = bin_events(tte, bin_by_time, resolution, 
+                              time_range=(tstart, time_range[1]), 
+                              channel_edges=self.channel_edges)
+            self.phaiis.append(Phaii.from_data(bins, gti=tte.gti, 
+                                               trigger_time=tte.trigtime))
+
+
+class GscTransientSearch():
+    """Runs a sliding window transient search over GSC event files, such as
+    the files for each HEALPix tile of a day, and collects the triggers into 
+    a table of candidates.  The files are searched in parallel on a pool of 
+    processes.
+    
+    Parameters:
+        algorithms (dict):       Dictionary of 
+                                 :class:`~gdt.core.trigger.TriggerAlgorithm`
+        background_window (int): Length of time in integer milliseconds
+                                 used to compute background counts
+        background_offset (int): Time offset in integer milliseconds between
+                                 the end of the trigger and background windows
+        resolution (int):        The time resolution in integer milliseconds
+                                 of the binned data
+        channel_edges (list):    List of channel edges used to define the 
+                                 energy bins.  The channels of the algorithms
+                                 are indices of these energy bins.
+        detectors (dict, optional): 
+            The sets of detectors that are searched separately, e.g. 
+            ``{'H': GscDetectors.h_detectors()}``.  If omitted, all events are
+            searched together.
+        n (int, optional): Minimum number of detector sets needed for a 
+                           trigger.  Default is 1.
+        holdoff (float, optional): Trigger holdoff time in seconds
+    """
+    _candidate_dtype = [('TILE', np.int16), ('ALGORITHM', np.int16), 
+                        ('TIMESCALE', np.float64), ('TSTART', np.float64), 
+                        ('TIME', np.float64), ('CHAN_LO', np.int16), 
+                        ('CHAN_HI', np.int16), ('SIGNIFICANCE', np.float64), 
+                        ('NUM_DETECTORS', np.int16), ('DETECTORS', 'U64')]
+    
+    def __init__(self, algorithms, background_window, background_offset, 
+                 resolution, channel_edges, detectors=None, n=1, holdoff=None):
+        self._method = GscSlidingWindowMethod(algorithms, background_window, 
+                                              background_offset, resolution,
+                                              channel_edges, ['ALL'], n=n, 
+                                              verbose=False)
+        self._detectors = detectors
+        self._holdoff = holdoff
+        if detectors is not None:
+            self._method.det_names = [str(key) for key in detectors.keys()]
+    
+    @property
+    def method(self):
+        """(:class:`GscSlidingWindowMethod`): The trigger method"""
+        return self._method
+    
+    def search(self, file_paths, time_range=None, num_processes=None):
+        """Search a set of event files.
+        
+        Args:
+            file_paths (list of str): The event files
+            time_range ((float, float), optional): The time range to search
+            num_processes (int, optional): The number of processes.  If 
+                                           omitted or 1, the files are 
+                                           searched in this process.
+        
+        Returns:
+            (np.recarray): The candidates, sorted by time
+        """
+        file_paths = list(file_paths)
+        if num_processes is None or int(num_processes) <= 1:
+            results = [_search_file(self, file_path, time_range) \
+                       for file_path in file_paths]
+        else:
+            with ProcessPoolExecutor(int(num_processes)) as executor:
+                futures = [executor.submit(_search_file, self, file_path, 
+                                           time_range) \
+                           for file_path in file_paths]
+                results = [future.result() for future in futures]
+        return self._sort(np.concatenate([self._empty()] + results))
+    
+    def search_tte(self, tte, tile=None, time_range=None):
+        """Search the events of a single GscTte.
+        
+        Args:
+            tte (:class:`~gdt.missions.maxi.gsc.tte.GscTte`): The event data
+            tile (int, optional): The tile number recorded for the candidates.
+                                  If omitted, the tile is determined from the 
+                                  headers or file name, or is -1.
+            time_range ((float, float), optional): The time range to search
+        
+        Returns:
+            (np.recarray): The candidates, sorted by time
+        """
+        if tile is None:
+            tile = _tile_number(tte)
+        if self._detectors is None:
+            ttes = [tte]
+        else:
+            ttes = [tte.select_detectors(dets) \
+                    for dets in self._detectors.values()]
+        if any([t.data.size == 0 for t in ttes]):
+            return self._empty()
+        
+        self._method.prepare_data(ttes, time_range=time_range)
+        triggers = self._method.apply_trigger(holdoff=self._holdoff)
+        self._method.phaiis = None
+        
+        edges = np.asarray(self._method.channel_edges, dtype=int)
+        candidates = self._empty(len(triggers))
+        for i, trigger in enumerate(triggers):
+            alg = trigger.alg
+            timescale = alg.timescale * 0.001
+            candidates[i] = (tile, trigger.alg_num, timescale, 
+                             trigger.time - timescale, trigger.time,
+                             edges[alg.channels[0]], 
+                             edges[alg.channels[1] + 1] - 1, 
+                             trigger.sig.max(), trigger.triggered_det.sum(),
+                             ','.join(trigger.triggered_det_names))
+        return self._sort(candidates)
+    
+    def _empty(self, size=0):
+        return np.zeros(size, dtype=self._candidate_dtype).view(np.recarray)
+    
+    def _sort(self, candidates):
+        order = np.lexsort((candidates['TILE'], candidates['TIME']))
+        return candidates[order].view(np.recarray)
+
+
+def _cumsum(arr):
+    """Cumulative sum along the last axis, with a leading zero"""
+    cum = np.zeros(arr.shape[:-1] + (arr.shape[-1] + 1,))
+    np.cumsum(arr, axis=-1, out=cum[..., 1:])
+    return cum
+
+
+def _search_file(search, file_path, time_range):
+    """Open an event file and search it"""
+    columns = None
+    if search._detectors is not None:
+        # only load the detector column
+        header = fits.getheader(file_path, 1)
+        names = [header[key].upper() for key in header.keys() \
+                 if key.startswith('TTYPE')]
+        columns = [name for name in GscTte._detector_columns if name in names]
+        columns = columns[:1]
+    tte = GscTte.open(file_path, columns=columns)
+    return search.search_tte(tte, time_range=time_range)
+
+
+def _tile_number(tte):
+    """The HEALPix tile number of an event file, or -1 if unknown"""
+    try:
+        return int(tte.headers['EVENTS']['OBJECT'])
+    except:
+        pass
+    if tte.filename is not None:
+        match = re.search(r'_(\d+)\.evt', tte.filename)
+        if match is not None:
+            return int(match.group(1))
+    return -1
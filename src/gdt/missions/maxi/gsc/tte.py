@@ -26,14 +26,29 @@
 # implied. See the License for the specific language governing permissions and limitations under the
 # License.
 #
+import ast
+import bisect
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import healpy as hp
 import numpy as np
 import astropy.io.fits as fits
 
 from gdt.core.tte import PhotonList
-from gdt.core.data_primitives import Ebounds, Gti, EventList
+from gdt.core.data_primitives import Ebounds, Gti, EventList, EnergyBins, \
+                                    TimeChannelBins, TimeEnergyBins
+from .binning import _interval_union, bin_events
 from .detectors import GscDetectors
 from .headers import EventsHeaders
+from .livetime import GscLivetime
 from ..time import Time
+from gdt.core.pha import Pha
 from gdt.core.phaii import Phaii
 
 __all__ = ['GscTte']
@@ -46,6 +61,22 @@ class GscTte(PhotonList):
     """(float) Deadtime per event (30 microsec).  
     From https://academic.oup.com/pasj/article/63/sp3/S623/1506699
     """
+    _detector_columns = ('GSCID', 'GSC_ID', 'GSC_NO', 'CAMERA', 'DETID', 
+                         'DET_ID')
+    """(tuple) Candidate names of the column containing the detector number"""
+    _archive_events = {'TIME': 'TIME', 'PI': 'PHA'}
+    """(dict) The columns stored in the EventList array of an archive"""
+    _archive_manifest = 'manifest.json'
+    """(str) The name of the manifest file of an archive"""
+    _merge_key_columns = ('RA', 'DEC', 'GSCID')
+    """(tuple) The columns, in addition to TIME and PI, that identify an event
+    when merging files"""
+    
+    def __init__(self):
+        super().__init__()
+        self._event_columns = None
+        self._spatial_index = None
+        self._livetime = None
     
     @property
     def detector(self):
@@ -55,8 +86,204 @@ class GscTte(PhotonList):
         except:
             return self.headers[1]['DETNAM']
 
+    @property
+    def detector_column(self):
+        """(str): The name of the event column containing the detector 
+        number, or None if it was not loaded"""
+        if self._event_columns is None:
+            return None
+        names = self._event_columns.dtype.names
+        for name in self._detector_columns:
+            if name in names:
+                return name
+        return None
+
+    @property
+    def event_columns(self):
+        """(np.recarray): The additional per-event columns loaded by 
+        :meth:`open`, in the same order as the events, or None if they were 
+        not loaded"""
+        return self._event_columns
+
+    @property
+    def event_radec(self):
+        """(np.array, np.array): The RA and Dec of the events, in degrees.  
+        This requires the RA and DEC event columns to have been loaded with 
+        :meth:`open`."""
+        cols = self._event_columns
+        if (cols is None) or ('RA' not in cols.dtype.names) or \
+           ('DEC' not in cols.dtype.names):
+            raise RuntimeError('The RA and DEC columns have not been loaded. '\
+                               'Open the file with columns=True.')
+        return cols['RA'], cols['DEC']
+
+    def select_detectors(self, detectors):
+        """Select the events recorded by one or more detectors.  This requires 
+        the event columns to have been loaded with :meth:`open`.
+        
+        Args:
+            detectors (list): The detectors, as :class:`GscDetectors`, 
+                              detector names (e.g. 'HA0') or numbers
+        
+        Returns:
+            (:class:`GscTte`)
+        """
+        det_col = self.detector_column
+        if det_col is None:
+            raise RuntimeError('The detector column has not been loaded. ' \
+                               'Open the file with columns=True.')
+        
+        if isinstance(detectors, (str, int, GscDetectors)):
+            detectors = [detectors]
+        numbers = []
+        for det in detectors:
+            if isinstance(det, str):
+                det = GscDetectors.from_str(det)
+                if det is None:
+                    raise ValueError('Unknown detector')
+            if isinstance(det, GscDetectors):
+                det = det.number
+            numbers.append(int(det))
+        
+        mask = np.isin(self._event_columns[det_col], numbers)
+        return self._select_events(mask)
+
+    @property
+    def livetime(self):
+        """(:class:`~gdt.missions.maxi.gsc.livetime.GscLivetime`): The 
+        livetime of each GSC counter, calculated from the events the first 
+        time it is used.  If the detector column was loaded, each counter has
+        its own deadtime, otherwise all events are treated as one counter."""
+        if self._livetime is None:
+            self._livetime = GscLivetime.from_tte(self)
+        return self._livetime
+    
+    @property
+    def spatial_index(self):
+        """(int, np.array, np.array): The spatial index of the events: the 
+        HEALPix nside, the NESTED pixel of each event in pixel order, and the
+        indices of the events in pixel order.  None if it has not been built
+        (see :meth:`build_spatial_index`)."""
+        return self._spatial_index
+
+    @property
+    def spatial_index_nside(self):
+        """(int): The HEALPix nside of the spatial index, or None if it has 
+        not been built"""
+        if self._spatial_index is None:
+            return None
+        return self._spatial_index[0]
+
+    def build_spatial_index(self, nside=256):
+        """Build a spatial index of the events, which are sorted by the 
+        NESTED HEALPix pixel containing their sky position.  Region queries 
+        then only test the events in the pixels overlapping the region. This
+        requires the RA and DEC event columns to have been loaded with 
+        :meth:`open`.
+        
+        Args:
+            nside (int, optional): The HEALPix nside of the index. 
+                                   Default is 256.
+        """
+        if not hp.isnsideok(nside, nest=True):
+            raise ValueError('nside must be a power of 2')
+        ra, dec = self.event_radec
+        pix = hp.ang2pix(nside, ra, dec, nest=True, lonlat=True)
+        idx_dtype = np.int32 if pix.size < 2**31 else np.int64
+        order = np.argsort(pix, kind='stable').astype(idx_dtype)
+        pix_dtype = np.int32 if 12 * nside**2 < 2**31 else np.int64
+        self._spatial_index = (nside, pix[order].astype(pix_dtype), order)
+
+    def query_cone(self, coord, radius):
+        """Select the events within a radius of a sky position.  The spatial 
+        index is built with the default nside if it has not been built.
+        
+        Args:
+            coord (astropy.coordinates.SkyCoord): The center of the cone
+            radius (float): The radius of the cone, in degrees
+        
+        Returns:
+            (:class:`GscTte`)
+        """
+        if radius <= 0.0:
+            raise ValueError('radius must be positive')
+        center = self._unit_vectors(coord)[0]
+        nside = self._index_nside()
+        pixels = hp.query_disc(nside, center, np.deg2rad(radius), 
+                               inclusive=True, nest=True)
+        
+        idx = self._index_candidates(pixels)
+        vecs = self._event_vectors(idx)
+        mask = (vecs @ center) >= np.cos(np.deg2rad(radius))
+        return self._select_events(np.sort(idx[mask]))
+
+    def query_polygon(self, coords):
+        """Select the events within a convex polygon on the sky.  The spatial 
+        index is built with the default nside if it has not been built.
+        
+        Args:
+            coords (astropy.coordinates.SkyCoord): The vertices of the polygon
+        
+        Returns:
+            (:class:`GscTte`)
+        """
+        verts = self._unit_vectors(coords)
+        if verts.shape[0] < 3:
+            raise ValueError('A polygon requires at least 3 vertices')
+        nside = self._index_nside()
+        pixels = hp.query_polygon(nside, verts, inclusive=True, nest=True)
+        
+        idx = self._index_candidates(pixels)
+        vecs = self._event_vectors(idx)
+        
+        # an event is inside a convex polygon if it is on the same side of 
+        # each edge's great circle as the polygon's center
+        normals = np.cross(verts, np.roll(verts, -1, axis=0))
+        signs = np.sign(normals @ verts.sum(axis=0))
+        mask = np.all((vecs @ normals.T) * signs >= 0.0, axis=1)
+        return self._select_events(np.sort(idx[mask]))
+
+    def to_pha(self, time_ranges=None, energy_range=None, channel_range=None,
+               livetime=False, **kwargs):
+        """Integrate the events over one or more time ranges to produce a PHA 
+        object.
+        
+        Args:
+            time_ranges ([(float, float), ...], optional):
+                The time range of the spectrum. If omitted, uses the entire
+                time range of the data.
+            energy_range ((float, float), optional):
+                The energy range of the spectrum. If omitted, uses the entire
+                energy range of the data.
+            channel_range ((int, int), optional):
+                The channel range of the spectrum. If omitted, uses the entire
+                energy range of the data.
+            livetime (bool or :class:`~gdt.missions.maxi.gsc.livetime.GscLivetime`, optional):
+                If True, the exposure is calculated from the livetime of each
+                GSC counter (see :attr:`livetime`), or from the given 
+                livetimes.  Default is False.
+            **kwargs: Options passed to :meth:`~gdt.core.pha.Pha.from_data`
+
+        Returns:
+            (:class:`~gdt.core.pha.Pha`)
+        """
+        pha = super().to_pha(time_ranges=time_ranges, 
+                             energy_range=energy_range, 
+                             channel_range=channel_range, **kwargs)
+        livetime = self._get_livetime(livetime)
+        if livetime is None:
+            return pha
+        
+        chan_range = self._channel_range(energy_range, channel_range)
+        exposure = livetime.range_exposure(pha.gti.as_list(), 
+                                           channel_range=chan_range)
+        bins = EnergyBins(pha.data.counts, pha.data.lo_edges, 
+                          pha.data.hi_edges, exposure)
+        return Pha.from_data(bins, gti=pha.gti, trigger_time=pha.trigtime, 
+                             channel_mask=pha.channel_mask, **kwargs)
+    
     def to_phaii(self, bin_method, *args, time_range=None, energy_range=None,
-                 channel_range=None, **kwargs):
+                 channel_range=None, livetime=False, **kwargs):
         """Convert the PhotonList data to PHAII data by binning the data in 
         time.
 
@@ -76,49 +303,1247 @@ class GscTte(PhotonList):
             channel_range ((int, int), optional): 
                 The channel range of the spectrum. If omitted, uses the entire 
                 energy range of the data.
+            livetime (bool or :class:`~gdt.missions.maxi.gsc.livetime.GscLivetime`, optional):
+                If True, the exposure is calculated from the livetime of each
+                GSC counter (see :attr:`livetime`), or from the given 
+                livetimes.  Default is False.
             **kwargs: Options to pass to the binning function
         
         Returns:
             (:class:`~gdt.core.phaii.Phaii`)
         """
         headers = None
-        return super().to_phaii(bin_method, *args, time_range=time_range, 
-                                energy_range=energy_range, 
-                                channel_range=channel_range, 
-                                phaii_class=Phaii, headers=headers, **kwargs)
+        phaii = super().to_phaii(bin_method, *args, time_range=time_range, 
+                                 energy_range=energy_range, 
+                                 channel_range=channel_range, 
+                                 phaii_class=Phaii, headers=headers, **kwargs)
+        livetime = self._get_livetime(livetime)
+        if livetime is None:
+            return phaii
+        
+        data = phaii.data
+        chan_range = self._channel_range(energy_range, channel_range)
+        exposure = livetime.exposure(data.tstart, data.tstop, 
+                                     channel_range=chan_range)
+        if isinstance(data, TimeEnergyBins):
+            bins = TimeEnergyBins(data.counts, data.tstart, data.tstop, 
+                                  exposure, data.emin, data.emax)
+        else:
+            bins = TimeChannelBins(data.counts, data.tstart, data.tstop, 
+                                   exposure, data.chan_nums)
+        return Phaii.from_data(bins, gti=phaii.gti, 
+                               trigger_time=phaii.trigtime, headers=headers)
+
+    def to_phaii_fast(self, bin_method, *args, time_range=None, 
+                      channel_range=None, gti_exposure=True, livetime=False,
+                      **kwargs):
+        """Convert the events to PHAII data by binning them in time, using a 
+        single histogram pass over the events.  The result has the same time 
+        bins as :meth:`to_phaii`, but the exposure of each bin is the good 
+        time within the bin, minus the deadtime of its events.  See 
+        :func:`~gdt.missions.maxi.gsc.binning.bin_events`.
+        
+        Args:
+            bin_method (<function>): A binning function for unbinned data
+            *args: Arguments to pass to the binning function
+            time_range ((float, float), optional):
+                The time range of the PHAII. If omitted, uses the entire 
+                time range of the data.
+            channel_range ((int, int), optional): 
+                The channel range of the PHAII. If omitted, uses the entire 
+                channel range of the data.
+            gti_exposure (bool, optional): 
+                If True, the exposure only includes the good time in each bin.
+                If False, the full bin width is used, as in :meth:`to_phaii`.
+                Default is True.
+            livetime (bool or :class:`~gdt.missions.maxi.gsc.livetime.GscLivetime`, optional):
+                If True, the exposure is calculated from the livetime of each
+                GSC counter (see :attr:`livetime`), or from the given 
+                livetimes.  Default is False.
+            **kwargs: Options to pass to the binning function
+        
+        Returns:
+            (:class:`~gdt.core.phaii.Phaii`)
+        """
+        bins = bin_events(self, bin_method, *args, time_range=time_range, 
+                          channel_range=channel_range, 
+                          gti_exposure=gti_exposure, 
+                          livetime=self._get_livetime(livetime), **kwargs)
+        return Phaii.from_data(bins, gti=self.gti, trigger_time=self.trigtime)
+
     @classmethod
-    def open(cls, file_path, **kwargs):
-        """Open an events FITS file and return the TTE object
+    def open(cls, file_path, pi_dtype=None, time_ref=None, columns=None, 
+             time_range=None, **kwargs):
+        """Open an events FITS file, or an archive written by 
+        :meth:`build_archive`, and return the TTE object
 
         Args:
-            file_path (str): The file path of the FITS file
+            file_path (str): The file path of the FITS file or archive
+            pi_dtype (np.dtype, optional): 
+                The integer dtype used to store the PI channels, e.g. 
+                np.uint16.  If omitted, the dtype of the PI column is used.
+            time_ref (float or str, optional): 
+                If set, the event times and GTIs are stored relative to this 
+                time, which also becomes the :attr:`trigtime`.  If 'TSTART', 
+                the start time of the file is used.  Relative times retain more
+                precision in float64.
+            columns (bool or list of str, optional): 
+                The additional event columns to load into 
+                :attr:`event_columns`, e.g. ['RA', 'DEC', 'GSCID'].  If True, 
+                all columns except TIME and PI are loaded.  Integer columns 
+                are stored with the narrowest dtype that holds their values.
+            time_range ((float, float), optional): 
+                If set, only the events and GTIs within this time range are 
+                read.  If the file has a time index (see 
+                :meth:`build_time_index`), only the rows in the time range 
+                are read from the file.
         
         Returns:        
             (:class:`GscTte`)
         """
+        if cls._is_archive(file_path):
+            return cls._open_archive(file_path, pi_dtype=pi_dtype, 
+                                     time_ref=time_ref, columns=columns, 
+                                     time_range=time_range)
+        if time_range is not None:
+            return cls._open_time_range(file_path, time_range, 
+                                        pi_dtype=pi_dtype, time_ref=time_ref,
+                                        columns=columns)
+        
         obj = super().open(file_path, **kwargs)
-        trigtime = None
         
         # get the headers
         hdrs = [hdu.header for hdu in obj.hdulist]
         headers = EventsHeaders.from_headers(hdrs)
+        trigtime = cls._trigger_time(time_ref, headers)
         
         # data
-        times = obj.column(1, 'TIME')
-        data = EventList(times=times, channels=obj.column(1, 'PI'))
+        events = obj.hdulist[1].data
+        data = cls._event_list(events['TIME'], events['PI'], pi_dtype=pi_dtype,
+                               time_ref=trigtime)
+        event_columns = None
+        if columns is not None and columns is not False:
+            event_columns = cls._compact_columns(events, columns)
         
         # the good time intervals
         gti_start = obj.column(2, 'START')
         gti_stop = obj.column(2, 'STOP')
+        if trigtime is not None:
+            gti_start -= trigtime
+            gti_stop -= trigtime
         gti = Gti.from_bounds(gti_start, gti_stop)
 
         obj.close()
         
-        return cls.from_data(data, gti=gti, filename=obj.filename,
-                             headers=headers, 
+        tte = cls.from_data(data, gti=gti, trigger_time=trigtime, 
+                            filename=obj.filename, headers=headers, 
+                            event_deadtime=cls._event_deadtime,
+                            overflow_deadtime=cls._event_deadtime)
+        tte._event_columns = event_columns
+        return tte
+
+    @classmethod
+    def open_many(cls, file_paths, max_workers=None, max_files=None, 
+                  **kwargs):
+        """Open many events files concurrently in a pool of threads.  A file
+        that cannot be opened does not stop the other files from being opened;
+        instead, the exception raised for that file is returned in its place.
+        See :meth:`iter_open` to process the files as they are opened.
+        
+        Args:
+            file_paths (list of str): The file paths of the FITS files or 
+                                      archives
+            max_workers (int, optional): The number of threads.  If omitted,
+                                         the default of 
+                                         :class:`~concurrent.futures.ThreadPoolExecutor`
+                                         is used.
+            max_files (int, optional): 
+                The maximum number of files being opened at once.  If omitted,
+                twice the number of threads.
+            **kwargs: Options passed to :meth:`open`
+        
+        Returns:
+            (list): The :class:`GscTte` for each file, in the order of 
+                    ``file_paths``, or the exception raised when opening it
+        """
+        return [tte for _, tte in cls.iter_open(file_paths, 
+                                                max_workers=max_workers,
+                                                max_files=max_files, 
+                                                **kwargs)]
+    
+    @classmethod
+    def iter_open(cls, file_paths, max_workers=None, max_files=None, 
+                  **kwargs):
+        """Open many events files concurrently in a pool of threads, yielding
+        each file in the order of ``file_paths`` as it is opened.  At most 
+        ``max_files`` files are opened ahead of the file being yielded, which
+        limits the memory used if the caller does not keep the files.
+        
+        Args:
+            file_paths (list of str): The file paths of the FITS files or 
+                                      archives
+            max_workers (int, optional): The number of threads.  If omitted,
+                                         the default of 
+                                         :class:`~concurrent.futures.ThreadPoolExecutor`
+                                         is used.
+            max_files (int, optional): 
+                The maximum number of files being opened at once.  If omitted,
+                twice the number of threads.
+            **kwargs: Options passed to :meth:`open`
+        
+        Yields:
+            (str, :class:`GscTte` or Exception): The file path and either the
+                                                 TTE object or the exception 
+                                                 raised when opening it
+        """
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        if max_files is None:
+            max_files = 2 * max_workers
+        if (max_workers < 1) or (max_files < 1):
+            raise ValueError('max_workers and max_files must be positive')
+        
+        def open_file(file_path):
+            try:
+                return cls.open(file_path, **kwargs)
+            except Exception as err:
+                return err
+        
+        file_paths = iter(file_paths)
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for file_path in file_paths:
+                pending.append((file_path, 
+                                executor.submit(open_file, file_path)))
+                if len(pending) < max_files:
+                    continue
+                file_path, future = pending.popleft()
+                yield file_path, future.result()
+            while pending:
+                file_path, future = pending.popleft()
+                yield file_path, future.result()
+        finally:
+            # shutdown(cancel_futures=True) requires Python 3.9
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+    
+    @classmethod
+    def build_time_index(cls, file_path, cadence=64.0, read_events=1000000):
+        """Write a time index for an events file, which maps times at a fixed
+        cadence to the row offsets of the events.  The index is written next 
+        to the file, with the extension ``.tidx.npz`` appended, and is used by
+        :meth:`open` when a ``time_range`` is requested.  The index is ignored
+        if the events file is later modified.
+        
+        Args:
+            file_path (str): The file path of the FITS file
+            cadence (float, optional): The time between index entries, in 
+                                       seconds. Default is 64.
+            read_events (int, optional): The number of events read from the 
+                                         file at a time. Default is 1000000.
+        
+        Returns:
+            (Path): The path of the index
+        """
+        if cadence <= 0.0:
+            raise ValueError('cadence must be positive')
+        file_path = Path(file_path)
+        reader = _EventsReader(file_path)
+        
+        # rows[k] is the number of events before tstart + k * cadence
+        if reader.num_rows > 0:
+            tstart = np.floor(reader.first_time / cadence) * cadence
+            num = int(np.floor((reader.last_time - tstart) / cadence)) + 2
+        else:
+            tstart, num = 0.0, 1
+        grid = tstart + np.arange(num) * cadence
+        rows = np.zeros(num, dtype=np.int64)
+        for times, _ in reader.iter_rows(int(read_events)):
+            if np.any(times[1:] < times[:-1]):
+                raise ValueError('Events must be sorted in time')
+            rows += np.searchsorted(times, grid, side='left')
+        
+        # the headers and GTIs are also stored, so that a gzipped file does
+        # not need to be decompressed past the requested rows
+        stat = file_path.stat()
+        index_path = cls._time_index_path(file_path)
+        np.savez(index_path, tstart=tstart, cadence=cadence, rows=rows, 
+                 size=stat.st_size, mtime_ns=stat.st_mtime_ns, 
+                 **reader.layout)
+        return index_path
+
+    @classmethod
+    def build_archive(cls, file_path, archive_path=None, overwrite=False):
+        """Convert an events FITS file to an uncompressed, columnar archive
+        that can be memory-mapped.  The archive is a directory containing one
+        ``.npy`` file per table column and a JSON manifest of the FITS headers.
+        :meth:`open` reads the archive in place of the FITS file, and 
+        :meth:`archive_to_fits` writes the original FITS file back out.
+        
+        Args:
+            file_path (str): The file path of the FITS file
+            archive_path (str, optional): 
+                The path of the archive directory.  If omitted, the archive is
+                written next to the FITS file, with the extension ``.gsca`` in 
+                place of the FITS extensions.
+            overwrite (bool, optional): If True, overwrite an existing archive.
+                                        Default is False.
+        
+        Returns:
+            (Path): The path of the archive
+        """
+        file_path = Path(file_path)
+        if archive_path is None:
+            archive_path = file_path.with_name(
+                                   file_path.name.split('.')[0] + '.gsca')
+        archive_path = Path(archive_path)
+        if archive_path.exists():
+            if not overwrite:
+                raise FileExistsError('{} already exists'.format(archive_path))
+            if not cls._is_archive(archive_path):
+                raise ValueError('{} is not an archive'.format(archive_path))
+        
+        # written to a temporary directory first, so that an archive is never
+        # partially written
+        tmp_path = Path(tempfile.mkdtemp(prefix='.' + archive_path.name, 
+                                         dir=archive_path.parent))
+        try:
+            with fits.open(file_path, memmap=False) as hdulist:
+                manifest = cls._write_archive(hdulist, tmp_path)
+            manifest['filename'] = file_path.name
+            with open(tmp_path / cls._archive_manifest, 'w') as f:
+                json.dump(manifest, f)
+            if archive_path.exists():
+                shutil.rmtree(archive_path)
+            os.replace(tmp_path, archive_path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return archive_path
+    
+    @classmethod
+    def archive_to_fits(cls, archive_path, file_path, overwrite=False, 
+                        write_rows=1000000):
+        """Write an archive created by :meth:`build_archive` back to a FITS 
+        file.  The headers and the raw table values are written unchanged, so
+        the FITS file is identical to the file that was archived.
+        
+        Args:
+            archive_path (str): The path of the archive directory
+            file_path (str): The file path of the FITS file to write.  If the
+                             path ends in ``.gz``, the file is gzipped.
+            overwrite (bool, optional): If True, overwrite an existing file.
+                                        Default is False.
+            write_rows (int, optional): The number of table rows written at a 
+                                        time. Default is 1000000.
+        """
+        archive_path = Path(archive_path)
+        file_path = Path(file_path)
+        manifest = cls._read_archive_manifest(archive_path)
+        events = np.load(archive_path / 'events.npy', mmap_mode='r')
+        
+        mode = 'wb' if overwrite else 'xb'
+        opener = gzip.open if file_path.suffix.lower() == '.gz' else open
+        with opener(file_path, mode) as f:
+            for i, hdu in enumerate(manifest['hdus']):
+                f.write(hdu['header'].encode('ascii'))
+                if i == 0:
+                    continue
+                
+                columns = {}
+                dtype = np.lib.format.descr_to_dtype(
+                                              ast.literal_eval(hdu['dtype']))
+                for name in dtype.names:
+                    if name in hdu['columns']:
+                        columns[name] = np.load(cls._archive_column_path(
+                                                     archive_path, i, name), 
+                                                mmap_mode='r')
+                    else:
+                        columns[name] = events[cls._archive_events[name]]
+                
+                # the raw big-endian rows, padded to a multiple of the FITS 
+                # block size
+                num_rows = fits.Header.fromstring(hdu['header'])['NAXIS2']
+                for start in range(0, num_rows, write_rows):
+                    stop = min(start + write_rows, num_rows)
+                    data = np.empty(stop - start, dtype=dtype)
+                    for name, arr in columns.items():
+                        data[name] = arr[start:stop]
+                    f.write(data.tobytes())
+                f.write(bytes(-num_rows * dtype.itemsize % 2880))
+    
+    @classmethod
+    def iter_chunks(cls, file_path, chunk_events=None, chunk_seconds=None,
+                    pi_dtype=None, time_ref=None, read_events=1000000):
+        """Iterate over an events FITS file in time-ordered chunks without
+        reading the whole file into memory.  Each chunk is a :class:`GscTte`
+        containing the events of the chunk and the GTIs intersected with the
+        time span of the chunk.  The time spans of consecutive chunks are 
+        contiguous, so the chunks together cover the same GTIs as the file.
+        
+        The events in the file must be sorted in time.  Only one of 
+        ``chunk_events`` or ``chunk_seconds`` can be set.
+        
+        Args:
+            file_path (str): The file path of the FITS file
+            chunk_events (int, optional): The number of events in each chunk
+            chunk_seconds (float, optional): 
+                The duration of each chunk in seconds, starting at the 
+                beginning of the first GTI.  Chunks that contain no events and
+                no good time are skipped.
+            pi_dtype (np.dtype, optional): 
+                The integer dtype used to store the PI channels
+            time_ref (float or str, optional): 
+                If set, the event times and GTIs are stored relative to this 
+                time.  If 'TSTART', the start time of the file is used.
+            read_events (int, optional): The number of events read from the 
+                                         file at a time. Default is 1000000.
+        
+        Yields:
+            (:class:`GscTte`)
+        """
+        if (chunk_events is None) == (chunk_seconds is None):
+            raise ValueError('Either chunk_events or chunk_seconds must be set')
+        if chunk_events is not None:
+            chunk_events = int(chunk_events)
+            if chunk_events <= 0:
+                raise ValueError('chunk_events must be positive')
+            read_events = chunk_events
+        else:
+            chunk_seconds = float(chunk_seconds)
+            if chunk_seconds <= 0.0:
+                raise ValueError('chunk_seconds must be positive')
+        if read_events <= 0:
+            raise ValueError('read_events must be positive')
+        
+        reader = _EventsReader(file_path)
+        headers = reader.headers
+        filename = Path(file_path).name
+        
+        trigtime = cls._trigger_time(time_ref, headers)
+        ref = 0.0 if trigtime is None else trigtime
+        gti_start = reader.gti_start - ref
+        gti_stop = reader.gti_stop - ref
+
+        def make_chunk(times, pis, tstart, tstop):
+            return cls._make_chunk(times, pis, gti_start, gti_stop, tstart, 
+                                   tstop, pi_dtype=pi_dtype, trigtime=trigtime,
+                                   filename=filename, headers=headers)
+        
+        # chunks are bounded by the GTIs, or the events if they extend 
+        # beyond the GTIs
+        first_time = reader.first_time
+        last_time = reader.last_time
+        if gti_start.size > 0:
+            tmin = gti_start.min() + ref
+            tmax = gti_stop.max() + ref
+            if first_time is not None:
+                tmin = min(tmin, first_time)
+                tmax = max(tmax, last_time)
+        else:
+            tmin, tmax = first_time, last_time
+        if tmin is None:
+            return
+        tmax = np.nextafter(tmax, np.inf)
+        
+        if chunk_events is not None:
+            # each chunk spans from the end of the previous chunk to the 
+            # first event of the next chunk
+            tstart = tmin
+            pending = None
+            for times, pis in reader.iter_rows(chunk_events):
+                if pending is not None:
+                    yield make_chunk(*pending, tstart - ref, times[0] - ref)
+                    tstart = times[0]
+                pending = (times, pis)
+            if pending is not None:
+                yield make_chunk(*pending, tstart - ref, tmax - ref)
+            return
+        
+        # fixed-duration chunks
+        edges_start = tmin
+        num_chunks = int(np.ceil((tmax - tmin) / chunk_seconds))
+        gti_lo = gti_start + ref
+        gti_hi = gti_stop + ref
+        
+        def empty_chunks(first, last):
+            # chunks without events that contain good time
+            for i in range(first, last):
+                lo = edges_start + i * chunk_seconds
+                hi = min(lo + chunk_seconds, tmax)
+                if np.any((gti_hi > lo) & (gti_lo < hi)):
+                    yield make_chunk(np.array([]), 
+                                     np.array([], dtype=reader.pi_dtype),
+                                     lo - ref, hi - ref)
+        
+        current = 0
+        buf_times = []
+        buf_pis = []
+        for times, pis in reader.iter_rows(read_events):
+            idx = np.floor((times - edges_start) / chunk_seconds).astype(int)
+            idx = np.clip(idx, 0, num_chunks - 1)
+            splits = np.flatnonzero(np.diff(idx)) + 1
+            bounds = np.concatenate(([0], splits, [times.size]))
+            for j in range(bounds.size - 1):
+                i = idx[bounds[j]]
+                if i != current:
+                    if len(buf_times) > 0:
+                        lo = edges_start + current * chunk_seconds
+                        yield make_chunk(np.concatenate(buf_times), 
+                                         np.concatenate(buf_pis), lo - ref,
+                                         min(lo + chunk_seconds, tmax) - ref)
+                        buf_times, buf_pis = [], []
+                        yield from empty_chunks(current + 1, i)
+                    else:
+                        yield from empty_chunks(current, i)
+                    current = i
+                buf_times.append(times[bounds[j]:bounds[j+1]])
+                buf_pis.append(pis[bounds[j]:bounds[j+1]])
+        
+        if len(buf_times) > 0:
+            lo = edges_start + current * chunk_seconds
+            yield make_chunk(np.concatenate(buf_times), np.concatenate(buf_pis),
+                             lo - ref, min(lo + chunk_seconds, tmax) - ref)
+            current += 1
+        yield from empty_chunks(current, num_chunks)
+    
+    @classmethod
+    def iter_merged(cls, file_paths, chunk_events=1000000, pi_dtype=None, 
+                    time_ref=None, read_events=100000, columns=None):
+        """Merge several events files, e.g. the files for different HEALPix 
+        tiles, into a single time-ordered stream of chunks.  The files are 
+        read in blocks and merged incrementally, so the full set of events is
+        never held in memory.  The GTIs of the files are combined.
+        
+        An event that is in more than one of the files is only included once.
+        Events are matched on the TIME, PI, RA, DEC and GSCID columns (those 
+        of them that are in every file).  Identical events within the same 
+        file are all kept, because the event times are quantized and distinct
+        events can share a time and channel.
+        
+        Only the TIME and PI columns are merged, unless other columns are 
+        requested with ``columns``.  The events in each file must be sorted 
+        in time.
+        
+        Args:
+            file_paths (list of str): The file paths of the FITS files
+            chunk_events (int, optional): The approximate number of events in 
+                                          each chunk. Default is 1000000.
+            pi_dtype (np.dtype, optional): 
+                The integer dtype used to store the PI channels
+            time_ref (float or str, optional): 
+                If set, the event times and GTIs are stored relative to this 
+                time.  If 'TSTART', the earliest start time of the files is 
+                used.
+            read_events (int, optional): The number of events read from each
+                                         file at a time. Default is 100000.
+            columns (bool or list of str, optional): 
+                The additional event columns to merge into 
+                :attr:`event_columns` of each chunk.  If True, all columns 
+                except TIME and PI are merged.  The columns keep the dtype of
+                the files, so that the chunks can be concatenated.
+        
+        Yields:
+            (:class:`GscTte`)
+        """
+        file_paths = list(file_paths)
+        if len(file_paths) == 0:
+            raise ValueError('At least one file is required')
+        if int(chunk_events) <= 0:
+            raise ValueError('chunk_events must be positive')
+        if int(read_events) <= 0:
+            raise ValueError('read_events must be positive')
+        
+        readers = [_EventsReader(file_path) for file_path in file_paths]
+        headers = readers[0].headers
+        columns, key_names = cls._merge_columns(readers, columns)
+        read_names = columns + [name for name in key_names \
+                                if name not in columns]
+        
+        trigtime = cls._trigger_time(time_ref, 
+                                     [reader.headers for reader in readers])
+        ref = 0.0 if trigtime is None else trigtime
+        
+        gti_start, gti_stop = _interval_union(
+                              np.concatenate([r.gti_start for r in readers]),
+                              np.concatenate([r.gti_stop for r in readers]))
+        first_times = [r.first_time for r in readers \
+                       if r.first_time is not None]
+        last_times = [r.last_time for r in readers if r.last_time is not None]
+        if gti_start.size > 0:
+            tmin = min([gti_start[0]] + first_times)
+            tmax = max([gti_stop[-1]] + last_times)
+        elif len(first_times) > 0:
+            tmin, tmax = min(first_times), max(last_times)
+        else:
+            return
+        tmax = np.nextafter(tmax, np.inf)
+        gti_start -= ref
+        gti_stop -= ref
+        
+        def make_chunk(times, pis, cols, tstart, tstop):
+            chunk = cls._make_chunk(times, pis, gti_start, gti_stop, 
+                                    tstart - ref, tstop - ref, 
+                                    pi_dtype=pi_dtype, trigtime=trigtime, 
+                                    filename=None, headers=headers)
+            if len(columns) > 0:
+                chunk._event_columns = cls._compact_columns(cols, columns, 
+                                                            narrow=False)
+            return chunk
+        
+        # at least one block of events is buffered from each file.  The 
+        # events before the horizon, the earliest of the last buffered times,
+        # can be merged, because every later event in any file is at or after
+        # the horizon.  Events at the horizon wait for the next round, so that
+        # all copies of an event are merged together, and a buffer is extended
+        # until it holds more than one time.  Once every file is read, all of
+        # the buffered events are merged.
+        iters = [reader.iter_rows(int(read_events), columns=read_names) \
+                 for reader in readers]
+        buffers = [next(it, None) for it in iters]
+        done = [buf is None for buf in buffers]
+        
+        tstart = tmin
+        out, out_size = [], 0
+        while any([buf is not None for buf in buffers]):
+            active = [i for i, buf in enumerate(buffers) if buf is not None]
+            for i in active:
+                while (not done[i]) and (buffers[i][0][0] == buffers[i][0][-1]):
+                    block = next(iters[i], None)
+                    if block is None:
+                        done[i] = True
+                    else:
+                        buffers[i] = cls._concatenate_merged(
+                                     [buffers[i], block], read_names)
+            
+            reading = [i for i in active if not done[i]]
+            if len(reading) > 0:
+                horizon = min([buffers[i][0][-1] for i in reading])
+                side = 'left'
+            else:
+                horizon = max([buffers[i][0][-1] for i in active])
+                side = 'right'
+            
+            batch = []
+            for i in active:
+                times, pis, cols = buffers[i]
+                split = np.searchsorted(times, horizon, side=side)
+                batch.append((times[:split], pis[:split], 
+                              {name: col[:split] for name, col in cols.items()},
+                              np.full(split, i)))
+                if split < times.size:
+                    buffers[i] = (times[split:], pis[split:], 
+                                  {name: col[split:] \
+                                   for name, col in cols.items()})
+                else:
+                    buffers[i] = None if done[i] else next(iters[i], None)
+                    done[i] = done[i] or (buffers[i] is None)
+            
+            times = np.concatenate([b[0] for b in batch])
+            pis = np.concatenate([b[1] for b in batch])
+            cols = {name: np.concatenate([b[2][name] for b in batch]) \
+                    for name in read_names}
+            sources = np.concatenate([b[3] for b in batch])
+            
+            # sort by the event keys, and then by file
+            keys = [times, pis] + [cols[name] for name in key_names]
+            order = np.lexsort([sources] + keys[::-1])
+            times, pis, sources = times[order], pis[order], sources[order]
+            cols = {name: col[order] for name, col in cols.items()}
+            
+            # remove events that are also in another file
+            if len(batch) > 1:
+                keep = _unique_across_sources([times, pis] + \
+                                    [cols[name] for name in key_names], sources)
+                if not keep.all():
+                    times, pis = times[keep], pis[keep]
+                    cols = {name: col[keep] for name, col in cols.items()}
+            
+            out.append((times, pis, cols))
+            out_size += times.size
+            if out_size >= chunk_events:
+                # the next chunk starts at its first event
+                nexts = [buf[0][0] for buf in buffers if buf is not None]
+                tstop = min(nexts) if len(nexts) > 0 else tmax
+                yield make_chunk(*cls._concatenate_merged(out, columns), 
+                                 tstart, tstop)
+                tstart = tstop
+                out, out_size = [], 0
+        
+        if (out_size > 0) or (tstart < tmax):
+            if out_size == 0:
+                out = [cls._empty_merged(readers, columns)]
+            yield make_chunk(*cls._concatenate_merged(out, columns), 
+                             tstart, tmax)
+    
+    @classmethod
+    def merge_files(cls, file_paths, pi_dtype=None, time_ref=None, 
+                    read_events=100000, columns=None):
+        """Merge several events files, e.g. the files for different HEALPix 
+        tiles, into a single time-ordered :class:`GscTte`.  Events that are in
+        more than one of the files are only included once, and the GTIs of the
+        files are combined.  See :meth:`iter_merged`.
+        
+        Args:
+            file_paths (list of str): The file paths of the FITS files
+            pi_dtype (np.dtype, optional): 
+                The integer dtype used to store the PI channels
+            time_ref (float or str, optional): 
+                If set, the event times and GTIs are stored relative to this 
+                time.  If 'TSTART', the earliest start time of the files is 
+                used.
+            read_events (int, optional): The number of events read from each
+                                         file at a time. Default is 100000.
+            columns (bool or list of str, optional): 
+                The additional event columns to merge into 
+                :attr:`event_columns`.  If True, all columns except TIME and 
+                PI are merged.  Integer columns are stored with the narrowest 
+                dtype that holds their values.
+        
+        Returns:
+            (:class:`GscTte`)
+        """
+        file_paths = list(file_paths)
+        chunks = list(cls.iter_merged(file_paths, pi_dtype=pi_dtype, 
+                                      time_ref=time_ref, 
+                                      read_events=read_events, 
+                                      columns=columns))
+        if len(chunks) == 0:
+            # no events and no good time in any of the files
+            readers = [_EventsReader(file_path) for file_path in file_paths]
+            names, _ = cls._merge_columns(readers, columns)
+            times, pis, cols = cls._empty_merged(readers, names)
+            trigtime = cls._trigger_time(time_ref, 
+                                         [reader.headers for reader in readers])
+            headers = readers[0].headers
+        else:
+            times = np.concatenate([chunk.data.times for chunk in chunks])
+            pis = np.concatenate([chunk.data.channels for chunk in chunks])
+            names = []
+            if chunks[0].event_columns is not None:
+                names = list(chunks[0].event_columns.dtype.names)
+            cols = {name: np.concatenate([chunk.event_columns[name] \
+                                          for chunk in chunks]) \
+                    for name in names}
+            trigtime = chunks[0].trigtime
+            headers = chunks[0].headers
+        
+        bounds = [chunk.gti.as_list() for chunk in chunks \
+                  if chunk.gti is not None]
+        gti = None
+        if len(bounds) > 0:
+            bounds = np.concatenate(bounds).reshape(-1, 2)
+            gti_start, gti_stop = _interval_union(bounds[:, 0], bounds[:, 1])
+            gti = Gti.from_bounds(gti_start, gti_stop)
+        
+        data = cls._event_list(times, pis, pi_dtype=pi_dtype)
+        if (gti is None) and (data.size == 0):
+            # without events, there is no time range to use as the GTI
+            tte = cls.from_data(data, gti=Gti.from_list([(0.0, 0.0)]), 
+                                trigger_time=trigtime, headers=headers, 
+                                event_deadtime=cls._event_deadtime,
+                                overflow_deadtime=cls._event_deadtime)
+            tte._gti = None
+        else:
+            tte = cls.from_data(data, gti=gti, trigger_time=trigtime,
+                                headers=headers, 
+                                event_deadtime=cls._event_deadtime,
+                                overflow_deadtime=cls._event_deadtime)
+        if len(names) > 0:
+            tte._event_columns = cls._compact_columns(cols, names)
+        return tte
+    
+    @classmethod
+    def _make_chunk(cls, times, pis, gti_start, gti_stop, tstart, tstop, 
+                    pi_dtype=None, trigtime=None, filename=None, headers=None):
+        """Create a GscTte for a chunk of events, with the GTIs intersected 
+        with the time span of the chunk.  The GTIs and time span are relative 
+        to ``trigtime``, and the event times are absolute.
+        """
+        data = cls._event_list(times, pis, pi_dtype=pi_dtype, 
+                               time_ref=trigtime)
+        starts = np.maximum(gti_start, tstart)
+        stops = np.minimum(gti_stop, tstop)
+        mask = (stops > starts)
+        if mask.any():
+            gti = Gti.from_bounds(starts[mask], stops[mask])
+        else:
+            gti = None
+        return cls.from_data(data, gti=gti, trigger_time=trigtime,
+                             filename=filename, headers=headers, 
                              event_deadtime=cls._event_deadtime,
                              overflow_deadtime=cls._event_deadtime)
+    
+    @staticmethod
+    def _concatenate_merged(blocks, columns):
+        """Concatenate blocks of merged (times, PI, columns) events, keeping
+        only the requested columns"""
+        times = np.concatenate([block[0] for block in blocks])
+        pis = np.concatenate([block[1] for block in blocks])
+        cols = {name: np.concatenate([block[2][name] for block in blocks]) \
+                for name in columns}
+        return times, pis, cols
+    
+    @staticmethod
+    def _empty_merged(readers, columns):
+        """Empty (times, PI, columns) events with the dtypes of the merged
+        events"""
+        def dtype(name):
+            return np.result_type(*[reader.column_dtype(name) \
+                                    for reader in readers])
+        cols = {name: np.array([], dtype=dtype(name)) for name in columns}
+        return np.array([]), np.array([], dtype=dtype('PI')), cols
+
+    @classmethod
+    def _merge_columns(cls, readers, columns):
+        """The (upper-case) names of the event columns to merge and of the 
+        columns that identify an event, from the ``columns`` argument of 
+        :meth:`iter_merged`."""
+        names = [[name.upper() for name in reader.column_names] \
+                 for reader in readers]
+        common = [name for name in names[0] \
+                  if all([name in others for others in names[1:]])]
+        key_names = [name for name in cls._merge_key_columns \
+                     if name in common]
+        
+        if (columns is None) or (columns is False):
+            columns = []
+        elif columns is True:
+            columns = [name for name in common if name not in ('TIME', 'PI')]
+        elif isinstance(columns, str):
+            columns = [columns]
+        columns = [name.upper() for name in columns]
+        for name in columns:
+            if name not in common:
+                raise ValueError('{} is not an events column of every '\
+                                 'file'.format(name))
+        return columns, key_names
+    
+    def _channel_range(self, energy_range, channel_range):
+        """The channel range selected by the ``energy_range`` and 
+        ``channel_range`` arguments of the binning methods, which is used to 
+        weight the livetimes, or None if all channels are used.  As for 
+        :meth:`~gdt.core.data_primitives.EventList.energy_slice`, an energy 
+        range selects the channels that overlap it.
+        """
+        if (channel_range is not None) or (energy_range is None) or \
+           (self.ebounds is None):
+            return channel_range
+        emin = np.asarray(self.ebounds.low_edges())
+        emax = np.asarray(self.ebounds.high_edges())
+        return (int(np.searchsorted(emax, energy_range[0], side='right')),
+                int(np.searchsorted(emin, energy_range[1], side='left')) - 1)
+
+    def _event_vectors(self, idx):
+        """Unit vectors of a subset of the events, in double precision"""
+        ra, dec = self.event_radec
+        return hp.ang2vec(ra[idx].astype(float), dec[idx].astype(float), 
+                          lonlat=True)
+
+    def _get_livetime(self, livetime):
+        """The livetimes for the ``livetime`` argument of the binning 
+        methods, or None if the livetimes are not used.
+        """
+        if isinstance(livetime, GscLivetime):
+            return livetime
+        if livetime is True:
+            return self.livetime
+        if livetime is False or livetime is None:
+            return None
+        raise TypeError('livetime must be a bool or GscLivetime')
+    
+    def _index_candidates(self, pixels):
+        """The indices of the events in a set of NESTED pixels, using the 
+        spatial index"""
+        _, sorted_pix, order = self._spatial_index
+        return _pixel_candidates(pixels, sorted_pix, order)
+
+    def _index_nside(self):
+        """The nside of the spatial index, building it if needed"""
+        if self._spatial_index is None:
+            self.build_spatial_index()
+        return self._spatial_index[0]
+
+    def _select_events(self, idx):
+        """A new GscTte with a subset of the events, selected by a boolean 
+        mask or sorted indices"""
+        data = EventList(ebounds=self.data.ebounds)
+        data._events = self.data._events[idx]
+        
+        obj = self.from_data(data, gti=self.gti, trigger_time=self.trigtime,
+                             filename=self.filename, headers=self.headers,
+                             event_deadtime=self._event_deadtime,
+                             overflow_deadtime=self._event_deadtime)
+        if self._event_columns is not None:
+            obj._event_columns = self._event_columns[idx]
+        return obj
+
+    @staticmethod
+    def _unit_vectors(coord):
+        """Unit vectors in the ICRS frame for one or more SkyCoords"""
+        icrs = coord.icrs
+        vecs = hp.ang2vec(np.atleast_1d(icrs.ra.deg), 
+                          np.atleast_1d(icrs.dec.deg), lonlat=True)
+        return np.atleast_2d(vecs)
+
+    @classmethod
+    def _open_archive(cls, archive_path, pi_dtype=None, time_ref=None, 
+                      columns=None, time_range=None):
+        """Open an archive created by :meth:`build_archive`.  The TIME and PI
+        columns are memory-mapped, and are only copied if ``pi_dtype`` or 
+        ``time_ref`` require it.
+        """
+        archive_path = Path(archive_path)
+        manifest = cls._read_archive_manifest(archive_path)
+        hdrs = [fits.Header.fromstring(hdu['header']) \
+                for hdu in manifest['hdus']]
+        headers = EventsHeaders.from_headers(hdrs)
+        trigtime = cls._trigger_time(time_ref, headers)
+        
+        # copy-on-write, so that the events can be modified in memory
+        events = np.load(archive_path / 'events.npy', mmap_mode='c')
+        events = events.view(np.ndarray)
+        start, stop = 0, events.size
+        if time_range is not None:
+            tstart, tstop = float(time_range[0]), float(time_range[1])
+            if tstart > tstop:
+                raise ValueError('time_range must be (tstart, tstop)')
+            # the events are sorted, so the range is found without reading 
+            # the full TIME column
+            times = events['TIME']
+            start = bisect.bisect_left(times, tstart)
+            stop = bisect.bisect_right(times, tstop, lo=start)
+        events = events[start:stop]
+        
+        if (pi_dtype is None) and (trigtime is None):
+            data = EventList()
+            data._events = events
+        else:
+            data = cls._event_list(events['TIME'], events['PHA'], 
+                                   pi_dtype=pi_dtype, time_ref=trigtime)
+        
+        event_columns = None
+        if columns is not None and columns is not False:
+            arrays = {}
+            for name in manifest['hdus'][1]['columns']:
+                arr = np.load(cls._archive_column_path(archive_path, 1, name),
+                              mmap_mode='r')[start:stop]
+                arrays[name] = cls._scale_column(hdrs[1], name, arr)
+            event_columns = cls._compact_columns(arrays, columns)
+        
+        gti_start = cls._scale_column(hdrs[2], 'START', np.load(
+                        cls._archive_column_path(archive_path, 2, 'START')))
+        gti_stop = cls._scale_column(hdrs[2], 'STOP', np.load(
+                        cls._archive_column_path(archive_path, 2, 'STOP')))
+        gti_start = np.asarray(gti_start, dtype=float)
+        gti_stop = np.asarray(gti_stop, dtype=float)
+        
+        if time_range is not None:
+            return cls._from_time_range(data, event_columns, gti_start, 
+                                        gti_stop, (tstart, tstop), trigtime, 
+                                        manifest['filename'], headers)
+        if trigtime is not None:
+            gti_start -= trigtime
+            gti_stop -= trigtime
+        tte = cls.from_data(data, gti=Gti.from_bounds(gti_start, gti_stop), 
+                            trigger_time=trigtime, 
+                            filename=manifest['filename'], headers=headers, 
+                            event_deadtime=cls._event_deadtime,
+                            overflow_deadtime=cls._event_deadtime)
+        tte._event_columns = event_columns
+        return tte
+    
+    @classmethod
+    def _write_archive(cls, hdulist, archive_path):
+        """Write the HDUs of an events file to an archive directory, and 
+        return the manifest.
+        """
+        if (len(hdulist) < 3) or (hdulist[0].data is not None) or \
+           any([not isinstance(hdu, fits.BinTableHDU) for hdu in hdulist[1:]]):
+            raise ValueError('File must contain a primary header followed by '\
+                             'binary tables')
+        if any([hdu.header.get('PCOUNT', 0) != 0 for hdu in hdulist[1:]]):
+            raise ValueError('Tables with variable-length columns cannot be '\
+                             'archived')
+        
+        # TIME and PI are stored together, as the EventList array
+        events = hdulist[1].data
+        if events.size > 0 and np.any(np.diff(events['TIME']) < 0.0):
+            raise ValueError('Events must be sorted in time')
+        data = cls._event_list(events['TIME'], events['PI'])
+        np.save(archive_path / 'events.npy', data._events)
+        
+        manifest = {'format': 'gsc-events-archive', 'version': 1, 'hdus': []}
+        for i, hdu in enumerate(hdulist):
+            entry = {'header': hdu.header.tostring()}
+            manifest['hdus'].append(entry)
+            if i == 0:
+                continue
+            
+            # all other columns are stored as the raw values in the file, 
+            # which are scaled when read
+            raw = hdu.data.view(np.ndarray) if hdu.data is not None \
+                  else np.empty(0, dtype=hdu.columns.dtype)
+            entry['dtype'] = repr(np.lib.format.dtype_to_descr(
+                                            raw.dtype.newbyteorder('>')))
+            entry['columns'] = []
+            for j, col in enumerate(hdu.columns):
+                if (i == 1) and (col.name in cls._archive_events) and \
+                   (cls._column_scaling(hdu.header, col.name) == (1, 0)):
+                    continue
+                arr = raw[col.name]
+                np.save(cls._archive_column_path(archive_path, i, col.name),
+                        arr.astype(arr.dtype.newbyteorder('=')))
+                entry['columns'].append(col.name)
+        return manifest
+    
+    @classmethod
+    def _is_archive(cls, path):
+        """Check if a path is an archive written by :meth:`build_archive`"""
+        path = Path(path)
+        return path.is_dir() and (path / cls._archive_manifest).exists()
+    
+    @classmethod
+    def _read_archive_manifest(cls, archive_path):
+        """Read the manifest of an archive"""
+        if not cls._is_archive(archive_path):
+            raise ValueError('{} is not an archive'.format(archive_path))
+        with open(Path(archive_path) / cls._archive_manifest) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != 'gsc-events-archive':
+            raise ValueError('{} is not an archive'.format(archive_path))
+        return manifest
+    
+    @staticmethod
+    def _archive_column_path(archive_path, hdu_num, name):
+        """The path of a column file in an archive"""
+        return Path(archive_path) / 'hdu{}.{}.npy'.format(hdu_num, name)
+    
+    @staticmethod
+    def _column_scaling(header, name):
+        """The TSCAL and TZERO of a table column"""
+        names = [header.get('TTYPE{}'.format(j), '').strip() \
+                 for j in range(1, header['TFIELDS'] + 1)]
+        j = names.index(name) + 1
+        return (header.get('TSCAL{}'.format(j), 1), 
+                header.get('TZERO{}'.format(j), 0))
+    
+    @classmethod
+    def _scale_column(cls, header, name, arr):
+        """Apply the TSCAL and TZERO of a table column to its raw values"""
+        scale, zero = cls._column_scaling(header, name)
+        if (scale == 1) and (zero == 0):
+            return arr
+        if (arr.dtype.kind in 'iu') and (scale == 1) and \
+           (float(zero).is_integer()):
+            return arr.astype(np.int64) + int(zero)
+        return arr * scale + zero
+    
+    @staticmethod
+    def _trigger_time(time_ref, headers):
+        """The reference time of the events from the ``time_ref`` argument of
+        :meth:`open`, :meth:`iter_chunks` and :meth:`iter_merged`.
+        
+        Args:
+            time_ref (float, str, or None): The reference time, or 'TSTART'
+            headers (:class:`~gdt.missions.maxi.gsc.headers.EventsHeaders` or
+                     list): The headers of the file, or of each file.  For
+                            several files, 'TSTART' is the earliest TSTART.
+        
+        Returns:
+            (float or None)
+        """
+        if isinstance(time_ref, str):
+            if time_ref.upper() != 'TSTART':
+                raise ValueError("time_ref must be a float or 'TSTART'")
+            if not isinstance(headers, (list, tuple)):
+                headers = [headers]
+            return min([float(hdrs['EVENTS']['TSTART']) for hdrs in headers])
+        elif time_ref is not None:
+            return float(time_ref)
+        return None
+    
+    @classmethod
+    def _open_time_range(cls, file_path, time_range, pi_dtype=None, 
+                         time_ref=None, columns=None):
+        """Open the events and GTIs within a time range, reading only the rows
+        in the time range if the file has a time index.
+        """
+        tstart, tstop = float(time_range[0]), float(time_range[1])
+        if tstart > tstop:
+            raise ValueError('time_range must be (tstart, tstop)')
+        file_path = Path(file_path)
+        index = cls._read_time_index(file_path)
+        if index is not None:
+            reader = _EventsReader(file_path, layout=index[3])
+        else:
+            reader = _EventsReader(file_path)
+        headers = reader.headers
+        trigtime = cls._trigger_time(time_ref, headers)
+        
+        # the rows to read, or all rows if there is no valid index
+        start, stop = 0, reader.num_rows
+        if index is not None:
+            grid_start, cadence, rows, _ = index
+            num = rows.size
+            k0 = int(np.floor((tstart - grid_start) / cadence))
+            k1 = int(np.floor((tstop - grid_start) / cadence)) + 1
+            start = rows[min(max(k0, 0), num - 1)]
+            stop = rows[k1] if k1 < num else reader.num_rows
+            stop = max(stop, start)
+        
+        events = reader.read_rows(start, stop)
+        mask = (events['TIME'] >= tstart) & (events['TIME'] <= tstop)
+        events = events[mask]
+        data = cls._event_list(events['TIME'], events['PI'], pi_dtype=pi_dtype,
+                               time_ref=trigtime)
+        event_columns = None
+        if columns is not None and columns is not False:
+            event_columns = cls._compact_columns(events, columns)
+        
+        return cls._from_time_range(data, event_columns, reader.gti_start, 
+                                    reader.gti_stop, (tstart, tstop), 
+                                    trigtime, file_path.name, headers)
+    
+    @classmethod
+    def _from_time_range(cls, data, event_columns, gti_start, gti_stop, 
+                         time_range, trigtime, filename, headers):
+        """Create a GscTte from the events in a time range, with the absolute
+        GTIs clipped to the time range.
+        """
+        gti_start = np.maximum(gti_start, time_range[0])
+        gti_stop = np.minimum(gti_stop, time_range[1])
+        gti_mask = (gti_stop > gti_start)
+        gti = None
+        if gti_mask.any():
+            ref = 0.0 if trigtime is None else trigtime
+            gti = Gti.from_bounds(gti_start[gti_mask] - ref, 
+                                  gti_stop[gti_mask] - ref)
+        elif data.size == 0:
+            raise ValueError('No data in the time range')
+        
+        tte = cls.from_data(data, gti=gti, trigger_time=trigtime, 
+                            filename=filename, headers=headers, 
+                            event_deadtime=cls._event_deadtime,
+                            overflow_deadtime=cls._event_deadtime)
+        tte._event_columns = event_columns
+        return tte
+
+    @classmethod
+    def _read_time_index(cls, file_path):
+        """Read the time index of an events file.  Returns None if there is 
+        no index or it does not match the file.
+        
+        Returns:
+            (float, float, np.array, dict): The start time, cadence, row 
+                                            offsets, and file layout
+        """
+        index_path = cls._time_index_path(file_path)
+        if not index_path.exists():
+            return None
+        try:
+            with np.load(index_path) as index:
+                stat = Path(file_path).stat()
+                if (int(index['size']) != stat.st_size) or \
+                   (int(index['mtime_ns']) != stat.st_mtime_ns):
+                    return None
+                index = dict(index)
+        except (OSError, KeyError, ValueError):
+            return None
+        return (float(index.pop('tstart')), float(index.pop('cadence')), 
+                index.pop('rows'), index)
+
+    @staticmethod
+    def _time_index_path(file_path):
+        """The path of the time index of an events file"""
+        file_path = Path(file_path)
+        return file_path.with_name(file_path.name + '.tidx.npz')
 
+    @staticmethod
+    def _compact_columns(events, columns, narrow=True):
+        """Copy event columns into a single structured array.  Integer columns
+        are narrowed to the smallest dtype that holds their values, and all 
+        columns are stored in native byte order.
+        
+        Args:
+            events (astropy.io.fits.FITS_rec, np.array, or dict): 
+                The events table
+            columns (bool or list of str): The columns to copy, or True for 
+                                           all columns except TIME and PI
+            narrow (bool, optional): If False, integer columns keep their 
+                                     dtype. Default is True.
+        
+        Returns:
+            (np.recarray)
+        """
+        if isinstance(events, dict):
+            all_names = list(events.keys())
+        else:
+            all_names = list(events.dtype.names)
+        if columns is True:
+            columns = [name for name in all_names \
+                       if name.upper() not in ('TIME', 'PI')]
+        elif isinstance(columns, str):
+            columns = [columns]
+        names = [name.upper() for name in all_names]
+        for name in columns:
+            if name.upper() not in names:
+                raise ValueError('{} is not an events column'.format(name))
+        
+        lookup = {name.upper(): name for name in all_names}
+        arrays = [events[lookup[name.upper()]] for name in columns]
+        dtypes = []
+        for name, arr in zip(columns, arrays):
+            dtype = arr.dtype.newbyteorder('=')
+            if narrow and (dtype.kind in 'iu') and (arr.size > 0):
+                dtype = np.result_type(np.min_scalar_type(arr.min()), 
+                                       np.min_scalar_type(arr.max()))
+            dtypes.append((name.upper(), dtype, arr.shape[1:]))
+        
+        num = len(events[all_names[0]]) if isinstance(events, dict) \
+              else len(events)
+        compact = np.empty(num, dtype=dtypes)
+        for (name, _, _), arr in zip(dtypes, arrays):
+            compact[name] = arr
+        return compact.view(np.recarray)
+    
+    @staticmethod
+    def _event_list(times, pis, pi_dtype=None, time_ref=None):
+        """Create the EventList by copying the TIME and PI columns directly 
+        into the event array, without intermediate copies.
+        
+        Args:
+            times (np.array): The TIME column
+            pis (np.array): The PI column
+            pi_dtype (np.dtype, optional): The dtype of the PI channels
+            time_ref (float, optional): Times are stored relative to this time
+        
+        Returns:
+            (:class:`~gdt.core.data_primitives.EventList`)
+        """
+        if pi_dtype is None:
+            pi_dtype = pis.dtype.newbyteorder('=')
+        pi_dtype = np.dtype(pi_dtype)
+        if pi_dtype.kind not in 'iu':
+            raise TypeError('pi_dtype must be an integer dtype')
+        if (pis.size > 0) and (not np.can_cast(pis.dtype, pi_dtype)):
+            info = np.iinfo(pi_dtype)
+            if (pis.min() < info.min) or (pis.max() > info.max):
+                raise ValueError('PI values do not fit in {}'.format(pi_dtype))
+        
+        events = np.empty(times.size, dtype=[('TIME', np.float64), 
+                                             ('PHA', pi_dtype)])
+        events['TIME'] = times
+        if time_ref is not None:
+            events['TIME'] -= time_ref
+        events['PHA'] = pis
+        
+        data = EventList()
+        data._events = events
+        return data
+    
     def _build_headers(self, trigtime, tstart, tstop, num_chans):
         
         headers = self.headers.copy()
@@ -131,3 +1556,265 @@ class GscTte(PhotonList):
                 pass
         
         return headers
+
+
+class _EventsReader():
+    """Reads the TIME and PI columns of an events FITS file in blocks of rows,
+    decompressing gzipped files as a stream.
+    
+    Parameters:
+        file_path (str): The file path of the FITS file
+        layout (dict, optional): The layout of the file, as returned by 
+                                 :attr:`layout`.  If set, the FITS headers 
+                                 are not read from the file.
+    """
+    def __init__(self, file_path, layout=None):
+        self._file_path = Path(file_path)
+        if layout is not None:
+            self._set_layout(layout)
+        else:
+            self._read_layout()
+        self._first_time = None
+        self._last_time = None
+    
+    @property
+    def layout(self):
+        """(dict): The layout of the events table, headers, and GTIs, as 
+        arrays that can be stored in an npz file"""
+        return {'headers': np.array([hdr.tostring() for hdr in self._hdrs]),
+                'data_offset': self._data_offset, 
+                'num_rows': self._num_rows, 'row_size': self._row_size,
+                'dtype': repr(np.lib.format.dtype_to_descr(self._dtype)),
+                'scaling': json.dumps(self._scaling),
+                'gti_start': self.gti_start, 'gti_stop': self.gti_stop}
+    
+    @property
+    def first_time(self):
+        """(float): The time of the first event, or None if there are no 
+        events"""
+        if (self._first_time is None) and (self._num_rows > 0):
+            self._first_time = self._read_time(0)
+        return self._first_time
+
+    @property
+    def headers(self):
+        """(:class:`~gdt.missions.maxi.gsc.headers.EventsHeaders`): 
+        The headers"""
+        return self._headers
+    
+    @property
+    def last_time(self):
+        """(float): The time of the last event, or None if there are no 
+        events.  For a gzipped file, this requires decompressing the file."""
+        if (self._last_time is None) and (self._num_rows > 0):
+            self._last_time = self._read_time(self._num_rows - 1)
+        return self._last_time
+
+    @property
+    def num_rows(self):
+        """(int): The number of events"""
+        return self._num_rows
+
+    @property
+    def column_names(self):
+        """(list of str): The names of the columns of the events table"""
+        return list(self._dtype.names)
+
+    @property
+    def pi_dtype(self):
+        """(np.dtype): The dtype of the PI channels returned by 
+        :meth:`iter_rows`"""
+        return self.column_dtype('PI')
+    
+    def column_dtype(self, name):
+        """The dtype of a column returned by :meth:`iter_rows`.
+        
+        Args:
+            name (str): The column name (case insensitive)
+        
+        Returns:
+            (np.dtype)
+        """
+        return self._column(np.empty(0, dtype=self._dtype), name).dtype
+
+    def iter_rows(self, num_rows, columns=None):
+        """Iterate over the TIME and PI columns in blocks of rows.
+        
+        Args:
+            num_rows (int): The number of rows in each block
+            columns (list of str, optional): Other columns to read
+        
+        Yields:
+            (np.array, np.array): The times and PI channels.  If ``columns`` 
+            is set, also a dict of the other columns.
+        """
+        with self._open() as f:
+            f.seek(self._data_offset)
+            remaining = self._num_rows
+            while remaining > 0:
+                count = min(num_rows, remaining)
+                buf = f.read(count * self._row_size)
+                if len(buf) < count * self._row_size:
+                    raise IOError('Unexpected end of file')
+                rows = np.frombuffer(buf, dtype=self._dtype)
+                if columns is None:
+                    yield (self._column(rows, 'TIME', float), 
+                           self._column(rows, 'PI'))
+                else:
+                    yield (self._column(rows, 'TIME', float), 
+                           self._column(rows, 'PI'),
+                           {name: self._column(rows, name) \
+                            for name in columns})
+                remaining -= count
+    
+    def read_rows(self, start, stop):
+        """Read a range of rows, with all columns scaled and in native byte 
+        order.
+        
+        Args:
+            start (int): The first row
+            stop (int): The row after the last row
+        
+        Returns:
+            (np.array)
+        """
+        start = min(max(int(start), 0), self._num_rows)
+        stop = min(max(int(stop), start), self._num_rows)
+        with self._open() as f:
+            f.seek(self._data_offset + start * self._row_size)
+            buf = f.read((stop - start) * self._row_size)
+        if len(buf) < (stop - start) * self._row_size:
+            raise IOError('Unexpected end of file')
+        rows = np.frombuffer(buf, dtype=self._dtype)
+        
+        columns = [self._column(rows, name) for name in self._dtype.names]
+        dtype = [(name, col.dtype, col.shape[1:]) \
+                 for name, col in zip(self._dtype.names, columns)]
+        table = np.empty(stop - start, dtype=dtype)
+        for name, col in zip(self._dtype.names, columns):
+            table[name] = col
+        return table
+
+    def _column(self, rows, name, dtype=None):
+        if name not in self._scaling:
+            # column names are case insensitive
+            lookup = {key.upper(): key for key in self._scaling}
+            name = lookup[name.upper()]
+        bscale, bzero = self._scaling[name]
+        col = rows[name]
+        if bscale not in (None, 1) or bzero not in (None, 0):
+            col = col * (1 if bscale is None else bscale) + \
+                  (0 if bzero is None else bzero)
+        if dtype is None:
+            dtype = col.dtype.newbyteorder('=')
+        return col.astype(dtype)
+    
+    def _read_layout(self):
+        with fits.open(self._file_path, memmap=False, 
+                       lazy_load_hdus=True) as hdulist:
+            self._hdrs = [hdu.header for hdu in hdulist]
+            self._headers = EventsHeaders.from_headers(self._hdrs)
+            
+            events_hdu = hdulist[1]
+            self._data_offset = hdulist.fileinfo(1)['datLoc']
+            self._num_rows = events_hdu.header['NAXIS2']
+            self._row_size = events_hdu.header['NAXIS1']
+            
+            # FITS binary tables are big-endian
+            self._dtype = events_hdu.columns.dtype.newbyteorder('>')
+            if self._dtype.itemsize != self._row_size:
+                raise ValueError('Events table has variable-length columns')
+            self._scaling = {}
+            for col in events_hdu.columns:
+                self._scaling[col.name] = (col.bscale, col.bzero)
+                
+            self.gti_start = np.array(hdulist[2].data['START'], dtype=float)
+            self.gti_stop = np.array(hdulist[2].data['STOP'], dtype=float)
+    
+    def _set_layout(self, layout):
+        self._hdrs = [fits.Header.fromstring(str(hdr)) \
+                      for hdr in layout['headers']]
+        self._headers = EventsHeaders.from_headers(self._hdrs)
+        self._data_offset = int(layout['data_offset'])
+        self._num_rows = int(layout['num_rows'])
+        self._row_size = int(layout['row_size'])
+        self._dtype = np.lib.format.descr_to_dtype(
+                                       ast.literal_eval(str(layout['dtype'])))
+        self._scaling = {name: tuple(value) for name, value in \
+                         json.loads(str(layout['scaling'])).items()}
+        self.gti_start = np.asarray(layout['gti_start'], dtype=float)
+        self.gti_stop = np.asarray(layout['gti_stop'], dtype=float)
+    
+    def _open(self):
+        if self._file_path.suffix.lower() == '.gz':
+            return gzip.open(self._file_path, 'rb')
+        return open(self._file_path, 'rb')
+    
+    def _read_time(self, row):
+        with self._open() as f:
+            f.seek(self._data_offset + row * self._row_size)
+            rows = np.frombuffer(f.read(self._row_size), dtype=self._dtype)
+        return float(self._column(rows, 'TIME', float)[0])
+
+
+def _pixel_candidates(pixels, sorted_pix, order):
+    """The indices of the events in a set of NESTED pixels.
+    
+    Args:
+        pixels (np.array): The pixels
+        sorted_pix (np.array): The pixel of each event, sorted
+        order (np.array): The event indices in the order of ``sorted_pix``
+    
+    Returns:
+        (np.array)
+    """
+    pixels = np.sort(pixels)
+    if pixels.size == 0:
+        return np.array([], dtype=order.dtype)
+    
+    # group the pixels into runs of consecutive pixels, each of which is 
+    # a contiguous slice of the sorted events
+    breaks = np.flatnonzero(np.diff(pixels) != 1) + 1
+    run_starts = pixels[np.append(0, breaks)]
+    run_stops = pixels[np.append(breaks - 1, pixels.size - 1)] + 1
+    lo = np.searchsorted(sorted_pix, run_starts, side='left')
+    hi = np.searchsorted(sorted_pix, run_stops, side='left')
+    return np.concatenate([order[i:j] for i, j in zip(lo, hi)])
+
+
+def _unique_across_sources(keys, sources):
+    """Mark the events to keep when removing the events that are repeated in
+    more than one source (file).  Events from the same source are never 
+    removed, so for a set of identical events, the most that are in any one 
+    source are kept.
+    
+    Args:
+        keys (list of np.array): The columns that identify an event, sorted
+        sources (np.array): The source of each event.  Identical events must 
+                            be sorted by source.
+    
+    Returns:
+        (np.array): Boolean mask of the events to keep
+    """
+    num = sources.size
+    keep = np.ones(num, dtype=bool)
+    if num < 2:
+        return keep
+    same = np.ones(num - 1, dtype=bool)
+    for key in keys:
+        same &= (key[1:] == key[:-1])
+    if not same.any():
+        return keep
+    
+    # the k-th copy of an event in a source is the same event as the k-th 
+    # copy in every other source, so keep the first of each (event, copy)
+    run_start = np.append(True, ~same)
+    group_start = run_start.copy()
+    group_start[1:] |= (sources[1:] != sources[:-1])
+    idx = np.arange(num)
+    copy = idx - np.maximum.accumulate(np.where(group_start, idx, 0))
+    run = np.cumsum(run_start) - 1
+    _, first = np.unique(run * num + copy, return_index=True)
+    keep[:] = False
+    keep[first] = True
+    return keep
@@ -0,0 +1,314 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+import unittest
+import numpy as np
+from gdt.core import data_path
+from gdt.core.binning.unbinned import bin_by_time
+from gdt.core.data_primitives import Ebounds, EventList
+from gdt.missions.maxi.gsc.binning import *
+from gdt.missions.maxi.gsc.detectors import GscDetectors
+from gdt.missions.maxi.gsc.tte import GscTte
+
+tte_file = data_path / 'maxi-gsc/mx_mjd55616_gsc_med_000.evt.gz'
+
+
+@unittest.skipIf(not tte_file.exists(), "test files aren't downloaded. run gdt-data download.")
+class TestBinEvents(unittest.TestCase):
+    
+    def setUp(self):
+        self.tte = GscTte.open(tte_file)
+    
+    def test_bin_events(self):
+        bins = bin_events(self.tte, bin_by_time, 64.0, channel_range=(10, 500))
+        assert bins.num_chans == 491
+        chans = self.tte.data.channels
+        assert bins.counts.sum() == ((chans >= 10) & (chans <= 500)).sum()
+        self.assertAlmostEqual(bins.tstart[0], self.tte.data.time_range[0])
+        
+        # the deadtime includes the events outside of the channel range
+        bins_all = bin_events(self.tte, bin_by_time, 64.0, gti_exposure=False)
+        bins = bin_events(self.tte, bin_by_time, 64.0, channel_range=(10, 500),
+                          gti_exposure=False)
+        assert np.allclose(bins.exposure, bins_all.exposure)
+    
+    def test_gti_exposure(self):
+        tstart = self.tte.gti.as_list()[0][0]
+        bins = bin_events(self.tte, bin_by_time, 100.0, 
+                          time_range=(tstart - 50.0, tstart + 150.0))
+        # the first bin is half outside of the first GTI
+        assert bins.exposure[0] < 50.0
+        assert bins.exposure[0] > 49.0
+        assert bins.exposure[1] > 99.0
+    
+    def test_time_range(self):
+        tstart, tstop = self.tte.gti.as_list()[1]
+        bins = bin_events(self.tte, bin_by_time, 10.0, 
+                          time_range=(tstart, tstop))
+        times = self.tte.data.times
+        mask = (times >= tstart) & (times <= tstop)
+        assert bins.counts.sum() == mask.sum()
+    
+    def test_unsorted(self):
+        bins = bin_events(self.tte, bin_by_time, 64.0)
+        
+        order = np.random.default_rng(0).permutation(self.tte.data.size)
+        data = EventList()
+        data._events = self.tte.data._events[order]
+        tte = GscTte.from_data(data, gti=self.tte.gti, 
+                               event_deadtime=self.tte.event_deadtime,
+                               overflow_deadtime=self.tte.overflow_deadtime)
+        assert not np.all(np.diff(tte.data.times) >= 0.0)
+        bins_unsorted = bin_events(tte, bin_by_time, 64.0)
+        assert np.array_equal(bins.counts, bins_unsorted.counts)
+        assert np.allclose(bins.exposure, bins_unsorted.exposure)
+    
+    def test_overflow_deadtime(self):
+        num_chans = int(self.tte.data.channels.max()) + 1
+        ebounds = Ebounds.from_bounds(np.arange(num_chans, dtype=float), 
+                                      np.arange(1, num_chans + 1, dtype=float))
+        
+        def make_tte(order):
+            data = EventList(times=self.tte.data.times[order], 
+                             channels=self.tte.data.channels[order], 
+                             ebounds=ebounds)
+            return GscTte.from_data(data, gti=self.tte.gti, 
+                                    event_deadtime=3e-5, 
+                                    overflow_deadtime=1e-2)
+        
+        tte = make_tte(np.arange(self.tte.data.size))
+        bins = bin_events(tte, bin_by_time, 64.0, gti_exposure=False)
+        overflow, _ = np.histogram(tte.data.times[tte.data.channels == \
+                                                  num_chans - 1], 
+                                   np.append(bins.tstart, bins.tstop[-1]))
+        deadtime = bins.counts.sum(axis=1) * 3e-5 + overflow * (1e-2 - 3e-5)
+        assert np.allclose(bins.exposure, bins.time_widths - deadtime)
+        
+        order = np.random.default_rng(0).permutation(self.tte.data.size)
+        bins_unsorted = bin_events(make_tte(order), bin_by_time, 64.0, 
+                                   gti_exposure=False)
+        assert np.allclose(bins.exposure, bins_unsorted.exposure)
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            bin_events(self.tte, bin_by_time, 64.0, channel_range=(10, 5))
+
+
+@unittest.skipIf(not tte_file.exists(), "test files aren't downloaded. run gdt-data download.")
+class TestBinProducts(unittest.TestCase):
+    
+    def setUp(self):
+        self.tte = GscTte.open(tte_file, columns=['GSCID'])
+        self.binnings = {'64s': (bin_by_time, 64.0), 
+                         '256s': (bin_by_time, 256.0, 
+                                   {'time_ref': 351830000.0})}
+        self.chan_ranges = {'soft': (0, 200), 'hard': (201, 1000)}
+        self.detectors = {'H': GscDetectors.h_detectors(), 
+                          'Z': GscDetectors.z_detectors(),
+                          'HA0': ['HA0']}
+    
+    def test_products(self):
+        products = bin_products(self.tte, self.binnings, self.chan_ranges, 
+                                self.detectors)
+        assert len(products) == 12
+        
+        dets = self.tte.event_columns.GSCID
+        chans = self.tte.data.channels
+        for (bin_key, chan_key, det_key), phaii in products.items():
+            chan_range = self.chan_ranges[chan_key]
+            det_nums = [GscDetectors.from_str(det).number \
+                        if isinstance(det, str) else det.number \
+                        for det in self.detectors[det_key]]
+            mask = np.isin(dets, det_nums) & (chans >= chan_range[0]) & \
+                   (chans <= chan_range[1])
+            assert phaii.data.counts.sum() == mask.sum()
+            assert phaii.data.num_chans == chan_range[1] - chan_range[0] + 1
+            assert phaii.gti.num_intervals == self.tte.gti.num_intervals
+        
+        # products with the same binning share the time bins
+        assert np.array_equal(products[('64s', 'soft', 'H')].data.tstart,
+                              products[('64s', 'hard', 'Z')].data.tstart)
+        self.assertAlmostEqual(products[('64s', 'soft', 'H')].data.tstart[0],
+                               self.tte.data.time_range[0])
+        
+    def test_to_phaii(self):
+        products = bin_products(self.tte, {'64s': (bin_by_time, 64.0)})
+        phaii = self.tte.to_phaii_fast(bin_by_time, 64.0)
+        counts = products[('64s', None, None)].data.counts
+        assert np.array_equal(counts, phaii.data.counts)
+        assert np.allclose(products[('64s', None, None)].data.exposure, 
+                           phaii.data.exposure)
+        
+        products = bin_products(self.tte, {'64s': (bin_by_time, 64.0)}, 
+                                gti_exposure=False)
+        phaii = self.tte.to_phaii(bin_by_time, 64.0)
+        counts = products[('64s', None, None)].data.counts
+        assert np.array_equal(counts, phaii.data.counts[:, :counts.shape[1]])
+        assert np.allclose(products[('64s', None, None)].data.exposure, 
+                           phaii.data.exposure)
+    
+    def test_exposure(self):
+        products = bin_products(self.tte, {'64s': (bin_by_time, 64.0)}, 
+                                self.chan_ranges, self.detectors)
+        bins = bin_events(self.tte, bin_by_time, 64.0)
+        # the deadtime of every product includes all of the events
+        for phaii in products.values():
+            assert np.allclose(phaii.data.exposure, bins.exposure)
+        
+        livetime = self.tte.livetime
+        products = bin_products(self.tte, {'64s': (bin_by_time, 64.0)}, 
+                                self.chan_ranges, self.detectors, 
+                                livetime=livetime)
+        tstart, tstop = bins.tstart, bins.tstop
+        for (_, chan_key, det_key), phaii in products.items():
+            exposure = livetime.exposure(tstart, tstop, 
+                                    detectors=self.detectors[det_key],
+                                    channel_range=self.chan_ranges[chan_key])
+            assert np.allclose(phaii.data.exposure, exposure)
+    
+    def test_processes(self):
+        products = bin_products(self.tte, self.binnings, self.chan_ranges, 
+                                self.detectors)
+        products2 = bin_products(self.tte, self.binnings, self.chan_ranges, 
+                                 self.detectors, num_processes=3)
+        for key in products.keys():
+            assert np.array_equal(products[key].data.counts, 
+                                  products2[key].data.counts)
+    
+    def test_unsorted(self):
+        order = np.random.default_rng(0).permutation(self.tte.data.size)
+        data = EventList()
+        data._events = self.tte.data._events[order]
+        tte = GscTte.from_data(data, gti=self.tte.gti, 
+                               event_deadtime=self.tte.event_deadtime,
+                               overflow_deadtime=self.tte.overflow_deadtime)
+        tte._event_columns = self.tte.event_columns[order]
+        assert not np.all(np.diff(tte.data.times) >= 0.0)
+        
+        products = bin_products(self.tte, self.binnings, self.chan_ranges, 
+                                self.detectors)
+        products2 = bin_products(tte, self.binnings, self.chan_ranges, 
+                                 self.detectors, num_processes=3)
+        for key in products.keys():
+            assert np.array_equal(products[key].data.counts, 
+                                  products2[key].data.counts)
+            assert np.allclose(products[key].data.exposure, 
+                               products2[key].data.exposure)
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            bin_products(self.tte, {})
+        with self.assertRaises(ValueError):
+            bin_products(self.tte, self.binnings, {'bad': (100, 10)})
+        with self.assertRaises(ValueError):
+            bin_products(self.tte, self.binnings, num_processes=0)
+        with self.assertRaises(RuntimeError):
+            bin_products(GscTte.open(tte_file), self.binnings, 
+                         detectors=self.detectors)
+
+
+class TestIncrementalBinner(unittest.TestCase):
+    
+    def setUp(self):
+        self.binner = IncrementalBinner(1.0, 10.0, 4, deadtime=0.01)
+        self.binner.add_gti([(10.0, 14.5)])
+    
+    def test_add_events(self):
+        bins = self.binner.add_events(EventList([10.1, 10.2, 11.5], [0, 3, 1]))
+        # the data is complete up to the last event
+        assert bins.num_times == 1
+        assert bins.counts.tolist() == [[1, 0, 0, 1]]
+        self.assertAlmostEqual(bins.exposure[0], 0.98)
+        assert self.binner.horizon == 11.5
+        
+        bins = self.binner.add_events(EventList([11.7, 14.2], [2, 2]), 
+                                      tstop=15.0)
+        assert bins.tstart.tolist() == [11.0, 12.0, 13.0, 14.0]
+        assert bins.counts.sum(axis=1).tolist() == [2, 0, 0, 1]
+        assert np.allclose(bins.exposure, [0.98, 1.0, 1.0, 0.49])
+        assert self.binner.num_bins == 5
+        
+        bins = self.binner.add_events(EventList([15.1], [0]))
+        assert bins.num_times == 0
+    
+    def test_to_phaii(self):
+        self.binner.add_events(EventList([10.1, 12.5], [0, 1]))
+        phaii = self.binner.to_phaii()
+        assert phaii.data.num_times == 2
+        self.binner.add_events(EventList([13.5], [1]))
+        phaii2 = self.binner.to_phaii()
+        assert phaii2.data.num_times == 3
+        assert phaii2.data.counts.sum() == 2
+        # the completed bins are shared, and cannot be modified
+        assert np.shares_memory(phaii.data.counts, phaii2.data.counts)
+        with self.assertRaises(ValueError):
+            phaii2.data.counts[0, 0] = 10
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            IncrementalBinner(0.0, 10.0, 4)
+        self.binner.add_events(EventList([12.5], [0]))
+        with self.assertRaises(ValueError):
+            self.binner.add_events(EventList([12.0], [0]))
+        with self.assertRaises(ValueError):
+            self.binner.add_events(EventList([13.0], [4]))
+        with self.assertRaises(ValueError):
+            self.binner.add_events(EventList([13.0], [0]), tstop=12.8)
+        with self.assertRaises(TypeError):
+            self.binner.add_events([13.0])
+
+    @unittest.skipIf(not tte_file.exists(), "test files aren't downloaded. run gdt-data download.")
+    def test_same_as_bin_events(self):
+        tte = GscTte.open(tte_file)
+        tstart = np.floor(tte.data.time_range[0])
+        # the default deadtime is that of GscTte
+        binner = IncrementalBinner(8.0, tstart, 1187)
+        binner.add_gti(tte.gti)
+        times, chans = tte.data.times, tte.data.channels
+        splits = np.linspace(0, times.size, 7).astype(int)
+        for i0, i1 in zip(splits[:-1], splits[1:]):
+            binner.add_events(EventList(times[i0:i1], chans[i0:i1]))
+        phaii = binner.to_phaii()
+        
+        tstop = tstart + binner.num_bins * 8.0
+        bins = bin_events(tte, bin_by_time, 8.0, time_range=(tstart, tstop))
+        assert np.array_equal(phaii.data.counts, 
+                              bins.counts[:binner.num_bins])
+        assert np.allclose(phaii.data.exposure, 
+                           bins.exposure[:binner.num_bins])
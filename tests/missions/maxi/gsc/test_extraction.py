@@ -0,0 +1,130 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+import unittest
+import numpy as np
+from astropy.coordinates import SkyCoord
+from gdt.core import data_path
+from gdt.missions.maxi.gsc.extraction import *
+from gdt.missions.maxi.gsc.response import GscRmf
+from gdt.missions.maxi.gsc.tte import GscTte
+
+tte_file = data_path / 'maxi-gsc/mx_mjd55616_gsc_med_000.evt.gz'
+rmf803_file = data_path / 'maxi-gsc/mx_gsc0_hv803_detx0000_0000.rmf'
+
+
+@unittest.skipIf(not tte_file.exists() or not rmf803_file.exists(), "test files aren't downloaded. run gdt-data download.")
+class TestExtractSpectra(unittest.TestCase):
+    
+    def setUp(self):
+        self.tte = GscTte.open(tte_file, columns=['RA', 'DEC'])
+        self.tte.set_ebounds(GscRmf.open(rmf803_file).ebounds)
+        self.coord = SkyCoord(90.0, 0.0, unit='deg')
+        self.polygon = SkyCoord([85.0, 89.0, 89.0, 85.0], 
+                                [-2.0, -2.0, 2.0, 2.0], unit='deg')
+        self.regions = {'src': (self.coord, 1.5), 
+                        'bkg': (self.coord, 1.5, 3.0),
+                        'poly': self.polygon}
+    
+    def test_extract_spectra(self):
+        phas = extract_spectra(self.tte, self.regions)
+        assert list(phas.keys()) == ['src', 'bkg', 'poly']
+        
+        pha = self.tte.query_cone(self.coord, 1.5).to_pha()
+        assert np.array_equal(phas['src'].data.counts, pha.data.counts)
+        pha = self.tte.query_polygon(self.polygon).to_pha()
+        assert np.array_equal(phas['poly'].data.counts, pha.data.counts)
+        
+        # the annulus is the outer cone without the inner cone
+        outer = self.tte.query_cone(self.coord, 3.0).to_pha()
+        inner = self.tte.query_cone(self.coord, 1.5).to_pha()
+        assert np.array_equal(phas['bkg'].data.counts, 
+                              outer.data.counts - inner.data.counts)
+        
+        self.assertAlmostEqual(phas['src'].exposure, 
+                               self.tte.livetime.range_exposure(
+                                                   [self.tte.time_range]))
+    
+    def test_backscal(self):
+        octant = SkyCoord([0.0, 90.0, 0.0], [0.0, 0.0, 90.0], unit='deg')
+        regions = dict(self.regions, octant=octant)
+        phas = extract_spectra(self.tte, regions)
+        # the BACKSCAL is the solid angle of the region, in steradians
+        cos_inner, cos_outer = np.cos(np.deg2rad([1.5, 3.0]))
+        backscal = {key: pha.headers['SPECTRUM']['BACKSCAL'] \
+                    for key, pha in phas.items()}
+        self.assertAlmostEqual(backscal['src'], 2.0 * np.pi * (1.0 - cos_inner))
+        self.assertAlmostEqual(backscal['bkg'], 
+                               2.0 * np.pi * (cos_inner - cos_outer))
+        self.assertAlmostEqual(backscal['octant'], np.pi / 2.0)
+        # a 4 x 4 degree box at the equator
+        self.assertAlmostEqual(backscal['poly'], np.deg2rad(4.0)**2, 
+                               places=5)
+    
+    def test_time_ranges(self):
+        tmin = self.tte.time_range[0]
+        time_ranges = [(tmin + 1000.0, tmin + 5000.0), 
+                       (tmin + 20000.0, tmin + 30000.0)]
+        phas = extract_spectra(self.tte, self.regions, 
+                               time_ranges={'src': time_ranges})
+        pha = self.tte.query_cone(self.coord, 1.5).to_pha(
+                                                      time_ranges=time_ranges)
+        assert np.array_equal(phas['src'].data.counts, pha.data.counts)
+        assert phas['src'].gti.as_list() == time_ranges
+        assert phas['poly'].gti.as_list() == [self.tte.time_range]
+    
+    def test_processes(self):
+        phas = extract_spectra(self.tte, self.regions)
+        phas2 = extract_spectra(self.tte, self.regions, num_processes=2)
+        for key in self.regions:
+            assert np.array_equal(phas[key].data.counts, 
+                                  phas2[key].data.counts)
+    
+    def test_errors(self):
+        with self.assertRaises(TypeError):
+            extract_spectra(self.tte, {'bad': (90.0, 0.0, 1.0)})
+        with self.assertRaises(ValueError):
+            extract_spectra(self.tte, {'bad': (self.coord, 3.0, 1.0)})
+        with self.assertRaises(ValueError):
+            extract_spectra(self.tte, {'bad': self.polygon[:2]})
+        with self.assertRaises(ValueError):
+            extract_spectra(self.tte, self.regions, num_processes=0)
+        with self.assertRaises(RuntimeError):
+            extract_spectra(GscTte.open(tte_file, columns=['RA', 'DEC']), 
+                            self.regions)
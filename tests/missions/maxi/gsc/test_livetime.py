@@ -0,0 +1,212 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+import unittest
+import numpy as np
+from gdt.core import data_path
+from gdt.core.binning.unbinned import bin_by_time
+from gdt.missions.maxi.gsc.detectors import GscDetectors
+from gdt.missions.maxi.gsc.livetime import *
+from gdt.missions.maxi.gsc.response import GscRmf
+from gdt.missions.maxi.gsc.tte import GscTte
+
+tte_file = data_path / 'maxi-gsc/mx_mjd55616_gsc_med_000.evt.gz'
+rmf803_file = data_path / 'maxi-gsc/mx_gsc0_hv803_detx0000_0000.rmf'
+
+
+class TestGscLivetime(unittest.TestCase):
+    
+    def setUp(self):
+        # detector 0 has 100 events/s, detector 3 has 1000 events/s
+        times = np.concatenate((np.linspace(0.0, 10.0, 1000, endpoint=False),
+                                np.linspace(0.0, 10.0, 10000, 
+                                            endpoint=False)))
+        dets = np.concatenate((np.zeros(1000, dtype=int), 
+                               np.full(10000, 3)))
+        self.livetime = GscLivetime(times, detectors=dets, 
+                                    gti=[(0.0, 5.0), (6.0, 10.0)], 
+                                    deadtime=1e-4)
+    
+    def test_attributes(self):
+        assert self.livetime.deadtime == 1e-4
+        assert self.livetime.detectors.tolist() == [0, 3]
+        assert self.livetime.num_detectors == 2
+        assert GscLivetime([1.0]).deadtime == GscTte._event_deadtime
+    
+    def test_counts(self):
+        counts = self.livetime.counts([0.0, 5.0], [5.0, 10.0])
+        assert counts.tolist() == [[500, 5000], [500, 5000]]
+        # the last bin includes its high edge
+        counts = self.livetime.counts([0.0], [5.0])
+        assert counts.tolist() == [[501, 5001]]
+        
+        livetime = GscLivetime([0.0, 1.0, 2.0, 2.0])
+        assert livetime.counts([0.0, 1.0], [1.0, 2.0]).tolist() == [[1], [3]]
+        self.assertAlmostEqual(livetime.range_exposure([(0.0, 1.0), 
+                                                        (1.0, 2.0)]), 
+                               2.0 - 5 * 3e-5)
+    
+    def test_livetime(self):
+        livetime = self.livetime.livetime([0.0, 5.0], [5.0, 10.0])
+        assert np.allclose(livetime, [[4.95, 4.5], [3.95, 3.5]])
+        
+        # the livetimes are additive
+        livetime2 = self.livetime.livetime([0.0], [10.0])
+        assert np.allclose(livetime.sum(axis=0), livetime2[0])
+        
+        # cached and read-only
+        assert self.livetime.livetime([0.0, 5.0], [5.0, 10.0]) is livetime
+        with self.assertRaises(ValueError):
+            livetime[0, 0] = 1.0
+    
+    def test_exposure(self):
+        tstart, tstop = [0.0, 5.0], [5.0, 10.0]
+        exposure = self.livetime.exposure(tstart, tstop)
+        # the count rate is the sum of the corrected count rates
+        self.assertAlmostEqual(5500.0 / exposure[0], 500.0 / 4.95 + 5000 / 4.5)
+        
+        exposure = self.livetime.exposure(tstart, tstop, detectors=[0])
+        self.assertAlmostEqual(exposure[0], 4.95)
+        exposure = self.livetime.exposure(tstart, tstop, detectors=[1])
+        assert exposure[0] == 0.0
+        
+        # no events in the bin
+        exposure = self.livetime.exposure([20.0], [30.0])
+        assert exposure[0] == 0.0
+    
+    def test_range_exposure(self):
+        # each time range includes the events at both ends
+        exposure = self.livetime.range_exposure([(0.0, 5.0), (5.0, 10.0)])
+        self.assertAlmostEqual(11002.0 / exposure, 
+                               1001.0 / 8.8999 + 10001 / 7.9999)
+        exposure = self.livetime.range_exposure([(0.0, 10.0)], 
+                                                detectors=[GscDetectors.HA0])
+        self.assertAlmostEqual(exposure, 8.9)
+    
+    def test_channel_range(self):
+        # detector 3 has half of its events in channel 10 and half in 500
+        times = np.concatenate((np.linspace(0.0, 10.0, 1000, endpoint=False),
+                                np.linspace(0.0, 10.0, 10000, 
+                                            endpoint=False)))
+        dets = np.concatenate((np.zeros(1000, dtype=int), 
+                               np.full(10000, 3)))
+        chans = np.concatenate((np.full(1000, 10), np.tile([10, 500], 5000)))
+        livetime = GscLivetime(times, detectors=dets, deadtime=1e-4, 
+                               channels=chans)
+        
+        counts = livetime.counts([0.0, 5.0], [5.0, 10.0], 
+                                 channel_range=(0, 100))
+        assert counts.tolist() == [[500, 2500], [500, 2500]]
+        # the livetimes include the deadtime of all events
+        exposure = livetime.exposure([0.0, 5.0], [5.0, 10.0], 
+                                     channel_range=(0, 100))
+        self.assertAlmostEqual(3000.0 / exposure[0], 500.0 / 4.95 + 2500 / 4.5)
+        exposure = livetime.range_exposure([(0.0, 10.0)], 
+                                           channel_range=(200, 1000))
+        self.assertAlmostEqual(exposure, 9.0)
+        
+        with self.assertRaises(ValueError):
+            self.livetime.exposure([0.0], [5.0], channel_range=(0, 100))
+        with self.assertRaises(ValueError):
+            GscLivetime([1.0, 2.0], channels=[0])
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            GscLivetime([1.0, 2.0], detectors=[0])
+        with self.assertRaises(ValueError):
+            GscLivetime([1.0, 2.0], deadtime=-1.0)
+        with self.assertRaises(ValueError):
+            self.livetime.livetime([0.0, 1.0], [1.0])
+        with self.assertRaises(ValueError):
+            self.livetime.livetime([1.0], [0.0])
+
+
+@unittest.skipIf(not tte_file.exists(), "test files aren't downloaded. run gdt-data download.")
+class TestGscTteLivetime(unittest.TestCase):
+    
+    def setUp(self):
+        self.tte = GscTte.open(tte_file, columns=['GSCID'])
+    
+    def test_from_tte(self):
+        livetime = self.tte.livetime
+        assert livetime is self.tte.livetime
+        assert livetime.deadtime == self.tte.event_deadtime
+        assert livetime.num_detectors == np.unique(
+                                       self.tte.event_columns['GSCID']).size
+        tmin, tmax = self.tte.time_range
+        assert livetime.counts([tmin], [tmax]).sum() == self.tte.data.size
+        
+        livetime = GscTte.open(tte_file).livetime
+        assert livetime.num_detectors == 1
+    
+    def test_to_phaii(self):
+        phaii1 = self.tte.to_phaii_fast(bin_by_time, 64.0)
+        phaii2 = self.tte.to_phaii_fast(bin_by_time, 64.0, livetime=True)
+        assert np.array_equal(phaii1.data.counts, phaii2.data.counts)
+        # the deadtime of each counter only applies to its own livetime
+        assert np.all(phaii2.data.exposure >= phaii1.data.exposure - 1e-6)
+        
+        phaii3 = self.tte.to_phaii(bin_by_time, 64.0, 
+                                   livetime=self.tte.livetime)
+        assert np.allclose(phaii3.data.exposure, phaii2.data.exposure)
+        
+        # the counters are weighted by their counts in the channel range
+        phaii4 = self.tte.to_phaii_fast(bin_by_time, 64.0, livetime=True,
+                                        channel_range=(0, 200))
+        exposure = self.tte.livetime.exposure(phaii4.data.tstart, 
+                                              phaii4.data.tstop,
+                                              channel_range=(0, 200))
+        assert np.allclose(phaii4.data.exposure, exposure)
+        phaii5 = self.tte.to_phaii(bin_by_time, 64.0, livetime=True, 
+                                   channel_range=(0, 200))
+        exposure = self.tte.livetime.exposure(phaii5.data.tstart, 
+                                              phaii5.data.tstop,
+                                              channel_range=(0, 200))
+        assert np.allclose(phaii5.data.exposure, exposure)
+        
+        with self.assertRaises(TypeError):
+            self.tte.to_phaii_fast(bin_by_time, 64.0, livetime='yes')
+    
+    @unittest.skipIf(not rmf803_file.exists(), "test files aren't downloaded. run gdt-data download.")
+    def test_to_pha(self):
+        self.tte.set_ebounds(GscRmf.open(rmf803_file).ebounds)
+        pha = self.tte.to_pha(livetime=True)
+        self.assertAlmostEqual(pha.exposure, self.tte.livetime.range_exposure(
+                                                       pha.gti.as_list()))
+        assert pha.exposure < self.tte.to_pha().exposure
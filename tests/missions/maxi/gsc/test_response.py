@@ -39,12 +39,24 @@
 # the License.
 
 import os
+import shutil
+import tempfile
 import unittest
+import numpy as np
+import astropy.io.fits as fits
+from scipy import sparse
 from gdt.core import data_path
+from gdt.core.data_primitives import ResponseMatrix
 from gdt.missions.maxi.gsc.detectors import GscDetectors
 from gdt.missions.maxi.gsc.headers import ArfHeaders, RmfHeaders
 from gdt.missions.maxi.gsc.response import *
 from gdt.core.spectra.functions import PowerLaw
+from gdt.core.coords import Quaternion
+from gdt.missions.maxi.frame import MaxiFrame
+from gdt.missions.maxi.gsc.detectors import GscFov
+from gdt.missions.maxi.time import Time
+from astropy.coordinates import SkyCoord
+from scipy.spatial.transform import Rotation
 
 arf_file = data_path / 'maxi-gsc/mx_gsc0_arfcorr_20151126.fits'
 rmf803_file = data_path / 'maxi-gsc/mx_gsc0_hv803_detx0000_0000.rmf'
@@ -62,6 +74,30 @@ class TestMaxiArf(unittest.TestCase):
     def test_headers(self):
         assert isinstance(self.arf.headers, ArfHeaders)
     
+    def test_lazy(self):
+        arf = GscArf.open(arf_file, lazy=True)
+        assert arf.detector == 'HA0'
+        assert not arf.is_loaded
+        assert np.array_equal(arf.get_arf(854).counts, 
+                              self.arf.get_arf(854).counts)
+        assert not arf.is_loaded
+        assert np.array_equal(arf.get_arf(803).counts, 
+                              self.arf.get_arf(803).counts)
+        assert arf.is_loaded
+        
+        arf = GscArf.open(arf_file, lazy=True)
+        arf.close()
+        with self.assertRaises(RuntimeError):
+            arf.get_arf(803)
+    
+    def test_cache(self):
+        GscArf.clear_cache()
+        arf = GscArf.open(arf_file, cache=True)
+        assert GscArf.open(arf_file, cache=True) is arf
+        GscArf.clear_cache()
+        assert GscArf.open(arf_file, cache=True) is not arf
+        GscArf.clear_cache()
+    
     def test_get_arf(self):
         arf = self.arf.get_arf(803)
         assert round(float(arf.counts[0]), 6) == round(0.5928503, 6)
@@ -106,6 +142,330 @@ class TestMaxiRmf(unittest.TestCase):
         rsp854 = self.rmf854.apply_arf(arf)
         assert isinstance(rsp854, GscRsp)
 
+    def test_hv(self):
+        assert self.rmf803.hv == 803
+        assert self.rmf854.hv == 854
+    
+    def test_apply_arfs(self):
+        arf = GscArf.open(arf_file)
+        cube = GscRmf.apply_arfs([self.rmf803, self.rmf854], arf)
+        assert isinstance(cube, GscResponseCube)
+        assert len(cube) == 2
+        assert cube.matrix.shape == (2, self.rmf803.num_ebins, 
+                                     self.rmf803.num_chans)
+        assert cube.detectors == ['HA0', 'HA0']
+        assert cube.hvs == [803, 854]
+        assert cube.index('HA0', 854) == 1
+        
+        rsp = cube[1]
+        assert isinstance(rsp, GscRsp)
+        assert rsp.filename == 'mx_gsc0_hv854_detxm002_m002.rsp'
+        assert np.allclose(rsp.drm.matrix, 
+                           self.rmf854.apply_arf(arf).drm.matrix)
+        assert [r.detector for r in cube] == ['HA0', 'HA0']
+        
+        with self.assertRaises(ValueError):
+            cube.index('HA1', 803)
+        with self.assertRaises(ValueError):
+            GscRmf.apply_arfs([], arf)
+        with self.assertRaises(ValueError):
+            GscRmf.apply_arfs([self.rmf803, self.rmf803.rebin(factor=2)], arf)
+
+    def test_sparse(self):
+        rmf = GscRmf.open(rmf854_file, sparse=True)
+        assert rmf.is_sparse
+        assert not self.rmf854.is_sparse
+        assert isinstance(rmf.drm, SparseResponseMatrix)
+        assert np.allclose(rmf.drm.matrix, self.rmf854.drm.matrix)
+        
+        arf = GscArf.open(arf_file)
+        rsp = rmf.apply_arf(arf)
+        assert isinstance(rsp.drm, SparseResponseMatrix)
+        assert np.allclose(rsp.drm.matrix, 
+                           self.rmf854.apply_arf(arf).drm.matrix)
+
+
+@unittest.skipIf((not rmf803_file.exists()) or (not arf_file.exists()), 
+                "test files aren't downloaded. run gdt-data download.")
+class TestGscResponseWrite(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.rmf = GscRmf.open(rmf803_file)
+        self.rsp = self.rmf.apply_arf(GscArf.open(arf_file))
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def test_write_rmf(self):
+        self.rmf.write(self.path)
+        rmf = GscRmf.open(os.path.join(self.path, self.rmf.filename))
+        assert rmf.detector == 'HA0'
+        assert rmf.hv == 803
+        assert np.allclose(rmf.drm.matrix, self.rmf.drm.matrix)
+        assert np.allclose(rmf.ebounds.low_edges(), 
+                           self.rmf.ebounds.low_edges())
+        
+        with fits.open(os.path.join(self.path, self.rmf.filename)) as f:
+            assert f['MATRIX'].columns['MATRIX'].format.startswith('P')
+            assert f['MATRIX'].header['HDUCLAS3'] == 'DETECTOR'
+    
+    def test_write_rsp(self):
+        self.rsp.write(self.path)
+        filepath = os.path.join(self.path, self.rsp.filename)
+        rsp = GscRsp.open(filepath)
+        assert isinstance(rsp, GscRsp)
+        assert np.allclose(rsp.drm.matrix, self.rsp.drm.matrix)
+        assert rsp.headers['MATRIX']['HDUCLAS3'] == 'FULL'
+        
+        # much smaller than the dense matrix
+        assert os.path.getsize(filepath) < self.rsp.drm.matrix.nbytes / 4
+    
+    def test_write_threshold(self):
+        self.rsp.write(self.path, filename='test.rsp', threshold=1e-3)
+        rsp = GscRsp.open(os.path.join(self.path, 'test.rsp'))
+        matrix = self.rsp.drm.matrix.copy()
+        matrix[matrix <= 1e-3] = 0.0
+        assert np.allclose(rsp.drm.matrix, matrix)
+        
+        # the threshold is an argument of the HDU list, not of the object
+        hdulist = self.rsp._build_hdulist(threshold=1e-3)
+        num_values = sum([row.size for row in hdulist[1].data['MATRIX']])
+        assert num_values == np.count_nonzero(matrix)
+        hdulist = self.rsp._build_hdulist()
+        num_values = sum([row.size for row in hdulist[1].data['MATRIX']])
+        assert num_values == np.count_nonzero(self.rsp.drm.matrix)
+        
+        with self.assertRaises(ValueError):
+            self.rsp.write(self.path, filename='test2.rsp', threshold=-1.0)
+    
+    def test_write_sparse(self):
+        rmf = GscRmf.open(rmf803_file, sparse=True)
+        rmf.write(self.path, filename='test.rmf')
+        rmf = GscRmf.open(os.path.join(self.path, 'test.rmf'))
+        assert np.allclose(rmf.drm.matrix, self.rmf.drm.matrix)
+
+
+@unittest.skipIf(not rmf854_file.exists(), 
+                "test files aren't downloaded. run gdt-data download.")
+class TestGscResponseCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = GscResponseCache(cache_path=self.path)
+        self.rmf = GscRmf.open(rmf854_file)
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def test_dense(self):
+        assert not self.cache.contains(rmf854_file)
+        rmf1 = GscRmf.open(rmf854_file, cache=self.cache)
+        assert self.cache.contains(rmf854_file, kind='dense')
+        assert not self.cache.contains(rmf854_file, kind='csr')
+        
+        rmf2 = GscRmf.open(rmf854_file, cache=self.cache)
+        # memory-mapped from the cache
+        assert not rmf2.drm.matrix.flags.owndata
+        assert not rmf2.drm.matrix.flags.writeable
+        assert np.array_equal(rmf1.drm.matrix, self.rmf.drm.matrix)
+        assert np.array_equal(rmf2.drm.matrix, self.rmf.drm.matrix)
+        assert np.array_equal(rmf2.ebounds.low_edges(), 
+                              self.rmf.ebounds.low_edges())
+        assert rmf2.detector == self.rmf.detector
+        assert rmf2.filename == self.rmf.filename
+        assert rmf2.headers['MATRIX']['DETCHANS'] == \
+               self.rmf.headers['MATRIX']['DETCHANS']
+    
+    def test_sparse(self):
+        GscRmf.open(rmf854_file, sparse=True, cache=self.cache)
+        rmf = GscRmf.open(rmf854_file, sparse=True, cache=self.cache)
+        assert self.cache.contains(rmf854_file, kind='csr')
+        assert rmf.is_sparse
+        assert np.array_equal(rmf.drm.matrix, self.rmf.drm.matrix)
+    
+    def test_invalidate(self):
+        GscRmf.open(rmf854_file, cache=self.cache)
+        GscRmf.open(rmf854_file, sparse=True, cache=self.cache)
+        self.cache.invalidate(rmf854_file)
+        assert not self.cache.contains(rmf854_file)
+        
+        GscRmf.open(rmf854_file, cache=self.cache)
+        self.cache.clear()
+        assert self.cache.size == 0
+    
+    def test_evict(self):
+        GscRmf.open(rmf854_file, cache=self.cache)
+        size = self.cache.size
+        cache = GscResponseCache(cache_path=self.path, max_size=size + 1)
+        GscRmf.open(rmf854_file, sparse=True, cache=cache)
+        assert cache.size <= cache.max_size
+        assert cache.contains(rmf854_file, kind='csr')
+        assert not cache.contains(rmf854_file, kind='dense')
+    
+    def test_hash_once(self):
+        hashes = []
+        class CountingCache(GscResponseCache):
+            def file_hash(self, file_path):
+                hashes.append(file_path)
+                return super().file_hash(file_path)
+        
+        cache = CountingCache(cache_path=self.path)
+        GscRmf.open(rmf854_file, cache=cache)
+        assert len(hashes) == 1
+        GscRmf.open(rmf854_file, cache=cache)
+        assert len(hashes) == 2
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            GscResponseCache(cache_path=self.path, max_size=0)
+        with self.assertRaises(TypeError):
+            GscResponseCache(cache_path=self.path, max_size='big')
+
+
+@unittest.skipIf((not rmf803_file.exists()) or (not rmf854_file.exists()), 
+                "test files aren't downloaded. run gdt-data download.")
+class TestGscResponseDatabase(unittest.TestCase):
+    
+    def setUp(self):
+        # a CALDB with two DETX bins for HV 803
+        self.path = tempfile.mkdtemp()
+        shutil.copy(rmf803_file, self.path)
+        shutil.copy(rmf854_file, self.path)
+        self.detx10_file = os.path.join(self.path, 
+                                        'mx_gsc0_hv803_detx0010_0010.rmf')
+        shutil.copy(rmf803_file, self.detx10_file)
+        for key in ('DETXMIN', 'DETXMAX', 'DETXCNTR'):
+            fits.setval(self.detx10_file, key, value=10, ext=1)
+        fits.setval(self.detx10_file, 'CBD20001', value='DETX(10)', ext=1)
+        fits.setval(self.detx10_file, 'DET_THA', value=20.0, ext=1)
+        fits.setval(os.path.join(self.path, rmf803_file.name), 'DET_THA', 
+                    value=0.0, ext=1)
+        
+        self.db = GscResponseDatabase(self.path)
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def test_index(self):
+        assert self.db.num_files == 3
+        assert self.db.detectors == ['HA0']
+        assert self.db.hvs == [803, 854]
+        assert self.db.detx_bins('HA0', 803).tolist() == [[0.0, 0.0], 
+                                                          [10.0, 10.0]]
+        assert self.db.detx_bins('HA0', 854).tolist() == [[-2.0, -2.0]]
+        assert len(self.db.files(hv=803)) == 2
+        assert self.db.files(detector='HA0', hv=854)[0].name == \
+               rmf854_file.name
+        assert self.db.files(detector='ZB0') == []
+    
+    def test_get(self):
+        assert self.db.num_loaded == 0
+        rmf = self.db.get('HA0', 854, -2.0)
+        assert rmf.filename == rmf854_file.name
+        assert self.db.num_loaded == 1
+        assert self.db.get('HA0', 854, -2.0) is rmf
+        
+        # outside of the DETX range
+        rmf = self.db.get('HA0', 803, -5.0)
+        assert rmf.filename == rmf803_file.name
+        rmf = self.db.get('HA0', 803, 7.0, interpolate=False)
+        assert rmf.filename == 'mx_gsc0_hv803_detx0010_0010.rmf'
+    
+    def test_interpolate(self):
+        weights = self.db.weights('HA0', 803, 3.0)
+        assert [path.name for path, _ in weights] == \
+               [rmf803_file.name, 'mx_gsc0_hv803_detx0010_0010.rmf']
+        assert np.allclose([weight for _, weight in weights], [0.7, 0.3])
+        
+        rmf = self.db.get('HA0', 803, 3.0)
+        rmf0 = GscRmf.open(rmf803_file)
+        assert isinstance(rmf, GscRmf)
+        assert np.allclose(rmf.drm.matrix, rmf0.drm.matrix)
+    
+    def test_track(self):
+        # source crosses the HA0 FOV 5 degrees along the FOV
+        num = 400
+        angles = np.column_stack((np.full(num, -5.0), 
+                                  np.linspace(-3.0, 3.0, num)))
+        rot = Rotation.from_euler('zy', angles, degrees=True)
+        frame = MaxiFrame(obstime=Time(631152082.0 + np.arange(num) * 0.1, 
+                                       format='maxi'),
+                          quaternion=Quaternion(rot.as_quat()), 
+                          detectors=GscFov)
+        coord = SkyCoord(0.0, 0.0, unit='deg')
+        
+        weights = self.db.track_weights(coord, frame, 'HA0', 803)
+        assert [path.name for path, _ in weights] == \
+               [rmf803_file.name, 'mx_gsc0_hv803_detx0010_0010.rmf']
+        assert np.allclose([weight for _, weight in weights], [0.75, 0.25])
+        
+        weights = self.db.track_weights(coord, frame, 'HA0', 803, 
+                                        detx_func=lambda x: x / 2.0)
+        assert np.allclose([weight for _, weight in weights], [0.75, 0.25])
+        
+        arf = GscArf.open(arf_file)
+        rsp = self.db.track_response(coord, frame, 'HA0', 803, arf=arf)
+        assert isinstance(rsp, GscRsp)
+        
+        # source has left the FOV
+        with self.assertRaises(ValueError):
+            self.db.track_weights(coord, frame, 'HA0', 803,
+                                  tstart=Time(631152082.0 + 35.0, 
+                                              format='maxi'))
+        with self.assertRaises(ValueError):
+            self.db.track_weights(coord, frame, 'HA0', 803, 
+                                  collimator_width=0.0)
+    
+    def test_lru(self):
+        rmf = self.db.get('HA0', 854, -2.0)
+        db = GscResponseDatabase(self.path, 
+                                 max_memory=rmf.drm.matrix.nbytes + 1)
+        db.get('HA0', 854, -2.0)
+        db.get('HA0', 803, 0.0)
+        assert db.num_loaded == 1
+        assert db.memory_usage <= db.max_memory
+        db.clear()
+        assert db.num_loaded == 0
+        assert db.memory_usage == 0
+    
+    def test_memory_usage(self):
+        rmf1 = self.db.get('HA0', 854, -2.0)
+        rmf2 = self.db.get('HA0', 803, 0.0)
+        assert self.db.memory_usage == rmf1.drm.matrix.nbytes + \
+                                       rmf2.drm.matrix.nbytes
+        
+        # matrices memory-mapped from the response cache are not counted
+        cache_path = tempfile.mkdtemp()
+        try:
+            cache = GscResponseCache(cache_path=cache_path)
+            GscResponseDatabase(self.path, cache=cache).get('HA0', 854, -2.0)
+            db = GscResponseDatabase(self.path, cache=cache, max_memory=1)
+            db.get('HA0', 854, -2.0)
+            assert db.memory_usage == 0
+            db.get('HA0', 803, 0.0)
+            assert db.num_loaded == 1
+            db = GscResponseDatabase(self.path, cache=cache, sparse=True)
+            db.get('HA0', 854, -2.0)
+            db.get('HA0', 854, -2.0)
+            assert db.memory_usage > 0
+            del db
+        finally:
+            shutil.rmtree(cache_path)
+    
+    def test_sparse(self):
+        db = GscResponseDatabase(self.path, sparse=True)
+        rmf = db.get('HA0', 803, 3.0)
+        assert rmf.is_sparse
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            GscResponseDatabase(os.path.join(self.path, 'missing'))
+        with self.assertRaises(ValueError):
+            GscResponseDatabase(self.path, max_memory=0)
+        with self.assertRaises(ValueError):
+            self.db.get('ZB0', 803, 0.0)
+
 
 @unittest.skipIf((not rmf803_file.exists()) or (not arf_file.exists()), 
                 "test files aren't downloaded. run gdt-data download.")
@@ -145,6 +505,47 @@ class TestGscRsp(unittest.TestCase):
         assert ebins.size == self.rsp.num_chans
         assert ebins.exposure[0] == 2.0
 
+    def test_fold_spectra(self):
+        pl = PowerLaw()
+        params = [(0.01, -2.2), (0.02, -1.5), (0.01, -3.0)]
+        spectra = np.array([pl.fit_eval(p, self.rsp.drm.photon_bin_centroids) 
+                            for p in params])
+        counts = self.rsp.fold_spectra(spectra, exposure=2.0)
+        assert counts.shape == (3, self.rsp.num_chans)
+        for i in range(3):
+            ebins = self.rsp.fold_spectrum(pl.fit_eval, params[i], 
+                                           exposure=2.0)
+            assert np.allclose(counts[i], ebins.counts)
+        
+        counts32 = self.rsp.fold_spectra(spectra, exposure=[1.0, 2.0, 3.0],
+                                         dtype=np.float32)
+        assert counts32.dtype == np.float32
+        assert np.allclose(counts32[1], counts[1], rtol=1e-4)
+        
+        mask = np.zeros(self.rsp.num_chans, dtype=bool)
+        mask[100:500] = True
+        counts = self.rsp.fold_spectra(spectra[0], channel_mask=mask)
+        ebins = self.rsp.fold_spectrum(pl.fit_eval, params[0], 
+                                       channel_mask=mask)
+        assert np.allclose(counts[0], ebins.counts)
+        
+        with self.assertRaises(ValueError):
+            self.rsp.fold_spectra(spectra[:, 1:])
+        with self.assertRaises(ValueError):
+            self.rsp.fold_spectra(spectra, exposure=[1.0, 2.0])
+        with self.assertRaises(ValueError):
+            self.rsp.fold_spectra(spectra, exposure=0.0)
+        with self.assertRaises(ValueError):
+            self.rsp.fold_spectra(spectra, dtype=np.int32)
+    
+    def test_fold_spectra_sparse(self):
+        arf = GscArf.open(arf_file)
+        rsp = GscRmf.open(rmf803_file, sparse=True).apply_arf(arf)
+        spectra = PowerLaw().fit_eval((0.01, -2.2), 
+                                      rsp.drm.photon_bin_centroids)
+        assert np.allclose(rsp.fold_spectra(spectra), 
+                           self.rsp.fold_spectra(spectra))
+
     def test_rebin(self):
         rsp = self.rsp.rebin(factor=2)
         assert rsp.num_chans == self.rsp.num_chans // 2
@@ -155,3 +556,163 @@ class TestGscRsp(unittest.TestCase):
         assert rsp.num_chans == rsp.num_chans
         assert rsp.num_ebins == 600
 
+
+
+class TestDecompressDrm(unittest.TestCase):
+    
+    def test_one_group(self):
+        matrix = np.array([np.array([1.0, 2.0]), np.array([3.0, 4.0, 5.0])],
+                          dtype=object)
+        drm = GscRmf._decompress_drm(matrix, 2, 5, np.array([1, 3]), 
+                                     np.array([2, 3]))
+        assert np.array_equal(drm, [[1.0, 2.0, 0.0, 0.0, 0.0],
+                                    [0.0, 0.0, 3.0, 4.0, 5.0]])
+
+    def test_multiple_groups(self):
+        matrix = np.array([np.array([1.0, 2.0, 3.0]), np.array([4.0])],
+                          dtype=object)
+        fchan = np.array([np.array([1, 4]), np.array([2])], dtype=object)
+        nchan = np.array([np.array([1, 2]), np.array([1])], dtype=object)
+        drm = GscRmf._decompress_drm(matrix, 2, 5, fchan, nchan,
+                                     ngrp=np.array([2, 1]))
+        assert np.array_equal(drm, [[1.0, 0.0, 0.0, 2.0, 3.0],
+                                    [0.0, 4.0, 0.0, 0.0, 0.0]])
+
+    def test_ngrp_limits_groups(self):
+        # fixed-length columns padded beyond N_GRP
+        matrix = np.array([[1.0, 2.0, 3.0], [4.0, 0.0, 0.0]])
+        fchan = np.array([[1, 4], [2, 0]])
+        nchan = np.array([[1, 2], [1, 0]])
+        drm = GscRmf._decompress_drm(matrix, 2, 5, fchan, nchan,
+                                     ngrp=np.array([2, 1]))
+        assert np.array_equal(drm, [[1.0, 0.0, 0.0, 2.0, 3.0],
+                                    [0.0, 4.0, 0.0, 0.0, 0.0]])
+
+    def test_first_channel(self):
+        matrix = np.array([[1.0, 2.0], [3.0, 4.0]])
+        drm = GscRmf._decompress_drm(matrix, 2, 3, np.array([0, 1]), 
+                                     np.array([2, 2]), first_chan=0)
+        assert np.array_equal(drm, [[1.0, 2.0, 0.0], [0.0, 3.0, 4.0]])
+
+    def test_errors(self):
+        matrix = np.array([np.array([1.0]), np.array([3.0])], dtype=object)
+        with self.assertRaises(ValueError):
+            GscRmf._decompress_drm(matrix, 2, 5, np.array([1, 3]), 
+                                   np.array([2, 3]))
+
+    def test_malformed(self):
+        # the group in the first row runs past the last channel
+        matrix = np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+        with self.assertRaises(ValueError):
+            GscRmf._decompress_drm(matrix, 2, 5, np.array([4, 1]), 
+                                   np.array([3, 3]))
+        with self.assertRaises(ValueError):
+            GscRmf._decompress_sparse_drm(matrix, 2, 5, np.array([4, 1]), 
+                                          np.array([3, 3]))
+        
+        # multiple groups, the second group of the last row is out of range
+        fchan = np.array([np.array([1]), np.array([1, 5])], dtype=object)
+        nchan = np.array([np.array([1]), np.array([1, 2])], dtype=object)
+        with self.assertRaises(ValueError):
+            GscRmf._decompress_drm(matrix, 2, 5, fchan, nchan)
+        
+        # more rows than photon bins
+        with self.assertRaises(ValueError):
+            GscRmf._decompress_drm(matrix, 1, 5, np.array([1, 1]), 
+                                   np.array([3, 3]))
+        
+        # an out-of-range group that is excluded by N_GRP is ignored
+        drm = GscRmf._decompress_drm(matrix, 2, 5, np.array([1, 4]), 
+                                     np.array([3, 3]), ngrp=np.array([1, 0]))
+        assert np.array_equal(drm, [[1.0, 2.0, 3.0, 0.0, 0.0], 
+                                    [0.0, 0.0, 0.0, 0.0, 0.0]])
+
+
+class TestCompressDrm(unittest.TestCase):
+    
+    def setUp(self):
+        self.matrix = np.array([[1.0, 0.0, 0.0, 2.0, 3.0],
+                                [0.0, 0.0, 0.0, 0.0, 0.0],
+                                [0.0, 4.0, 0.001, 5.0, 0.0]])
+    
+    def test_compress(self):
+        ngrp, fchan, nchan, values = GscRmf._compress_drm(self.matrix)
+        assert ngrp.tolist() == [2, 0, 1]
+        assert [f.tolist() for f in fchan] == [[1, 4], [], [2]]
+        assert [n.tolist() for n in nchan] == [[1, 2], [], [3]]
+        assert np.allclose(values[0], [1.0, 2.0, 3.0])
+        assert values[1].size == 0
+        
+        drm = GscRmf._decompress_drm(np.array(values, dtype=object), 3, 5, 
+                                     np.array(fchan, dtype=object), 
+                                     np.array(nchan, dtype=object), ngrp=ngrp)
+        assert np.allclose(drm, self.matrix)
+    
+    def test_threshold(self):
+        ngrp, fchan, nchan, values = GscRmf._compress_drm(self.matrix, 
+                                                          threshold=0.01)
+        assert ngrp.tolist() == [2, 0, 2]
+        assert fchan[2].tolist() == [2, 4]
+        assert np.allclose(values[2], [4.0, 5.0])
+    
+    def test_sparse(self):
+        result = GscRmf._compress_drm(sparse.csr_matrix(self.matrix))
+        expected = GscRmf._compress_drm(self.matrix)
+        assert np.array_equal(result[0], expected[0])
+        for i in range(1, 4):
+            assert all([np.array_equal(a, b) \
+                        for a, b in zip(result[i], expected[i])])
+
+
+class TestSparseResponseMatrix(unittest.TestCase):
+    
+    def setUp(self):
+        matrix = np.array([[1.0, 2.0, 0.0, 0.0], [0.0, 3.0, 4.0, 0.0],
+                           [0.0, 0.0, 5.0, 6.0]])
+        emin, emax = [1.0, 2.0, 3.0], [2.0, 3.0, 4.0]
+        chanlo, chanhi = [1.0, 1.5, 2.5, 3.5], [1.5, 2.5, 3.5, 4.5]
+        self.dense = ResponseMatrix(matrix, emin, emax, chanlo, chanhi)
+        self.sparse = SparseResponseMatrix(matrix, emin, emax, chanlo, chanhi)
+    
+    def test_matrix(self):
+        assert np.array_equal(self.sparse.matrix, self.dense.matrix)
+        assert self.sparse.sparse_matrix.nnz == 6
+        assert self.sparse.num_chans == 4
+        assert self.sparse.num_ebins == 3
+
+    def test_effective_area(self):
+        assert np.array_equal(self.sparse.photon_effective_area().counts,
+                              self.dense.photon_effective_area().counts)
+        assert np.array_equal(self.sparse.channel_effective_area().counts,
+                              self.dense.channel_effective_area().counts)
+
+    def test_fold_spectrum(self):
+        counts = self.sparse.fold_spectrum(PowerLaw().fit_eval, (0.01, -2.2))
+        assert np.allclose(counts, 
+                    self.dense.fold_spectrum(PowerLaw().fit_eval, (0.01, -2.2)))
+        mask = np.array([True, False, True, True])
+        counts = self.sparse.fold_spectrum(PowerLaw().fit_eval, (0.01, -2.2),
+                                           channel_mask=mask)
+        assert counts.size == 3
+
+    def test_rebin(self):
+        drm = self.sparse.rebin(factor=2)
+        assert isinstance(drm, SparseResponseMatrix)
+        assert np.array_equal(drm.matrix, self.dense.rebin(factor=2).matrix)
+        drm = self.sparse.rebin(edge_indices=[1, 3, 4])
+        assert np.array_equal(drm.matrix, 
+                              self.dense.rebin(edge_indices=[1, 3, 4]).matrix)
+
+    def test_resample(self):
+        drm = self.sparse.resample(num_photon_bins=2)
+        assert isinstance(drm, SparseResponseMatrix)
+        assert drm.num_ebins == 2
+    
+    def test_errors(self):
+        with self.assertRaises(TypeError):
+            SparseResponseMatrix(np.ones(4), [1.0], [2.0], [1.0], [2.0])
+        with self.assertRaises(ValueError):
+            SparseResponseMatrix(np.ones((2, 2)), [1.0], [2.0], [1.0, 2.0],
+                                 [2.0, 3.0])
+        with self.assertRaises(ValueError):
+            self.sparse.rebin(factor=3)
@@ -0,0 +1,152 @@
+# CONTAINS TECHNICAL DATA/COMPUTER SOFTWARE DELIVERED TO THE U.S. GOVERNMENT 
+# WITH UNLIMITED RIGHTS
+#
+# Grant No.: 80NSSC21K0651
+# Grantee Name: Universities Space Research Association
+# Grantee Address: 425 3rd Street SW, Suite 950, Washington DC 20024
+#
+# Copyright 2024 by Universities Space Research Association (USRA). All rights 
+# reserved.
+#
+# Developed by: Adam Goldstein
+#               Universities Space Research Association
+#               Science and Technology Institute
+#               https://sti.usra.edu
+#
+# This work is a derivative of the Gamma-ray Data Tools (GDT), including the 
+# Core and Fermi packages, originally developed by the following:
+#
+#     William Cleveland and Adam Goldstein
+#     Universities Space Research Association
+#     Science and Technology Institute
+#     https://sti.usra.edu
+#     
+#     Daniel Kocevski
+#     National Aeronautics and Space Administration (NASA)
+#     Marshall Space Flight Center
+#     Astrophysics Branch (ST-12)
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not 
+# use this file except in compliance with the License. You may obtain a copy of 
+# the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT 
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the 
+# License for the specific language governing permissions and limitations under 
+# the License.
+import unittest
+import numpy as np
+from gdt.core import data_path
+from gdt.core.data_primitives import Gti
+from gdt.core.trigger import SlidingWindowMethod
+from gdt.missions.maxi.gsc.detectors import GscDetectors
+from gdt.missions.maxi.gsc.headers import EventsHeaders
+from gdt.missions.maxi.gsc.trigger import *
+from gdt.missions.maxi.gsc.tte import GscTte
+
+tte_file = data_path / 'maxi-gsc/mx_mjd55616_gsc_med_000.evt.gz'
+tte_file2 = data_path / 'maxi-gsc/mx_mjd55616_gsc_med_001.evt.gz'
+
+
+def make_tte(rng, rate, duration=2000.0, burst_time=None):
+    times = rng.uniform(0.3, duration, rng.poisson(rate * duration))
+    if burst_time is not None:
+        times = np.concatenate((times, 
+                                rng.uniform(burst_time, burst_time + 4.0, 200)))
+    times = np.sort(times)
+    chans = rng.integers(0, 1187, times.size).astype(np.int16)
+    data = GscTte._event_list(times, chans)
+    return GscTte.from_data(data, gti=Gti.from_list([(0.0, duration + 1.0)]), 
+                            headers=EventsHeaders(), event_deadtime=3e-5, 
+                            overflow_deadtime=3e-5)
+
+
+class TestGscSlidingWindowMethod(unittest.TestCase):
+    
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.ttes = [make_tte(rng, 20.0, burst_time=1200.0), 
+                     make_tte(rng, 20.0)]
+        self.algorithms = {1: TriggerAlgorithm(1000, 0, (0, 1), 4.5),
+                           2: TriggerAlgorithm(4000, 0, (0, 2), 4.5),
+                           3: TriggerAlgorithm(4000, 2000, (1, 2), 4.5)}
+        self.args = (self.algorithms, 60000, 4000, 1000, [0, 200, 600, 1187],
+                     ['a', 'b'])
+    
+    def test_same_as_core(self):
+        core = SlidingWindowMethod(*self.args, verbose=False)
+        core.prepare_data(self.ttes)
+        core_triggers = core.apply_trigger()
+        
+        method = GscSlidingWindowMethod(*self.args, verbose=False)
+        method.prepare_data(self.ttes)
+        triggers = method.apply_trigger()
+        
+        assert len(triggers) == len(core_triggers)
+        for trigger, core_trigger in zip(triggers, core_triggers):
+            assert trigger.alg_num == core_trigger.alg_num
+            assert trigger.time == core_trigger.time
+            assert np.allclose(trigger.sig, core_trigger.sig)
+            assert trigger.triggered_det_names == \
+                   core_trigger.triggered_det_names
+    
+    def test_holdoff(self):
+        method = GscSlidingWindowMethod(*self.args, verbose=False)
+        method.prepare_data(self.ttes)
+        triggers = method.apply_trigger(holdoff=100.0)
+        times = [trigger.time for trigger in triggers]
+        assert np.all(np.diff(times) > 100.0)
+        assert any([1200.0 < time < 1210.0 for time in times])
+    
+    def test_errors(self):
+        method = GscSlidingWindowMethod(*self.args, verbose=False)
+        with self.assertRaises(ValueError):
+            method.apply_trigger()
+        with self.assertRaises(ValueError):
+            method.prepare_data(self.ttes[:1])
+
+
+class TestGscTransientSearch(unittest.TestCase):
+    
+    def setUp(self):
+        self.algorithms = {1: TriggerAlgorithm(1000, 0, (0, 1), 4.0),
+                           2: TriggerAlgorithm(8000, 0, (0, 2), 4.0)}
+    
+    def test_search_tte(self):
+        rng = np.random.default_rng(5)
+        tte = make_tte(rng, 20.0, burst_time=1500.0)
+        search = GscTransientSearch(self.algorithms, 60000, 4000, 1000, 
+                                    [0, 200, 600, 1187], holdoff=300.0)
+        candidates = search.search_tte(tte, tile=12)
+        assert candidates.size > 0
+        assert np.all(candidates.TILE == 12)
+        assert np.all(np.diff(candidates.TIME) >= 0.0)
+        assert np.all(candidates.SIGNIFICANCE > 4.0)
+        assert np.all(candidates.DETECTORS == 'ALL')
+        
+        burst = candidates[(candidates.TIME > 1500.0) & 
+                           (candidates.TIME < 1510.0)]
+        assert burst.size == 1
+        assert burst.TSTART[0] == burst.TIME[0] - burst.TIMESCALE[0]
+        assert burst.CHAN_LO[0] == 0
+        assert burst.CHAN_HI[0] in (599, 1186)
+    
+    @unittest.skipIf(not tte_file2.exists(), "test files aren't downloaded. run gdt-data download.")
+    def test_search(self):
+        detectors = {'H': GscDetectors.h_detectors(), 
+                     'Z': GscDetectors.z_detectors()}
+        search = GscTransientSearch(self.algorithms, 128000, 8000, 1000, 
+                                    [0, 200, 600, 1187], detectors=detectors,
+                                    holdoff=30.0)
+        assert search.method.det_names == ['H', 'Z']
+        candidates = search.search([tte_file, tte_file2])
+        assert candidates.size > 0
+        assert set(np.unique(candidates.TILE)) <= {0, 1}
+        assert np.all(np.isin(candidates.DETECTORS, ['H', 'Z', 'H,Z']))
+        assert np.all(np.diff(candidates.TIME) >= 0.0)
+        
+        candidates2 = search.search([tte_file, tte_file2], num_processes=2)
+        assert np.array_equal(candidates, candidates2)
@@ -38,8 +38,15 @@
 # License for the specific language governing permissions and limitations under 
 # the License.
 
+import gzip
 import os
+import shutil
+import tempfile
 import unittest
+import healpy as hp
+import numpy as np
+import astropy.io.fits as fits
+from astropy.coordinates import SkyCoord
 from gdt.core import data_path
 from gdt.core.binning.binned import combine_by_factor
 from gdt.core.binning.unbinned import bin_by_time
@@ -49,6 +56,7 @@ from gdt.missions.maxi.gsc.response import GscRmf
 from gdt.missions.maxi.gsc.tte import *
 
 tte_file = data_path / 'maxi-gsc/mx_mjd55616_gsc_med_000.evt.gz'
+tte_file2 = data_path / 'maxi-gsc/mx_mjd55616_gsc_med_001.evt.gz'
 rmf803_file = data_path / 'maxi-gsc/mx_gsc0_hv803_detx0000_0000.rmf'
 
 
@@ -98,6 +106,28 @@ class TestGscTte(unittest.TestCase):
         phaii = self.tte.to_phaii(bin_by_time, 8.192)
         assert phaii.data.num_times == 10077
         
+    def test_to_phaii_fast(self):
+        phaii = self.tte.to_phaii(bin_by_time, 8.192)
+        phaii_fast = self.tte.to_phaii_fast(bin_by_time, 8.192, 
+                                            gti_exposure=False)
+        assert phaii_fast.data.num_times == phaii.data.num_times
+        assert np.array_equal(phaii_fast.data.counts, 
+            phaii.data.counts[:, :phaii_fast.data.num_chans])
+        assert np.allclose(phaii_fast.data.exposure, phaii.data.exposure)
+        
+        # the exposure only includes the good time
+        phaii_fast = self.tte.to_phaii_fast(bin_by_time, 8.192)
+        gti_time = sum([stop - start for start, stop in self.tte.gti.as_list()])
+        assert phaii_fast.data.exposure.sum() <= gti_time
+        assert np.all(phaii_fast.data.exposure >= 0.0)
+        
+        self.tte.set_ebounds(self.rmf.ebounds)
+        phaii = self.tte.to_phaii(bin_by_time, 8.192)
+        phaii_fast = self.tte.to_phaii_fast(bin_by_time, 8.192, 
+                                            gti_exposure=False)
+        assert np.array_equal(phaii_fast.data.counts, phaii.data.counts)
+        assert np.allclose(phaii_fast.data.exposure, phaii.data.exposure)
+        
     def test_set_ebounds(self):
         self.tte.set_ebounds(self.rmf.ebounds)
         assert self.tte.ebounds.num_intervals == self.rmf.ebounds.num_intervals
@@ -132,3 +162,439 @@ class TestGscTte(unittest.TestCase):
         spec = self.tte.to_spectrum()
         assert spec.size == 1200
 
+
+    def test_pi_dtype(self):
+        tte = GscTte.open(tte_file, pi_dtype=np.uint16)
+        assert tte.data.channels.dtype == np.uint16
+        assert np.array_equal(tte.data.channels, self.tte.data.channels)
+        assert np.array_equal(tte.data.times, self.tte.data.times)
+        
+        with self.assertRaises(TypeError):
+            GscTte.open(tte_file, pi_dtype=np.float32)
+        with self.assertRaises(ValueError):
+            GscTte.open(tte_file, pi_dtype=np.uint8)
+
+    def test_time_ref(self):
+        tstart = self.tte.headers['EVENTS']['TSTART']
+        tte = GscTte.open(tte_file, time_ref='TSTART')
+        assert tte.trigtime == tstart
+        assert np.allclose(tte.data.times + tstart, self.tte.data.times)
+        assert np.allclose(np.array(tte.gti.as_list()) + tstart, 
+                           self.tte.gti.as_list())
+        
+        tte = GscTte.open(tte_file, time_ref=351823000.0)
+        assert tte.trigtime == 351823000.0
+        
+        with self.assertRaises(ValueError):
+            GscTte.open(tte_file, time_ref='TSTOP')
+
+    def test_iter_chunks_events(self):
+        chunks = list(GscTte.iter_chunks(tte_file, chunk_events=50000))
+        assert all([isinstance(chunk, GscTte) for chunk in chunks])
+        assert all([chunk.data.size <= 50000 for chunk in chunks])
+        times = np.concatenate([chunk.data.times for chunk in chunks])
+        assert np.array_equal(times, self.tte.data.times)
+        chans = np.concatenate([chunk.data.channels for chunk in chunks])
+        assert np.array_equal(chans, self.tte.data.channels)
+        
+        # the chunk GTIs cover the file GTIs
+        exposure = sum([sum([b - a for a, b in chunk.gti.as_list()]) 
+                        for chunk in chunks])
+        total = sum([b - a for a, b in self.tte.gti.as_list()])
+        self.assertAlmostEqual(exposure, total, places=3)
+        assert chunks[0].filename == self.tte.filename
+    
+    def test_iter_chunks_seconds(self):
+        chunks = list(GscTte.iter_chunks(tte_file, chunk_seconds=10000.0, 
+                                         time_ref='TSTART', 
+                                         pi_dtype=np.uint16))
+        tstart = self.tte.headers['EVENTS']['TSTART']
+        assert chunks[0].trigtime == tstart
+        assert chunks[0].data.channels.dtype == np.uint16
+        for chunk in chunks:
+            if chunk.data.size > 0:
+                t0, t1 = chunk.data.time_range
+                assert t1 - t0 < 10000.0
+        times = np.concatenate([chunk.data.times for chunk in chunks])
+        assert np.allclose(times + tstart, self.tte.data.times)
+        
+        exposure = sum([sum([b - a for a, b in chunk.gti.as_list()]) 
+                        for chunk in chunks])
+        total = sum([b - a for a, b in self.tte.gti.as_list()])
+        self.assertAlmostEqual(exposure, total, places=3)
+    
+    def test_iter_chunks_empty(self):
+        # short chunks, many of which have good time but no events
+        chunks = list(GscTte.iter_chunks(tte_file, chunk_seconds=100.0))
+        assert any([chunk.data.size == 0 for chunk in chunks])
+        dtype = self.tte.data.channels.dtype
+        assert all([chunk.data.channels.dtype == dtype for chunk in chunks])
+        chans = np.concatenate([chunk.data.channels for chunk in chunks])
+        assert chans.dtype == dtype
+        
+        chunks = list(GscTte.iter_chunks(tte_file, chunk_seconds=100.0,
+                                         pi_dtype=np.uint16))
+        assert all([chunk.data.channels.dtype == np.uint16 \
+                    for chunk in chunks])
+    
+    def test_iter_chunks_errors(self):
+        with self.assertRaises(ValueError):
+            next(GscTte.iter_chunks(tte_file))
+        with self.assertRaises(ValueError):
+            next(GscTte.iter_chunks(tte_file, chunk_events=10, 
+                                    chunk_seconds=10.0))
+        with self.assertRaises(ValueError):
+            next(GscTte.iter_chunks(tte_file, chunk_events=0))
+        with self.assertRaises(ValueError):
+            next(GscTte.iter_chunks(tte_file, chunk_seconds=-1.0))
+
+    def test_event_columns(self):
+        assert self.tte.event_columns is None
+        assert self.tte.detector_column is None
+        
+        tte = GscTte.open(tte_file, columns=True)
+        names = tte.event_columns.dtype.names
+        assert 'TIME' not in names
+        assert 'PI' not in names
+        assert tte.event_columns.size == tte.data.size
+        assert tte.event_columns['GSCID'].dtype == np.uint8
+        assert tte.detector_column == 'GSCID'
+        
+        tte = GscTte.open(tte_file, columns=['ra', 'DEC'])
+        assert tte.event_columns.dtype.names == ('RA', 'DEC')
+        assert tte.event_columns.RA.dtype.isnative
+        
+        with self.assertRaises(ValueError):
+            GscTte.open(tte_file, columns=['FOO'])
+
+    def test_select_detectors(self):
+        tte = GscTte.open(tte_file, columns=['GSCID'])
+        dets = tte.event_columns.GSCID
+        
+        h_dets = GscDetectors.h_detectors()
+        h_tte = tte.select_detectors(h_dets)
+        mask = np.isin(dets, [det.number for det in h_dets])
+        assert h_tte.data.size == mask.sum()
+        assert np.array_equal(h_tte.data.times, tte.data.times[mask])
+        assert np.all(np.isin(h_tte.event_columns.GSCID, 
+                              [det.number for det in h_dets]))
+        assert h_tte.gti.num_intervals == tte.gti.num_intervals
+        
+        assert tte.select_detectors('ZA0').data.size == (dets == 3).sum()
+        assert tte.select_detectors(3).data.size == (dets == 3).sum()
+        
+        with self.assertRaises(RuntimeError):
+            self.tte.select_detectors('ZA0')
+
+    def test_query_cone(self):
+        tte = GscTte.open(tte_file, columns=['RA', 'DEC'])
+        assert tte.spatial_index_nside is None
+        coord = SkyCoord(90.0, 0.0, unit='deg')
+        cone = tte.query_cone(coord, 2.0)
+        assert tte.spatial_index_nside == 256
+        
+        events = SkyCoord(tte.event_columns.RA, tte.event_columns.DEC, 
+                          unit='deg')
+        # allow for rounding of events on the edge of the cone
+        sep = coord.separation(events).deg
+        inner, outer = (sep <= 2.0 - 1e-6), (sep <= 2.0 + 1e-6)
+        assert inner.sum() <= cone.data.size <= outer.sum()
+        assert np.all(np.isin(tte.data.times[inner], cone.data.times))
+        assert np.all(np.isin(cone.data.times, tte.data.times[outer]))
+        assert np.all(np.diff(cone.data.times) >= 0.0)
+        
+        # the result does not depend on the resolution of the index
+        tte.build_spatial_index(nside=32)
+        assert tte.spatial_index_nside == 32
+        assert tte.query_cone(coord, 2.0).data.size == cone.data.size
+        
+        nside, sorted_pix, order = tte.spatial_index
+        ra, dec = tte.event_radec
+        assert np.array_equal(ra, tte.event_columns.RA)
+        assert np.array_equal(sorted_pix, hp.ang2pix(nside, ra[order], 
+                                                     dec[order], nest=True, 
+                                                     lonlat=True))
+        assert np.all(np.diff(sorted_pix) >= 0)
+        
+        with self.assertRaises(ValueError):
+            tte.query_cone(coord, 0.0)
+        with self.assertRaises(ValueError):
+            tte.build_spatial_index(nside=100)
+        with self.assertRaises(RuntimeError):
+            self.tte.query_cone(coord, 2.0)
+        with self.assertRaises(RuntimeError):
+            self.tte.event_radec
+
+    def test_query_polygon(self):
+        tte = GscTte.open(tte_file, columns=['RA', 'DEC'])
+        verts = SkyCoord([88.0, 92.0, 92.0, 88.0], [-1.0, -1.0, 1.0, 1.0], 
+                         unit='deg')
+        poly = tte.query_polygon(verts)
+        assert poly.data.size > 0
+        assert np.all((poly.event_columns.RA >= 88.0) & 
+                      (poly.event_columns.RA <= 92.0))
+        # the edges are great circles, which bulge past the vertex latitudes
+        assert np.all(np.abs(poly.event_columns.DEC) <= 1.001)
+        assert np.all(np.diff(poly.data.times) >= 0.0)
+        
+        # the vertex order does not matter
+        assert tte.query_polygon(verts[::-1]).data.size == poly.data.size
+        
+        with self.assertRaises(ValueError):
+            tte.query_polygon(verts[:2])
+
+    @unittest.skipIf(not tte_file2.exists(), "test files aren't downloaded. run gdt-data download.")
+    def test_merge_files(self):
+        tte2 = GscTte.open(tte_file2)
+        times = np.concatenate((self.tte.data.times, tte2.data.times))
+        pis = np.concatenate((self.tte.data.channels, tte2.data.channels))
+        order = np.lexsort((pis, times))
+        
+        # the repeated file is a duplicate of every event in the first file
+        tte = GscTte.merge_files([tte_file, tte_file2, tte_file], 
+                                 read_events=20000)
+        assert tte.data.size == self.tte.data.size + tte2.data.size
+        assert np.array_equal(tte.data.times, times[order])
+        assert np.array_equal(tte.data.channels, pis[order])
+        assert tte.gti.as_list()[0][0] == min(self.tte.gti.as_list()[0][0],
+                                              tte2.gti.as_list()[0][0])
+        assert tte.filename is None
+
+    @unittest.skipIf(not tte_file2.exists(), "test files aren't downloaded. run gdt-data download.")
+    def test_iter_merged(self):
+        tte = GscTte.merge_files([tte_file, tte_file2])
+        chunks = list(GscTte.iter_merged([tte_file, tte_file2], 
+                                         chunk_events=50000, read_events=7000,
+                                         time_ref='TSTART'))
+        assert len(chunks) > 1
+        assert sum([chunk.data.size for chunk in chunks]) == tte.data.size
+        for chunk in chunks:
+            assert chunk.trigtime == chunks[0].trigtime
+            assert np.all(np.diff(chunk.data.times) >= 0.0)
+        for chunk1, chunk2 in zip(chunks[:-1], chunks[1:]):
+            assert chunk1.data.times[-1] <= chunk2.data.times[0]
+        
+        total = sum([stop - start for chunk in chunks \
+                     for start, stop in chunk.gti.as_list()])
+        self.assertAlmostEqual(total, sum([stop - start for start, stop \
+                                           in tte.gti.as_list()]), places=3)
+        
+        with self.assertRaises(ValueError):
+            next(GscTte.iter_merged([]))
+        with self.assertRaises(ValueError):
+            next(GscTte.iter_merged([tte_file], chunk_events=0))
+
+    def test_open_time_range(self):
+        tmin, tmax = self.tte.time_range
+        time_range = (tmin + 1000.0, tmin + 1300.0)
+        mask = (self.tte.data.times >= time_range[0]) & \
+               (self.tte.data.times <= time_range[1])
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp_file = os.path.join(tmpdir, tte_file.name)
+            shutil.copyfile(tte_file, tmp_file)
+            
+            # without an index, the full file is read
+            tte1 = GscTte.open(tmp_file, time_range=time_range, columns=True)
+            
+            index_path = GscTte.build_time_index(tmp_file, cadence=16.0, 
+                                                 read_events=30000)
+            assert index_path.exists()
+            tte2 = GscTte.open(tmp_file, time_range=time_range, columns=True)
+            
+            for tte in (tte1, tte2):
+                assert np.array_equal(tte.data.times, 
+                                      self.tte.data.times[mask])
+                assert np.array_equal(tte.data.channels, 
+                                      self.tte.data.channels[mask])
+                assert tte.event_columns.size == mask.sum()
+                gti = tte.gti.as_list()
+                assert gti[0][0] >= time_range[0]
+                assert gti[-1][1] <= time_range[1]
+            for key in ('TSTART', 'TSTOP', 'OBJECT'):
+                assert tte1.headers['EVENTS'][key] == tte2.headers['EVENTS'][key]
+            
+            # a stale index is ignored
+            stat = os.stat(tmp_file)
+            os.utime(tmp_file, ns=(stat.st_atime_ns, 
+                                   stat.st_mtime_ns + 1000000000))
+            tte3 = GscTte.open(tmp_file, time_range=time_range)
+            assert np.array_equal(tte3.data.times, self.tte.data.times[mask])
+            
+            with self.assertRaises(ValueError):
+                GscTte.open(tmp_file, time_range=(tmax + 1e5, tmax + 2e5))
+            with self.assertRaises(ValueError):
+                GscTte.build_time_index(tmp_file, cadence=0.0)
+
+    def test_archive(self):
+        tte = GscTte.open(tte_file, columns=True)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive_path = GscTte.build_archive(tte_file, 
+                                        os.path.join(tmpdir, 'tile.gsca'))
+            with self.assertRaises(FileExistsError):
+                GscTte.build_archive(tte_file, archive_path)
+            GscTte.build_archive(tte_file, archive_path, overwrite=True)
+            
+            tte2 = GscTte.open(archive_path, columns=True)
+            assert tte2.filename == tte.filename
+            assert np.array_equal(tte2.data.times, tte.data.times)
+            assert np.array_equal(tte2.data.channels, tte.data.channels)
+            assert np.array_equal(tte2.event_columns, tte.event_columns)
+            assert tte2.event_columns.dtype == tte.event_columns.dtype
+            assert tte2.gti.as_list() == tte.gti.as_list()
+            assert tte2.headers['EVENTS']['TSTART'] == \
+                   tte.headers['EVENTS']['TSTART']
+            
+            tte3 = GscTte.open(archive_path, time_ref='TSTART', 
+                               pi_dtype=np.uint16)
+            assert tte3.trigtime == tte.headers['EVENTS']['TSTART']
+            assert tte3.data.channels.dtype == np.uint16
+            
+            tmin = tte.time_range[0]
+            time_range = (tmin + 1000.0, tmin + 1300.0)
+            tte4 = GscTte.open(tte_file, time_range=time_range, 
+                               columns=['RA', 'GSCID'])
+            tte5 = GscTte.open(archive_path, time_range=time_range, 
+                               columns=['RA', 'GSCID'])
+            assert np.array_equal(tte5.data.times, tte4.data.times)
+            assert np.array_equal(tte5.event_columns, tte4.event_columns)
+            assert tte5.gti.as_list() == tte4.gti.as_list()
+            
+            # the archive is written back to an identical file
+            fits_path = os.path.join(tmpdir, 'tile.evt')
+            GscTte.archive_to_fits(archive_path, fits_path, write_rows=30000)
+            with gzip.open(tte_file) as f, open(fits_path, 'rb') as f2:
+                assert f.read() == f2.read()
+            with self.assertRaises(FileExistsError):
+                GscTte.archive_to_fits(archive_path, fits_path)
+            with self.assertRaises(ValueError):
+                GscTte.archive_to_fits(tmpdir, fits_path, overwrite=True)
+
+    @unittest.skipIf(not tte_file2.exists(), "test files aren't downloaded. run gdt-data download.")
+    def test_open_many(self):
+        missing = tte_file.with_name('missing.evt.gz')
+        file_paths = [tte_file, missing, tte_file2, tte_file]
+        ttes = GscTte.open_many(file_paths, max_workers=2, max_files=2, 
+                                time_ref='TSTART')
+        assert len(ttes) == 4
+        assert isinstance(ttes[1], FileNotFoundError)
+        for file_path, tte in zip(file_paths[::2] + file_paths[3:], 
+                                  ttes[::2] + ttes[3:]):
+            assert tte.filename == file_path.name
+            assert tte.trigtime == tte.headers['EVENTS']['TSTART']
+        assert np.array_equal(ttes[3].data.times, ttes[0].data.times)
+        
+        paths = [path for path, _ in GscTte.iter_open(file_paths, 
+                                                      max_workers=1)]
+        assert paths == file_paths
+        
+        # closing the generator early cancels the files not yet opened
+        files = GscTte.iter_open(file_paths * 4, max_workers=1, max_files=8)
+        path, tte = next(files)
+        assert path == file_paths[0]
+        files.close()
+        
+        with self.assertRaises(ValueError):
+            GscTte.open_many(file_paths, max_files=0)
+
+
+@unittest.skipIf(not tte_file.exists(), "test files aren't downloaded. run gdt-data download.")
+class TestGscTteMerge(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        with fits.open(tte_file) as hdulist:
+            events = hdulist[1].data
+            
+            # a repeated event, and an event with the same time and channel
+            # but a different sky position
+            rows = np.arange(2000)
+            rows = np.sort(np.concatenate((rows, [10, 20])))
+            events_a = events[rows].copy()
+            events_a['RA'][21] += 1.0
+            self.file_a = self._write(hdulist, 'a.evt', events_a)
+            self.events_a = events_a
+            
+            # overlaps the second half of file a
+            self.file_b = self._write(hdulist, 'b.evt', events[1000:3000])
+            
+            self.empty_file = self._write(hdulist, 'empty.evt', events[:0], 
+                                          gti=hdulist[2].data[:0])
+            self.no_gti_file = self._write(hdulist, 'no_gti.evt', 
+                                           events[:1000], 
+                                           gti=hdulist[2].data[:0])
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def _write(self, hdulist, filename, events, gti=None):
+        hdulist = fits.HDUList([hdu.copy() for hdu in hdulist])
+        hdulist[1].data = events
+        if gti is not None:
+            hdulist[2].data = gti
+        file_path = os.path.join(self.path, filename)
+        hdulist.writeto(file_path)
+        return file_path
+    
+    def test_duplicates_within_file(self):
+        tte = GscTte.merge_files([self.file_a, self.file_a])
+        assert tte.data.size == 2002
+        tte = GscTte.merge_files([self.file_a])
+        assert tte.data.size == 2002
+    
+    def test_overlap(self):
+        tte = GscTte.merge_files([self.file_a, self.file_b], 
+                                 read_events=300)
+        assert tte.data.size == 3002
+        assert np.all(np.diff(tte.data.times) >= 0.0)
+    
+    def test_read_events(self):
+        # both files repeat an event, and the copies in file a straddle a 
+        # read boundary
+        with fits.open(tte_file) as hdulist:
+            events = hdulist[1].data
+            rows = np.sort(np.concatenate((np.arange(30), [10])))
+            file_a = self._write(hdulist, 'dup_a.evt', events[rows])
+            file_b = self._write(hdulist, 'dup_b.evt', events[rows[5:]])
+        
+        # the result does not depend on the size of the read blocks
+        for read_events in (1, 2, 10, 11, 12, 1000):
+            tte = GscTte.merge_files([file_a, file_b], 
+                                     read_events=read_events)
+            assert tte.data.size == 31
+            assert np.all(np.diff(tte.data.times) >= 0.0)
+    
+    def test_columns(self):
+        tte = GscTte.merge_files([self.file_a, self.file_b], 
+                                 columns=['RA', 'GSCID'], read_events=300)
+        assert tte.event_columns.dtype.names == ('RA', 'GSCID')
+        assert tte.event_columns.size == tte.data.size
+        assert np.array_equal(np.sort(tte.event_columns['RA'][:2002]), 
+                              np.sort(self.events_a['RA']))
+        
+        chunks = list(GscTte.iter_merged([self.file_a, self.file_b], 
+                                         chunk_events=500, read_events=300,
+                                         columns=True))
+        names = chunks[0].event_columns.dtype.names
+        assert 'TIME' not in names
+        assert 'DEC' in names
+        assert all([chunk.event_columns.dtype == chunks[0].event_columns.dtype
+                    for chunk in chunks])
+        
+        with self.assertRaises(ValueError):
+            GscTte.merge_files([self.file_a], columns=['NOT_A_COLUMN'])
+    
+    def test_empty(self):
+        assert list(GscTte.iter_merged([self.empty_file])) == []
+        tte = GscTte.merge_files([self.empty_file], time_ref='TSTART',
+                                 columns=['RA'])
+        assert tte.data.size == 0
+        assert tte.gti is None
+        assert tte.event_columns.size == 0
+        assert tte.trigtime == tte.headers['EVENTS']['TSTART']
+    
+    def test_no_gti(self):
+        tte = GscTte.merge_files([self.no_gti_file, self.empty_file])
+        assert tte.data.size == 1000
+        # the GTI defaults to the time range of the events
+        assert tte.gti.as_list() == [tte.data.time_range]
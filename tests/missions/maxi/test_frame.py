@@ -39,13 +39,19 @@
 # the License.
 
 import numpy as np
+import os
+import shutil
+import tempfile
 import unittest
 from astropy.constants import R_earth
 from astropy.coordinates import SkyCoord
 import astropy.coordinates.representation as r
+from scipy.interpolate import interp1d
+from scipy.spatial.transform import Rotation, Slerp
 
 from gdt.core import data_path
 from gdt.core.coords import Quaternion
+from gdt.core.time import time_range
 from gdt.missions.maxi.attitude import MaxiAttitude
 from gdt.missions.maxi.frame import *
 from gdt.missions.maxi.orbit import MaxiOrbit
@@ -104,6 +110,127 @@ class TestMaxiFrameAttitude(unittest.TestCase):
         self.assertTrue(isinstance(self.frame.detectors.Z, GscFov))
             
 
+class TestMaxiFrameFovAngles(unittest.TestCase):
+    
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        quats = rng.normal(size=(50, 4))
+        quats /= np.linalg.norm(quats, axis=1)[:, np.newaxis]
+        self.frame = MaxiFrame(obstime=Time(time_att + np.arange(50), 
+                                            format='maxi'),
+                               quaternion=Quaternion(quats), detectors=GscFov)
+        self.coord = SkyCoord(100.0, -30.0, unit='deg')
+    
+    def test_h(self):
+        along, across = self.frame.fov_angles(self.coord, GscFov.H)
+        assert along.size == 50
+        maxi_coord = self.coord.transform_to(self.frame)
+        az = maxi_coord.az.value
+        az[az > 180.0] -= 360.0
+        assert np.allclose(along, az)
+        assert np.allclose(across, maxi_coord.el.value)
+    
+    def test_z(self):
+        along, across = self.frame.fov_angles(self.coord, 'Z')
+        maxi_coord = self.coord.transform_to(self.frame)
+        # Z FOV is centered at zenith 180 with the long axis toward az=90
+        az = np.deg2rad(maxi_coord.az.value)
+        el = np.deg2rad(maxi_coord.el.value)
+        x = np.cos(el) * np.cos(az)
+        assert np.allclose(np.sin(np.deg2rad(across)), x)
+        assert np.all(np.abs(along) <= 180.0)
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.frame.fov_angles(self.coord, 'X')
+        with self.assertRaises(TypeError):
+            MaxiFrame(obstime=Time(time_att, format='maxi')).fov_angles(
+                                                             self.coord, 'H')
+
+
+class TestMaxiFrameInterpolate(unittest.TestCase):
+    
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.times = time_att + np.arange(600) * 1.0
+        rotvec = np.outer(np.arange(600) * 2.0 * np.pi / 5400.0, 
+                          [0.2, 0.3, 0.93])
+        quats = Rotation.from_rotvec(rotvec).as_quat()
+        # sign of the quaternions should not matter
+        quats[rng.random(600) < 0.5] *= -1.0
+        self.quats = quats
+        self.geoloc = rng.normal(size=(3, 600)) * 6.8e6
+        self.geovel = rng.normal(size=(3, 600)) * 7.5e3
+        self.frame = MaxiFrame(obstime=Time(self.times, format='maxi'),
+                      quaternion=Quaternion(quats),
+                      obsgeoloc=r.CartesianRepresentation(self.geoloc, unit='m'),
+                      obsgeovel=r.CartesianRepresentation(self.geovel, 
+                                                          unit='m/s'),
+                      detectors=GscFov)
+        self.x = np.sort(rng.uniform(self.times[0], self.times[-1], 1000))
+    
+    def test_quaternion(self):
+        quat, geoloc, geovel = self.frame.interpolate(self.x)
+        assert quat.shape == (1000, 4)
+        slerp = Slerp(self.times, Rotation.from_quat(self.quats))
+        diff = Rotation.from_quat(quat) * slerp(self.x).inv()
+        assert np.allclose(diff.magnitude(), 0.0, atol=1e-10)
+        
+        # at the samples
+        quat, _, _ = self.frame.interpolate(self.times[[0, 10, -1]])
+        assert np.allclose(np.abs(np.sum(quat * self.quats[[0, 10, -1]], 
+                                         axis=1)), 1.0)
+    
+    def test_orbit(self):
+        quat, geoloc, geovel = self.frame.interpolate(self.x)
+        assert geoloc.shape == (1000, 3)
+        assert np.allclose(geoloc, interp1d(self.times, self.geoloc)(self.x).T)
+        assert np.allclose(geovel, interp1d(self.times, self.geovel)(self.x).T)
+    
+    def test_shape(self):
+        quat, geoloc, geovel = self.frame.interpolate(self.x[0])
+        assert quat.shape == (4,)
+        assert geoloc.shape == (3,)
+        quat, geoloc, geovel = self.frame.interpolate(self.x.reshape(10, 100))
+        assert quat.shape == (10, 100, 4)
+        assert geovel.shape == (10, 100, 3)
+    
+    def test_time(self):
+        quat1, geoloc1, _ = self.frame.interpolate(self.x)
+        quat2, geoloc2, _ = self.frame.interpolate(Time(self.x, format='maxi'))
+        assert np.allclose(quat1, quat2)
+        assert np.allclose(geoloc1, geoloc2)
+    
+    def test_at(self):
+        quat, geoloc, geovel = self.frame.interpolate(self.x)
+        frame = self.frame.at(self.x)
+        assert frame.obstime.size == 1000
+        assert np.allclose(frame.quaternion.xyz, quat[:, :3])
+        assert np.allclose(frame.quaternion.w, quat[:, 3])
+        assert np.allclose(frame.obsgeoloc.xyz.value.T, geoloc)
+        assert np.allclose(frame.obsgeovel.xyz.value.T, geovel)
+        
+        frame = self.frame.at(Time(self.x[0], format='maxi'))
+        assert frame.obstime.isscalar
+        assert np.allclose(frame.obsgeoloc.xyz.value, geoloc[0])
+    
+    def test_attitude_only(self):
+        frame = MaxiFrame(obstime=Time(self.times, format='maxi'),
+                          quaternion=Quaternion(self.quats))
+        quat, geoloc, geovel = frame.interpolate(self.x)
+        assert quat.shape == (1000, 4)
+        assert geoloc is None
+        assert geovel is None
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.frame.interpolate(self.times[0] - 1.0)
+        with self.assertRaises(ValueError):
+            self.frame.interpolate([self.times[0], self.times[-1] + 1.0])
+        with self.assertRaises(ValueError):
+            self.frame[0].interpolate(self.times[0])
+
+
 class TestMaxiFrameOrbi(unittest.TestCase):
     
     def setUp(self):
@@ -179,3 +306,96 @@ class TestCombineOrbitAttitude(unittest.TestCase):
         with self.assertRaises(TypeError):
             MaxiFrame.combine_orbit_attitude(self.orb_frame, self.orb_frame)
 
+
+class TestResampleOrbitAttitude(unittest.TestCase):
+    
+    def setUp(self):
+        att_times = time_att + np.arange(3600) * 1.0
+        rotvec = np.outer(np.arange(3600) * 2.0 * np.pi / 5400.0, 
+                          [0.2, 0.3, 0.93])
+        self.quats = Rotation.from_rotvec(rotvec).as_quat()
+        self.att_frame = MaxiFrame(obstime=Time(att_times, format='maxi'),
+                                   quaternion=Quaternion(self.quats), 
+                                   detectors=GscFov)
+        
+        orb_times = time_orb + np.arange(3600) * 1.0005
+        phase = np.arange(3600) * 2.0 * np.pi / 5500.0
+        self.geoloc = 6.8e6 * np.vstack((np.cos(phase), np.sin(phase), 
+                                         np.zeros(3600)))
+        self.geovel = 7.6e3 * np.vstack((-np.sin(phase), np.cos(phase), 
+                                         np.zeros(3600)))
+        self.orb_frame = MaxiFrame(obstime=Time(orb_times, format='maxi'),
+                      obsgeoloc=r.CartesianRepresentation(self.geoloc, unit='m'),
+                      obsgeovel=r.CartesianRepresentation(self.geovel, 
+                                                          unit='m/s'))
+    
+    def test_grid(self):
+        times, quat, geoloc, geovel = MaxiFrame.resample_orbit_attitude(
+                                                             self.orb_frame, 
+                                                             self.att_frame,
+                                                             sample_period=2.5)
+        grid = time_range(self.att_frame.obstime[0], 
+                          self.orb_frame.obstime[-1], step=2.5)
+        assert times.size == grid.size
+        assert np.allclose(times, grid.maxi)
+        assert quat.shape == (times.size, 4)
+        assert geoloc.shape == (times.size, 3)
+        assert geovel.shape == (times.size, 3)
+    
+    def test_values(self):
+        times, quat, geoloc, geovel = MaxiFrame.resample_orbit_attitude(
+                                                             self.orb_frame, 
+                                                             self.att_frame)
+        slerp = Slerp(self.att_frame.obstime.maxi, 
+                      Rotation.from_quat(self.quats))
+        diff = Rotation.from_quat(quat) * slerp(times).inv()
+        assert np.allclose(diff.magnitude(), 0.0, atol=1e-10)
+        orb_times = self.orb_frame.obstime.maxi
+        assert np.allclose(geoloc, interp1d(orb_times, self.geoloc)(times).T)
+        assert np.allclose(geovel, interp1d(orb_times, self.geovel)(times).T)
+    
+    def test_combine(self):
+        times, quat, geoloc, geovel = MaxiFrame.resample_orbit_attitude(
+                                                             self.orb_frame, 
+                                                             self.att_frame)
+        frame = MaxiFrame.combine_orbit_attitude(self.orb_frame, 
+                                                 self.att_frame)
+        assert frame.obstime.format == 'maxi'
+        assert np.allclose(frame.obstime.maxi, times)
+        assert np.allclose(frame.quaternion.xyz, quat[:, :3])
+        assert np.allclose(frame.obsgeoloc.xyz.to('m').value.T, geoloc)
+        assert np.allclose(frame.obsgeovel.xyz.to('m/s').value.T, geovel)
+        assert frame.detectors == GscFov
+    
+    def test_out_dir(self):
+        out_dir = tempfile.mkdtemp()
+        try:
+            arrays = MaxiFrame.resample_orbit_attitude(self.orb_frame, 
+                                                       self.att_frame)
+            mmaps = MaxiFrame.resample_orbit_attitude(self.orb_frame, 
+                                                      self.att_frame,
+                                                      out_dir=out_dir)
+            names = ['times', 'quaternion', 'obsgeoloc', 'obsgeovel']
+            for array, mmap, name in zip(arrays, mmaps, names):
+                assert isinstance(mmap, np.memmap)
+                saved = np.load(os.path.join(out_dir, name + '.npy'), 
+                                mmap_mode='r')
+                assert np.array_equal(saved, array)
+            del mmaps, saved
+        finally:
+            shutil.rmtree(out_dir)
+    
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            MaxiFrame.resample_orbit_attitude(self.orb_frame, self.att_frame,
+                                              sample_period=0.0)
+        with self.assertRaises(TypeError):
+            MaxiFrame.resample_orbit_attitude(self.att_frame, self.att_frame)
+        with self.assertRaises(TypeError):
+            MaxiFrame.resample_orbit_attitude(self.orb_frame, self.orb_frame)
+        
+        late_frame = MaxiFrame(obstime=Time(time_att + 1e5 + np.arange(10), 
+                                            format='maxi'),
+                               quaternion=Quaternion(self.quats[:10]))
+        with self.assertRaises(ValueError):
+            MaxiFrame.resample_orbit_attitude(self.orb_frame, late_frame)